@@ -0,0 +1,371 @@
+import asyncio
+import heapq
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+from contract_advisor.document_processor.ocr_cache import DEFAULT_READER_SETTINGS
+
+DEFAULT_CHUNKR_URL = "https://api.chunkr.ai/api/v1/task"
+
+# 查询任务状态时允许的连续瞬时错误次数（网络抖动、超时、5xx），超过后该任务判为失败
+MAX_POLL_ERRORS = 5
+
+
+def is_transient_error(error):
+    """
+    判断请求错误是否可以重试
+
+    参数:
+    error (Exception): 请求抛出的异常
+
+    返回:
+    bool: 超时、连接错误和5xx为True，其他HTTP错误（如404）为False
+    """
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code >= 500 or error.code == 408
+    return isinstance(error, (urllib.error.URLError, TimeoutError, ConnectionError))
+
+
+class RateLimiter:
+    """
+    全局请求速率限制（令牌桶），遇到429时按AIMD方式自适应降速
+
+    被限流时速率减半，之后每次成功请求缓慢恢复，直到回到设定上限。
+    """
+
+    def __init__(self, max_rate, min_rate=0.5):
+        """
+        参数:
+        max_rate (float): 每秒最大请求数
+        min_rate (float): 降速后的最低每秒请求数
+        """
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate)
+        self.rate = max_rate
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """等待直到可以发出下一个请求"""
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + 1.0 / self.rate
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def on_throttled(self):
+        self.rate = max(self.min_rate, self.rate / 2)
+
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + 0.1)
+
+
+class ChunkrTaskTracker:
+    """
+    在单个事件循环中提交并轮询大量Chunkr任务
+
+    每个任务独立按指数退避调整轮询间隔，所有HTTP请求共享一个全局速率
+    限制，任务完成后立即返回结果，不会因为某个慢任务阻塞其他任务。
+    状态查询遇到瞬时错误时按同样的退避间隔重试，连续失败 max_poll_errors 次后才判为失败。
+    """
+
+    def __init__(self, api_key=None, url=None, max_requests_per_second=5.0,
+                 initial_delay=1.0, max_delay=15.0, backoff=1.6,
+                 max_wait=600.0, timeout=30, reader_settings=None,
+                 max_poll_errors=MAX_POLL_ERRORS):
+        """
+        参数:
+        api_key (str, optional): Chunkr API密钥，默认读取环境变量 CHUNKR_API_KEY
+        url (str, optional): Chunkr任务接口地址，默认读取环境变量 CHUNKR_API_URL
+        max_requests_per_second (float): 全局每秒请求数上限
+        initial_delay (float): 提交后首次轮询前的等待秒数
+        max_delay (float): 单个任务轮询间隔上限
+        backoff (float): 任务仍在处理中时轮询间隔的增长倍数
+        max_wait (float): 单个任务的最长等待秒数
+        timeout (int): 单次HTTP请求超时秒数
+        reader_settings (dict, optional): Chunkr识别参数
+        max_poll_errors (int): 单个任务允许的连续瞬时查询错误次数
+        """
+        self.api_key = api_key or os.environ.get("CHUNKR_API_KEY", "")
+        self.url = url or os.environ.get("CHUNKR_API_URL") or DEFAULT_CHUNKR_URL
+        self.max_requests_per_second = max_requests_per_second
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self.settings = dict(DEFAULT_READER_SETTINGS, **(reader_settings or {}))
+        self.max_poll_errors = max_poll_errors
+        self.request_count = 0
+        self.throttled_count = 0
+        self.poll_error_count = 0
+        self._limiter = None
+
+    def _limiter_for_loop(self):
+        # 速率限制器绑定当前事件循环，同一追踪器可以被多次 asyncio.run 复用
+        loop = asyncio.get_running_loop()
+        if self._limiter is None or self._limiter[0] is not loop:
+            self._limiter = (loop, RateLimiter(self.max_requests_per_second))
+        return self._limiter[1]
+
+    def _request(self, request):
+        self.request_count += 1
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read().decode("utf-8"))
+
+    def _submit_sync(self, file_path, settings=None):
+        boundary = uuid.uuid4().hex
+        parts = []
+        with open(file_path, "rb") as f:
+            file_bytes = f.read()
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="file"; '
+            f'filename="{os.path.basename(file_path)}"\r\n'
+            'Content-Type: application/octet-stream\r\n\r\n'.encode("utf-8")
+            + file_bytes + b"\r\n"
+        )
+        for name, value in (settings if settings is not None else self.settings).items():
+            parts.append(
+                f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"'
+                f'\r\n\r\n{value}\r\n'.encode("utf-8")
+            )
+        body = b"".join(parts) + f"--{boundary}--\r\n".encode("utf-8")
+
+        request = urllib.request.Request(
+            self.url,
+            data=body,
+            method="POST",
+            headers={
+                "Authorization": self.api_key,
+                "Content-Type": f"multipart/form-data; boundary={boundary}",
+            },
+        )
+        task_id = self._request(request).get("task_id")
+        if not task_id:
+            raise ValueError("Task ID not returned in the response.")
+        return task_id
+
+    def _status_sync(self, task_id):
+        request = urllib.request.Request(
+            f"{self.url}/{task_id}",
+            headers={"Authorization": self.api_key},
+        )
+        return self._request(request)
+
+    async def _call(self, func, *args):
+        """在速率限制下于线程池中执行一次HTTP请求，遇到429时自动重试"""
+        limiter = self._limiter_for_loop()
+        while True:
+            await limiter.acquire()
+            try:
+                result = await asyncio.to_thread(func, *args)
+                limiter.on_success()
+                return result
+            except urllib.error.HTTPError as e:
+                if e.code != 429:
+                    raise
+                self.throttled_count += 1
+                limiter.on_throttled()
+
+    async def submit(self, file_path, settings=None):
+        """
+        提交单个文件
+
+        参数:
+        file_path (str): 文件路径
+        settings (dict, optional): 本次提交的识别参数，默认使用追踪器的 reader_settings
+
+        返回:
+        str: 任务ID
+        """
+        return await self._call(self._submit_sync, file_path, settings)
+
+    async def iter_results(self, task_ids):
+        """
+        在一个循环中轮询所有任务，按完成顺序逐个返回
+
+        参数:
+        task_ids (list): 任务ID列表
+
+        返回:
+        async generator: (任务ID, Chunkr输出, 错误信息) 三元组，
+            成功时错误信息为None，失败时输出为None
+        """
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        delays = {task_id: self.initial_delay for task_id in task_ids}
+        errors = {task_id: 0 for task_id in task_ids}
+        schedule = [(start + self.initial_delay, task_id) for task_id in task_ids]
+        heapq.heapify(schedule)
+        in_flight = {}
+
+        while schedule or in_flight:
+            now = loop.time()
+            while schedule and schedule[0][0] <= now:
+                _, task_id = heapq.heappop(schedule)
+                in_flight[asyncio.ensure_future(self._call(self._status_sync, task_id))] = task_id
+
+            timeout = max(0.0, schedule[0][0] - now) if schedule else None
+            if not in_flight:
+                await asyncio.sleep(timeout)
+                continue
+
+            done, _ = await asyncio.wait(
+                in_flight, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+            for future in done:
+                task_id = in_flight.pop(future)
+                try:
+                    data = future.result()
+                except Exception as e:
+                    # 瞬时错误按退避间隔重试，不可重试的错误或连续失败过多时才判为失败
+                    self.poll_error_count += 1
+                    errors[task_id] += 1
+                    if (not is_transient_error(e) or errors[task_id] > self.max_poll_errors
+                            or loop.time() - start > self.max_wait):
+                        yield task_id, None, f"Failed to retrieve task status: {e}"
+                    else:
+                        delays[task_id] = min(delays[task_id] * self.backoff, self.max_delay)
+                        heapq.heappush(schedule, (loop.time() + delays[task_id], task_id))
+                    continue
+
+                errors[task_id] = 0
+                status = data.get("status")
+                if status == "Succeeded":
+                    yield task_id, json.dumps(data, indent=4), None
+                elif status == "Failed":
+                    yield task_id, None, data.get("message") or "Task failed."
+                elif loop.time() - start > self.max_wait:
+                    yield task_id, None, f"Max wait reached for task {task_id}."
+                else:
+                    delays[task_id] = min(delays[task_id] * self.backoff, self.max_delay)
+                    heapq.heappush(schedule, (loop.time() + delays[task_id], task_id))
+
+    async def process_files(self, file_paths, settings=None):
+        """
+        提交多个文件并按完成顺序返回结果
+
+        参数:
+        file_paths (list): 文件路径列表
+        settings (dict, optional): 本批文件的识别参数，默认使用追踪器的 reader_settings
+
+        返回:
+        async generator: (文件路径, Chunkr输出, 错误信息) 三元组
+        """
+        file_paths = list(file_paths)
+        submissions = await asyncio.gather(
+            *(self.submit(path, settings) for path in file_paths), return_exceptions=True
+        )
+
+        task_paths = {}
+        for path, task_id in zip(file_paths, submissions):
+            if isinstance(task_id, Exception):
+                yield path, None, f"Failed to submit task: {task_id}"
+            else:
+                task_paths[task_id] = path
+
+        async for task_id, output, error in self.iter_results(list(task_paths)):
+            yield task_paths[task_id], output, error
+
+
+_loop = None
+_trackers = {}
+_shared_lock = threading.Lock()
+
+
+def _shared_loop():
+    """获取后台共享事件循环（守护线程中运行），所有同步调用的提交和轮询都在这里进行"""
+    global _loop
+    with _shared_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="chunkr-tracker", daemon=True).start()
+        return _loop
+
+
+def get_tracker(api_key=None):
+    """
+    获取指定API密钥的共享追踪器（进程内共享，同一密钥的请求共用一个速率限制）
+
+    参数:
+    api_key (str, optional): Chunkr API密钥，默认读取环境变量 CHUNKR_API_KEY
+
+    返回:
+    ChunkrTaskTracker: 共享追踪器
+    """
+    api_key = api_key or os.environ.get("CHUNKR_API_KEY", "")
+    url = os.environ.get("CHUNKR_API_URL") or DEFAULT_CHUNKR_URL
+    with _shared_lock:
+        tracker = _trackers.get((api_key, url))
+        if tracker is None:
+            tracker = ChunkrTaskTracker(api_key=api_key, url=url)
+            _trackers[(api_key, url)] = tracker
+        return tracker
+
+
+def track_files(file_paths, api_key=None, on_result=None, reader_settings=None, **tracker_kwargs):
+    """
+    同步调用入口：并发提交并轮询多个文件
+
+    协程在后台共享事件循环中执行，调用线程只等待最终结果，不发出任何轮询请求；
+    多个线程同时调用时，所有任务由同一个循环轮询并共享速率限制。
+    不能在正在运行事件循环的线程中调用（会阻塞该循环），异步代码请直接使用
+    ChunkrTaskTracker.process_files。
+
+    参数:
+    file_paths (list): 文件路径列表
+    api_key (str, optional): Chunkr API密钥
+    on_result (callable, optional): 每个文件完成时调用 on_result(路径, 输出, 错误)，在后台循环线程中执行
+    reader_settings (dict, optional): Chunkr识别参数
+    **tracker_kwargs: 传递给 ChunkrTaskTracker 的其他参数，传入时使用独立的追踪器（如基准测试）
+
+    返回:
+    dict: {文件路径: Chunkr输出}，失败的文件为None
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        raise RuntimeError("track_files 不能在事件循环中调用，请改用 await ChunkrTaskTracker.process_files")
+
+    file_paths = list(file_paths)
+    if tracker_kwargs:
+        tracker = ChunkrTaskTracker(api_key=api_key, reader_settings=reader_settings, **tracker_kwargs)
+        settings = None
+    else:
+        tracker = get_tracker(api_key)
+        settings = dict(DEFAULT_READER_SETTINGS, **(reader_settings or {}))
+
+    async def run():
+        outputs = {path: None for path in file_paths}
+        async for path, output, error in tracker.process_files(file_paths, settings):
+            outputs[path] = output
+            if error:
+                print(f"处理 {path} 时发生错误: {error}")
+            if on_result is not None:
+                on_result(path, output, error)
+        return outputs
+
+    return asyncio.run_coroutine_threadsafe(run(), _shared_loop()).result()
+
+
+def track_file(file_path, api_key=None, reader_settings=None):
+    """
+    提交单个文件并等待识别结果（替代 ChunkrReader.get_task_output 的阻塞轮询）
+
+    参数:
+    file_path (str): 文件路径
+    api_key (str, optional): Chunkr API密钥
+    reader_settings (dict, optional): Chunkr识别参数
+
+    返回:
+    str: Chunkr输出，失败时为None
+    """
+    return track_files([file_path], api_key=api_key, reader_settings=reader_settings)[file_path]
@@ -0,0 +1,224 @@
+import argparse
+import json
+import os
+import random
+import threading
+import time
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from contract_advisor.document_processor.chunkr_tracker import ChunkrTaskTracker, track_files
+from contract_advisor.document_processor.scratch import job_scratch_dir
+
+
+class FakeChunkrServer(ThreadingHTTPServer):
+    """
+    本地模拟的Chunkr任务服务，用于离线测试延迟和吞吐量
+
+    每个任务在随机的处理时长后变为 Succeeded，可选的每秒请求上限
+    超出时返回429，用于验证全局限速与自适应退避。
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, latency=(1.0, 3.0), max_rps=None, seed=None):
+        super().__init__(address, FakeChunkrHandler)
+        self.latency = latency
+        self.max_rps = max_rps
+        self.random = random.Random(seed)
+        self.tasks = {}
+        self.request_count = 0
+        self.throttled_count = 0
+        self._window = []
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/api/v1/task"
+
+    def allow_request(self):
+        now = time.monotonic()
+        with self._lock:
+            self.request_count += 1
+            if self.max_rps is None:
+                return True
+            self._window = [t for t in self._window if now - t < 1.0]
+            if len(self._window) >= self.max_rps:
+                self.throttled_count += 1
+                return False
+            self._window.append(now)
+            return True
+
+    def create_task(self, size):
+        task_id = uuid.uuid4().hex
+        with self._lock:
+            self.tasks[task_id] = {
+                "ready_at": time.monotonic() + self.random.uniform(*self.latency),
+                "size": size,
+            }
+        return task_id
+
+
+class FakeChunkrHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        if not self.server.allow_request():
+            self._send_json(429, {"message": "Too Many Requests"})
+            return
+        task_id = self.server.create_task(length)
+        self._send_json(200, {"task_id": task_id, "status": "Starting"})
+
+    def do_GET(self):
+        if not self.server.allow_request():
+            self._send_json(429, {"message": "Too Many Requests"})
+            return
+        task_id = self.path.rstrip("/").rsplit("/", 1)[-1]
+        task = self.server.tasks.get(task_id)
+        if task is None:
+            self._send_json(404, {"message": "Task not found"})
+            return
+        if time.monotonic() < task["ready_at"]:
+            self._send_json(200, {"task_id": task_id, "status": "Processing"})
+            return
+        content = f"fake content for {task['size']} bytes"
+        self._send_json(200, {
+            "task_id": task_id,
+            "status": "Succeeded",
+            "output": [{
+                "segments": [{
+                    "page_number": 1,
+                    "segment_type": "Text",
+                    "content": content,
+                    "markdown": content,
+                }],
+                "chunk_length": len(content),
+            }],
+        })
+
+
+def start_fake_chunkr_server(port=0, latency=(1.0, 3.0), max_rps=None, seed=None):
+    """
+    在后台线程中启动模拟Chunkr服务
+
+    参数:
+    port (int): 监听端口，0表示自动分配
+    latency (tuple): 任务处理时长的随机范围（秒）
+    max_rps (int, optional): 每秒请求上限，超出返回429
+    seed (int, optional): 随机种子
+
+    返回:
+    FakeChunkrServer: 服务实例，通过 url 属性获取接口地址，用 shutdown() 停止
+    """
+    server = FakeChunkrServer(("127.0.0.1", port), latency=latency, max_rps=max_rps, seed=seed)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _sequential_baseline(file_paths, url, poll_interval):
+    """模拟原有流程：逐个提交并以固定间隔阻塞轮询"""
+    tracker = ChunkrTaskTracker(api_key="fake", url=url)
+    for path in file_paths:
+        task_id = tracker._submit_sync(path)
+        while True:
+            data = tracker._status_sync(task_id)
+            if data.get("status") == "Succeeded":
+                break
+            time.sleep(poll_interval)
+    return tracker.request_count
+
+
+def benchmark_tracker(n_documents=20, latency=(0.5, 2.0), max_rps=20,
+                      poll_interval=1.0, include_baseline=True):
+    """
+    使用模拟服务对比多路轮询与逐个阻塞轮询的延迟和吞吐量
+
+    参数:
+    n_documents (int): 文档数量
+    latency (tuple): 模拟任务处理时长范围（秒）
+    max_rps (int): 模拟服务的每秒请求上限
+    poll_interval (float): 基线流程的固定轮询间隔
+    include_baseline (bool): 是否运行逐个阻塞轮询的基线
+
+    返回:
+    dict: 各方式的耗时、吞吐量（份/分钟）、请求数和首个结果延迟
+    """
+    server = start_fake_chunkr_server(latency=latency, max_rps=max_rps, seed=0)
+    report = {"documents": n_documents}
+    try:
+        with job_scratch_dir(prefix="bench_") as scratch_dir:
+            file_paths = []
+            for i in range(n_documents):
+                path = os.path.join(scratch_dir, f"doc_{i}.pdf")
+                with open(path, "wb") as f:
+                    f.write(os.urandom(4096))
+                file_paths.append(path)
+
+            start = time.monotonic()
+            first_result = []
+
+            def on_result(path, output, error):
+                if not first_result:
+                    first_result.append(time.monotonic() - start)
+
+            tracker_kwargs = dict(
+                url=server.url, max_requests_per_second=max_rps,
+                initial_delay=0.2, max_delay=2.0,
+            )
+            server.request_count = 0
+            outputs = track_files(file_paths, api_key="fake", on_result=on_result, **tracker_kwargs)
+            elapsed = time.monotonic() - start
+            report["tracker"] = {
+                "seconds": round(elapsed, 2),
+                "throughput": round(n_documents / elapsed * 60, 1),
+                "first_result_seconds": round(first_result[0], 2) if first_result else None,
+                "requests": server.request_count,
+                "throttled": server.throttled_count,
+                "succeeded": sum(1 for output in outputs.values() if output),
+            }
+
+            if include_baseline:
+                server.request_count = 0
+                start = time.monotonic()
+                _sequential_baseline(file_paths, server.url, poll_interval)
+                elapsed = time.monotonic() - start
+                report["sequential"] = {
+                    "seconds": round(elapsed, 2),
+                    "throughput": round(n_documents / elapsed * 60, 1),
+                    "requests": server.request_count,
+                }
+    finally:
+        server.shutdown()
+        server.server_close()
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chunkr多路轮询离线基准测试")
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--min-latency", type=float, default=0.5)
+    parser.add_argument("--max-latency", type=float, default=2.0)
+    parser.add_argument("--max-rps", type=int, default=20)
+    parser.add_argument("--no-baseline", action="store_true")
+    args = parser.parse_args()
+
+    print(json.dumps(benchmark_tracker(
+        n_documents=args.documents,
+        latency=(args.min_latency, args.max_latency),
+        max_rps=args.max_rps,
+        include_baseline=not args.no_baseline,
+    ), ensure_ascii=False, indent=2))
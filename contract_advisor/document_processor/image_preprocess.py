@@ -0,0 +1,270 @@
+import io
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+from contract_advisor.document_processor.chunkr_tracker import track_files
+from contract_advisor.document_processor.scratch import job_scratch_dir
+
+# 预处理默认参数
+PREPROCESS_DEFAULTS = {
+    # 转为灰度
+    "grayscale": True,
+    # 自适应二值化（Sauvola）
+    "binarize": True,
+    "window": 31,
+    "k": 0.15,
+    # 分辨率归一化：按目标DPI缩小，未知DPI时按A4纸宽估算
+    "target_dpi": 200,
+    "page_width_inches": 8.27,
+    # 裁剪空白边距，保留的留白像素
+    "crop_margins": True,
+    "margin_padding": 16,
+    # 纠偏
+    "deskew": True,
+    "max_skew_angle": 5.0,
+    "skew_step": 0.25,
+}
+
+
+def resolve_options(options=None):
+    """
+    合并用户参数与默认参数
+
+    参数:
+    options (dict|bool, optional): 预处理参数，True表示全部使用默认值
+
+    返回:
+    dict: 完整参数
+    """
+    if options is True or options is None:
+        return dict(PREPROCESS_DEFAULTS)
+    return dict(PREPROCESS_DEFAULTS, **options)
+
+
+def to_grayscale(rgb):
+    """按ITU-R 601亮度权重将RGB数组转为灰度数组"""
+    if rgb.ndim == 2:
+        return rgb.astype(np.float32)
+    weights = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    return rgb[..., :3].astype(np.float32) @ weights
+
+
+def _box_mean(values, window):
+    """利用积分图计算每个像素邻域窗口内的均值"""
+    pad = window // 2
+    padded = np.pad(values, pad + 1, mode="edge").astype(np.float64)
+    integral = padded.cumsum(axis=0).cumsum(axis=1)
+    h, w = values.shape
+    top, left = 0, 0
+    bottom, right = top + window, left + window
+    total = (
+        integral[bottom:bottom + h, right:right + w]
+        - integral[top:top + h, right:right + w]
+        - integral[bottom:bottom + h, left:left + w]
+        + integral[top:top + h, left:left + w]
+    )
+    return total / (window * window)
+
+
+def adaptive_binarize(gray, window=31, k=0.15):
+    """
+    Sauvola自适应二值化，适应手机拍照的不均匀光照
+
+    参数:
+    gray (np.ndarray): 灰度数组
+    window (int): 邻域窗口大小
+    k (float): 标准差权重
+
+    返回:
+    np.ndarray: 布尔数组，True表示前景（文字）
+    """
+    window = max(3, window | 1)
+    mean = _box_mean(gray, window)
+    sq_mean = _box_mean(gray * gray, window)
+    std = np.sqrt(np.maximum(sq_mean - mean * mean, 0))
+    threshold = mean * (1 + k * (std / 128.0 - 1))
+    return gray < threshold
+
+
+def estimate_skew(foreground, max_angle=5.0, step=0.25, sample_width=800):
+    """
+    通过投影轮廓估计页面倾斜角度
+
+    对前景像素坐标做剪切变换后统计行直方图，方差最大的角度即文字行
+    最整齐的方向，全部计算为向量化操作，无需逐角度旋转图片。
+
+    参数:
+    foreground (np.ndarray): 布尔前景数组
+    max_angle (float): 搜索的最大角度
+    step (float): 角度步长
+    sample_width (int): 估计时使用的缩小宽度
+
+    返回:
+    float: 倾斜角度（度）
+    """
+    h, w = foreground.shape
+    stride = max(1, w // sample_width)
+    ys, xs = np.nonzero(foreground[::stride, ::stride])
+    if len(ys) < 100:
+        return 0.0
+
+    angles = np.arange(-max_angle, max_angle + step / 2, step)
+    tangents = np.tan(np.radians(angles))
+    # 每个候选角度下前景像素的行坐标
+    rows = np.rint(ys[None, :] + xs[None, :] * tangents[:, None]).astype(np.int64)
+    rows -= rows.min(axis=1, keepdims=True)
+    n_rows = int(rows.max()) + 1
+    offsets = (np.arange(len(angles)) * n_rows)[:, None]
+    histograms = np.bincount((rows + offsets).ravel(), minlength=len(angles) * n_rows)
+    scores = histograms.reshape(len(angles), n_rows).astype(np.float64).var(axis=1)
+    return float(angles[int(scores.argmax())])
+
+
+def margin_bbox(foreground, padding=16):
+    """
+    计算包含所有前景像素的边界框
+
+    返回:
+    tuple: (left, top, right, bottom)，没有前景时返回None
+    """
+    rows = np.flatnonzero(foreground.any(axis=1))
+    cols = np.flatnonzero(foreground.any(axis=0))
+    if len(rows) == 0 or len(cols) == 0:
+        return None
+    h, w = foreground.shape
+    return (
+        max(0, int(cols[0]) - padding),
+        max(0, int(rows[0]) - padding),
+        min(w, int(cols[-1]) + 1 + padding),
+        min(h, int(rows[-1]) + 1 + padding),
+    )
+
+
+def preprocess_page(image, options=None):
+    """
+    对单页图片执行分辨率归一化、灰度化、纠偏、裁边和二值化
+
+    参数:
+    image (PIL.Image): 页面图片
+    options (dict|bool, optional): 预处理参数，见 PREPROCESS_DEFAULTS
+
+    返回:
+    PIL.Image: 处理后的页面（二值化时为 "1" 模式，否则为 "L" 或 "RGB"）
+    """
+    opts = resolve_options(options)
+
+    # 分辨率归一化：只缩小不放大
+    target_dpi = opts["target_dpi"]
+    if target_dpi:
+        dpi = image.info.get("dpi", (0, 0))[0] or image.size[0] / opts["page_width_inches"]
+        if dpi > target_dpi:
+            scale = target_dpi / dpi
+            image = image.resize(
+                (max(1, int(image.size[0] * scale)), max(1, int(image.size[1] * scale))),
+                Image.LANCZOS,
+            )
+
+    grayscale = opts["grayscale"] or opts["binarize"]
+    if grayscale:
+        gray = to_grayscale(np.asarray(image.convert("RGB")))
+        image = Image.fromarray(np.clip(gray, 0, 255).astype(np.uint8), "L")
+
+    if opts["deskew"] or opts["crop_margins"]:
+        base = gray if grayscale else to_grayscale(np.asarray(image.convert("RGB")))
+        foreground = adaptive_binarize(base, opts["window"], opts["k"])
+
+        if opts["deskew"]:
+            angle = estimate_skew(foreground, opts["max_skew_angle"], opts["skew_step"])
+            if abs(angle) >= opts["skew_step"]:
+                fill = 255 if image.mode == "L" else (255, 255, 255)
+                image = image.rotate(-angle, resample=Image.BILINEAR, expand=True, fillcolor=fill)
+                if grayscale:
+                    gray = np.asarray(image, dtype=np.float32)
+                    foreground = adaptive_binarize(gray, opts["window"], opts["k"])
+                else:
+                    foreground = None
+
+        if opts["crop_margins"]:
+            if foreground is None:
+                foreground = adaptive_binarize(
+                    to_grayscale(np.asarray(image.convert("RGB"))), opts["window"], opts["k"]
+                )
+            bbox = margin_bbox(foreground, opts["margin_padding"])
+            if bbox is not None:
+                image = image.crop(bbox)
+                if grayscale:
+                    left, top, right, bottom = bbox
+                    gray = gray[top:bottom, left:right]
+
+    if opts["binarize"]:
+        binary = adaptive_binarize(gray, opts["window"], opts["k"])
+        image = Image.fromarray(np.where(binary, 0, 255).astype(np.uint8), "L").convert("1")
+
+    return image
+
+
+def _encode_png(image):
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def benchmark_preprocessing(image_paths, options=None, upload_mbps=20.0, chunkr_url=None, api_key=None):
+    """
+    对比原始路径（彩色PNG）与预处理路径的上传字节数和单页耗时
+
+    只给出 upload_mbps 时，端到端耗时按假设带宽估算（estimated_*）；给出 chunkr_url 时，
+    把两种路径编码后的页面实际提交给该接口（Chunkr或 fake_chunkr_server），
+    记录从提交到取回结果的实测耗时（measured_*）。
+
+    参数:
+    image_paths (list): 图片文件路径列表
+    options (dict|bool, optional): 预处理参数
+    upload_mbps (float): 用于估算上传时间的带宽（Mbit/s）
+    chunkr_url (str, optional): 实测往返耗时使用的Chunkr任务接口地址
+    api_key (str, optional): Chunkr API密钥
+
+    返回:
+    dict: 两种路径的总字节数、每页本地耗时、估算的每页端到端耗时，以及（给出 chunkr_url 时）
+        实测的每页端到端耗时和失败页数
+    """
+    report = {"pages": len(image_paths)}
+    for name, transform in (("original", None), ("preprocessed", options or True)):
+        with job_scratch_dir(prefix="preprocess_bench_") as scratch_dir:
+            total_bytes = 0
+            encoded_paths = []
+            start = time.perf_counter()
+            for index, path in enumerate(image_paths):
+                with Image.open(path) as img:
+                    page = img.convert("RGB")
+                    if transform is not None:
+                        page = preprocess_page(page, transform)
+                    data = _encode_png(page)
+                total_bytes += len(data)
+                if chunkr_url:
+                    encoded_path = os.path.join(scratch_dir, f"page_{index}.png")
+                    with open(encoded_path, "wb") as f:
+                        f.write(data)
+                    encoded_paths.append(encoded_path)
+            elapsed = time.perf_counter() - start
+            pages = max(len(image_paths), 1)
+            upload_seconds = total_bytes * 8 / (upload_mbps * 1e6)
+            report[name] = {
+                "bytes": total_bytes,
+                "local_ms_per_page": round(elapsed / pages * 1000, 1),
+                "estimated_end_to_end_ms_per_page": round((elapsed + upload_seconds) / pages * 1000, 1),
+            }
+
+            if chunkr_url:
+                start = time.perf_counter()
+                outputs = track_files(encoded_paths, api_key=api_key, url=chunkr_url)
+                round_trip = time.perf_counter() - start
+                report[name]["measured_end_to_end_ms_per_page"] = round((elapsed + round_trip) / pages * 1000, 1)
+                report[name]["failed_pages"] = sum(1 for output in outputs.values() if not output)
+    report["bytes_ratio"] = round(
+        report["preprocessed"]["bytes"] / max(report["original"]["bytes"], 1), 3
+    )
+    return report
@@ -1,8 +1,26 @@
 import os
-import shutil
+import json
+import resource
+import sys
+import threading
+import warnings
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
-from camel.loaders import ChunkrReader
 import io
+from contract_advisor.document_processor.chunkr_tracker import track_file, track_files
+from contract_advisor.document_processor.image_preprocess import preprocess_page, resolve_options
+from contract_advisor.document_processor.local_extractor import iter_chunkr_segments
+from contract_advisor.document_processor.ocr_cache import (
+    DEFAULT_READER_SETTINGS,
+    file_sha256,
+    get_ocr_cache,
+    ocr_cache_key,
+)
+from contract_advisor.document_processor.scratch import job_scratch_dir
+
+# 单页解码后的像素上限（约 300dpi A3 大小），超出的页面按比例缩小，避免手机原图撑大内存
+MAX_PAGE_PIXELS = int(os.environ.get("MAX_PAGE_PIXELS", 25_000_000))
 
 def get_image_files(directory):
     """
@@ -34,12 +52,14 @@ def get_image_files(directory):
         print(f"获取图片文件列表时发生错误: {str(e)}")
         return []
 
-def merge_images(image_paths):
+def merge_images(image_paths, transform=None, max_page_pixels=None):
     """
     将多张图片垂直拼接成一张图片
     
     参数:
     image_paths (list): 图片文件路径列表
+    transform (callable, optional): 拼接前对每张图片执行的处理函数
+    max_page_pixels (int, optional): 单页像素上限，超出时按比例缩小解码
     
     返回:
     PIL.Image: 拼接后的图片
@@ -49,14 +69,20 @@ def merge_images(image_paths):
             raise ValueError("没有找到图片文件")
             
         # 打开所有图片
-        images = [Image.open(path) for path in image_paths]
+        if max_page_pixels:
+            images = [load_page(path, max_page_pixels) for path in image_paths]
+        else:
+            images = [Image.open(path) for path in image_paths]
+        if transform is not None:
+            images = [transform(img.convert("RGB")) for img in images]
         
         # 计算拼接后的图片尺寸
         total_height = sum(img.size[1] for img in images)
         max_width = max(img.size[0] for img in images)
         
         # 创建新图片
-        merged_image = Image.new('RGB', (max_width, total_height))
+        mode = images[0].mode if all(img.mode == images[0].mode for img in images) else 'RGB'
+        merged_image = Image.new(mode, (max_width, total_height), 'white')
         
         # 垂直拼接图片
         y_offset = 0
@@ -72,53 +98,482 @@ def merge_images(image_paths):
         print(f"图片拼接过程中发生错误: {str(e)}")
         return None
 
-def process_images_from_directory(directory, api_key):
+def peak_rss_mb():
+    """
+    获取当前进程的峰值常驻内存（MB）
+
+    返回:
+    float: 峰值RSS
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux下单位为KB，macOS下单位为字节
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def current_rss_mb():
+    """
+    获取当前进程的常驻内存（MB）
+
+    Linux下读取 /proc/self/statm，其他平台无法读取当前值时退回峰值RSS
+
+    返回:
+    float: 当前RSS
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return peak_rss_mb()
+
+
+class RssSampler:
+    """
+    在后台线程中定期采样RSS，记录一段代码执行期间的峰值和相对起点的增量
+
+    ru_maxrss 是整个进程生命周期的峰值，无法反映单次合并的内存占用；
+    PIL的像素缓冲区也不经过Python内存分配器，tracemalloc 统计不到，因此直接采样RSS。
+    """
+
+    def __init__(self, interval=0.02):
+        """
+        参数:
+        interval (float): 采样间隔（秒）
+        """
+        self.interval = interval
+        self.baseline = 0.0
+        self.peak = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss_mb())
+
+    def __enter__(self):
+        self.baseline = self.peak = current_rss_mb()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss_mb())
+        return False
+
+    @property
+    def growth_mb(self):
+        """采样期间峰值相对起点的增量（MB）"""
+        return max(0.0, self.peak - self.baseline)
+
+
+def scaled_size(size, max_page_pixels=None):
+    """
+    计算页面按像素上限缩小后的尺寸
+
+    参数:
+    size (tuple): 原始 (宽, 高)
+    max_page_pixels (int, optional): 单页像素上限
+
+    返回:
+    tuple: 缩小后的 (宽, 高)，未超出上限时原样返回
+    """
+    width, height = size
+    if not max_page_pixels or width * height <= max_page_pixels:
+        return size
+    scale = (max_page_pixels / (width * height)) ** 0.5
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def open_page(path, max_page_pixels=None):
+    """
+    打开图片（只读取文件头），并按像素上限处理PIL的解压炸弹检查
+
+    设置了像素上限时，超过 Image.MAX_IMAGE_PIXELS 的页面会被缩小解码，
+    因此忽略PIL的 DecompressionBombWarning；超过两倍上限时PIL直接拒绝打开，
+    此时抛出带文件名的 ValueError，而不是在合并中途失败。
+
+    参数:
+    path (str): 图片路径
+    max_page_pixels (int, optional): 单页像素上限
+
+    返回:
+    PIL.Image: 尚未解码像素的图片对象
+    """
+    try:
+        with warnings.catch_warnings():
+            if max_page_pixels:
+                warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+            return Image.open(path)
+    except Image.DecompressionBombError as e:
+        raise ValueError(
+            f"图片 {os.path.basename(path)} 像素数超过PIL解码上限（Image.MAX_IMAGE_PIXELS），"
+            f"请先缩小原图: {str(e)}"
+        )
+
+
+def load_page(path, max_page_pixels=None):
+    """
+    解码单页图片并转换为RGB
+
+    参数:
+    path (str): 图片路径
+    max_page_pixels (int, optional): 单页像素上限，超出时按比例缩小解码
+
+    返回:
+    PIL.Image: 已加载到内存的页面图片
+    """
+    img = open_page(path, max_page_pixels)
+    target = scaled_size(img.size, max_page_pixels)
+    if target != img.size:
+        # JPEG可以直接以较低分辨率解码，避免先解出完整大图；再缩放到精确尺寸，与 scaled_size 一致
+        img.draft("RGB", target)
+        if img.size != target:
+            img = img.resize(target)
+    page = img.convert("RGB")
+    page.load()
+    img.close()
+    return page
+
+
+def iter_decoded_pages(image_paths, workers=4, max_page_pixels=None, transform=None):
+    """
+    在线程池中解码页面并按原顺序逐页返回
+
+    同一时刻最多只有 workers 张页面在解码或等待消费，内存占用与页数无关
+
+    参数:
+    image_paths (list): 图片文件路径列表
+    workers (int): 解码线程数
+    max_page_pixels (int, optional): 单页像素上限
+    transform (callable, optional): 对每页图片执行的处理函数
+
+    返回:
+    generator: PIL.Image页面
+    """
+    def decode(path):
+        page = load_page(path, max_page_pixels)
+        return transform(page) if transform is not None else page
+
+    workers = max(1, workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        paths = iter(image_paths)
+        for path in paths:
+            pending.append(executor.submit(decode, path))
+            if len(pending) >= workers:
+                break
+        while pending:
+            page = pending.popleft().result()
+            next_path = next(paths, None)
+            if next_path is not None:
+                pending.append(executor.submit(decode, next_path))
+            yield page
+
+
+class StreamingPdfWriter:
+    """
+    逐页写入的多页PDF容器
+
+    每页编码为JPEG后立即写入文件，写入器只保存对象偏移量，内存占用
+    与页数无关，可替代一次性拼接的超大画布。
+    """
+
+    def __init__(self, path, dpi=200, quality=85):
+        """
+        参数:
+        path (str): 输出PDF路径
+        dpi (int): 页面物理尺寸对应的分辨率
+        quality (int): JPEG质量
+        """
+        self.dpi = dpi
+        self.quality = quality
+        self._file = open(path, "wb")
+        self._offsets = {}
+        self._page_ids = []
+        # 1号对象为Catalog，2号对象为Pages，在关闭时写入
+        self._next_id = 3
+        self._file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _begin_object(self):
+        object_id = self._next_id
+        self._next_id += 1
+        self._offsets[object_id] = self._file.tell()
+        self._file.write(f"{object_id} 0 obj\n".encode("ascii"))
+        return object_id
+
+    def _write_object(self, object_id, body):
+        self._offsets[object_id] = self._file.tell()
+        self._file.write(f"{object_id} 0 obj\n".encode("ascii") + body + b"\nendobj\n")
+
+    def add_page(self, image):
+        """
+        写入一页
+
+        参数:
+        image (PIL.Image): 页面图片
+        """
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("L" if image.mode in ("1", "LA", "I", "F") else "RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=self.quality)
+        data = buffer.getvalue()
+        width, height = image.size
+        color_space = "/DeviceGray" if image.mode == "L" else "/DeviceRGB"
+        page_width = width * 72 / self.dpi
+        page_height = height * 72 / self.dpi
+
+        image_id = self._begin_object()
+        self._file.write(
+            f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+            f"/ColorSpace {color_space} /BitsPerComponent 8 /Filter /DCTDecode "
+            f"/Length {len(data)} >>\nstream\n".encode("ascii")
+        )
+        self._file.write(data)
+        self._file.write(b"\nendstream\nendobj\n")
+
+        content = f"q {page_width:.2f} 0 0 {page_height:.2f} 0 0 cm /Im0 Do Q".encode("ascii")
+        content_id = self._begin_object()
+        self._file.write(
+            f"<< /Length {len(content)} >>\nstream\n".encode("ascii")
+            + content + b"\nendstream\nendobj\n"
+        )
+
+        page_id = self._begin_object()
+        self._file.write(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {page_width:.2f} {page_height:.2f}] "
+            f"/Resources << /XObject << /Im0 {image_id} 0 R >> >> "
+            f"/Contents {content_id} 0 R >>\nendobj\n".encode("ascii")
+        )
+        self._page_ids.append(page_id)
+
+    def close(self):
+        """写入页面目录和交叉引用表并关闭文件"""
+        kids = " ".join(f"{page_id} 0 R" for page_id in self._page_ids)
+        self._write_object(
+            2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._page_ids)} >>".encode("ascii")
+        )
+        self._write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+
+        xref_offset = self._file.tell()
+        count = self._next_id
+        lines = [f"xref\n0 {count}\n", "0000000000 65535 f \n"]
+        lines.extend(f"{self._offsets[i]:010d} 00000 n \n" for i in range(1, count))
+        lines.append(f"trailer\n<< /Size {count} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n")
+        self._file.write("".join(lines).encode("ascii"))
+        self._file.close()
+
+
+def merge_images_streaming(image_paths, output_dir, container="pdf", tile_height=4000,
+                           workers=4, max_page_pixels=None, transform=None):
+    """
+    以有限内存逐页合并图片，替代一次性分配整张画布的 merge_images
+
+    参数:
+    image_paths (list): 图片文件路径列表
+    output_dir (str): 输出目录
+    container (str): "pdf" 输出单个多页PDF；"tiles" 输出固定高度的PNG分块
+    tile_height (int): 分块高度（像素），仅 tiles 模式使用
+    workers (int): 解码线程数
+    max_page_pixels (int, optional): 单页像素上限
+    transform (callable, optional): 对每页图片执行的处理函数
+
+    返回:
+    dict: 输出文件列表（output_paths）、页数（pages）、合并期间的峰值内存（peak_rss_mb）
+        和相对合并开始时的内存增量（rss_growth_mb）
+    """
+    if not image_paths:
+        raise ValueError("没有找到图片文件")
+
+    with RssSampler() as sampler:
+        output_paths, page_count = _merge_pages(
+            image_paths, output_dir, container, tile_height, workers, max_page_pixels, transform
+        )
+
+    print(
+        f"流式合并 {page_count} 页完成，峰值内存: {sampler.peak:.1f} MB，"
+        f"合并期间增加: {sampler.growth_mb:.1f} MB"
+    )
+    return {
+        "output_paths": output_paths,
+        "pages": page_count,
+        "peak_rss_mb": round(sampler.peak, 1),
+        "rss_growth_mb": round(sampler.growth_mb, 1),
+    }
+
+
+def _merge_pages(image_paths, output_dir, container, tile_height, workers, max_page_pixels, transform):
+    """逐页写入输出文件，返回 (输出文件列表, 页数)"""
+    pages = iter_decoded_pages(image_paths, workers, max_page_pixels, transform)
+    output_paths = []
+    page_count = 0
+
+    if container == "pdf":
+        output_path = os.path.join(output_dir, "merged_pages.pdf")
+        writer = StreamingPdfWriter(output_path)
+        try:
+            for page in pages:
+                writer.add_page(page)
+                page.close()
+                page_count += 1
+        finally:
+            writer.close()
+        output_paths.append(output_path)
+
+    elif container == "tiles":
+        # 页面宽度在分块内居中，与 merge_images 的排版一致；分块宽度按原图估计，
+        # 处理函数（如纠偏旋转）使页面变宽时按比例缩小到分块宽度，不会截掉右侧内容
+        width = 0
+        for path in image_paths:
+            with open_page(path, max_page_pixels) as img:
+                width = max(width, scaled_size(img.size, max_page_pixels)[0])
+
+        tile = None
+        filled = 0
+
+        def flush():
+            tile_path = os.path.join(output_dir, f"tile_{len(output_paths):04d}.png")
+            tile.crop((0, 0, width, filled)).save(tile_path, compress_level=1)
+            output_paths.append(tile_path)
+
+        for page in pages:
+            page_count += 1
+            if page.size[0] > width:
+                fitted = page.resize((width, max(1, round(page.size[1] * width / page.size[0]))), Image.LANCZOS)
+                page.close()
+                page = fitted
+            x_offset = max(0, (width - page.size[0]) // 2)
+            y = 0
+            while y < page.size[1]:
+                if tile is None:
+                    tile = Image.new(page.mode, (width, tile_height), "white")
+                    filled = 0
+                take = min(tile_height - filled, page.size[1] - y)
+                tile.paste(page.crop((0, y, page.size[0], y + take)), (x_offset, filled))
+                filled += take
+                y += take
+                if filled == tile_height:
+                    flush()
+                    tile.close()
+                    tile = None
+            page.close()
+        if tile is not None and filled:
+            flush()
+            tile.close()
+    else:
+        raise ValueError(f"不支持的容器类型: {container}")
+    return output_paths, page_count
+
+
+def merge_chunkr_outputs(outputs):
+    """
+    按顺序合并多个Chunkr输出为一个结果
+
+    参数:
+    outputs (list): Chunkr输出JSON字符串列表
+
+    返回:
+    str: 合并后的Chunkr格式JSON字符串
+    """
+    chunks = []
+    for output in outputs:
+        for segment in iter_chunkr_segments(output):
+            chunks.append({
+                "segments": [segment],
+                "chunk_length": len(segment.get("content") or ""),
+            })
+    return json.dumps({"status": "Succeeded", "output": chunks}, ensure_ascii=False, indent=4)
+
+def process_images_from_directory(directory, api_key, use_cache=True, reader_settings=None,
+                                  streaming=False, container="pdf", workers=4,
+                                  preprocess=None, max_page_pixels=MAX_PAGE_PIXELS):
     """
     处理指定目录下的所有图片并返回Chunkr的分析结果
     
     参数:
     directory (str): 图片所在的目录路径
     api_key (str): Chunkr API密钥
+    use_cache (bool): 是否使用OCR结果缓存
+    reader_settings (dict, optional): Chunkr识别参数，默认与 ChunkrReader 一致
+    streaming (bool): 是否逐页流式合并，内存占用不随页数增长
+    container (str): 流式模式的输出形式，"pdf" 或 "tiles"
+    workers (int): 流式模式的解码线程数
+    preprocess (dict|bool, optional): 上传前的图片预处理参数（灰度、二值化、
+        DPI归一化、裁边、纠偏），True表示使用默认参数，见 image_preprocess
+    max_page_pixels (int, optional): 单页像素上限，超出的页面在合并前按比例缩小，None表示不限制
     
     返回:
     dict: Chunkr处理后的输出结果
     """
     try:
+        settings = dict(DEFAULT_READER_SETTINGS, **(reader_settings or {}))
+        preprocess_options = resolve_options(preprocess) if preprocess else None
+        transform = None
+        if preprocess_options is not None:
+            transform = lambda page: preprocess_page(page, preprocess_options)
+
         # 设置API密钥
         os.environ["CHUNKR_API_KEY"] = api_key
         
-        # 创建本地数据目录
-        os.makedirs('local_data', exist_ok=True)
-        
         # 获取目录下的所有图片
         image_paths = get_image_files(directory)
         if not image_paths:
             print("指定目录下没有找到图片文件")
             return None
+
+        # 按图片顺序及内容摘要查询缓存
+        cache_key = None
+        if use_cache:
+            image_hashes = [file_sha256(path) for path in image_paths]
+            kind = f"images-{container}" if streaming else "images"
+            cache_key = ocr_cache_key(
+                kind, image_hashes,
+                dict(settings, preprocess=preprocess_options, max_page_pixels=max_page_pixels),
+            )
+            cached_output = get_ocr_cache().get(cache_key)
+            if cached_output is not None:
+                return cached_output
             
-        # 拼接图片
-        merged_image = merge_images(image_paths)
-        if merged_image is None:
-            return None
-            
-        # 设置临时文件路径
-        temp_image_path = "local_data/temp_merged_image.png"
-        
-        # 保存拼接后的图片
-        merged_image.save(temp_image_path)
-        
-        # 初始化ChunkrReader
-        chunkr_reader = ChunkrReader()
-        
-        # 提交图片处理任务
-        task_id = chunkr_reader.submit_task(file_path=temp_image_path)
-        
-        # 获取处理结果
-        chunkr_output = chunkr_reader.get_task_output(task_id, max_retries=10)
-        
-        # 清理临时文件
-        if os.path.exists(temp_image_path):
-            os.remove(temp_image_path)
+        if len(image_paths) == 1 and transform is None:
+            # 单张图片直接提交源文件，无需重新编码
+            chunkr_output = track_file(image_paths[0], api_key=api_key, reader_settings=settings)
+        elif streaming:
+            with job_scratch_dir(prefix="images_") as scratch_dir:
+                merged = merge_images_streaming(
+                    image_paths, scratch_dir, container=container, workers=workers,
+                    max_page_pixels=max_page_pixels, transform=transform,
+                )
+                outputs = track_files(
+                    merged["output_paths"], api_key=api_key, reader_settings=settings
+                )
+            if not all(outputs.values()):
+                return None
+            chunkr_output = merge_chunkr_outputs([outputs[path] for path in merged["output_paths"]])
+            if cache_key:
+                get_ocr_cache().set(cache_key, chunkr_output)
+            return chunkr_output
+        else:
+            # 拼接图片
+            merged_image = merge_images(image_paths, transform, max_page_pixels)
+            if merged_image is None:
+                return None
+
+            # 拼接结果写入本作业独立的临时目录，并发作业互不覆盖
+            with job_scratch_dir(prefix="images_") as scratch_dir:
+                temp_image_path = os.path.join(scratch_dir, "merged_image.png")
+                merged_image.save(temp_image_path, compress_level=1)
+                merged_image.close()
+
+                # 提交图片处理任务，由共享追踪器统一轮询
+                chunkr_output = track_file(temp_image_path, api_key=api_key, reader_settings=settings)
+
+        # 写入缓存
+        if cache_key and chunkr_output:
+            get_ocr_cache().set(cache_key, chunkr_output)
             
         return chunkr_output
         
@@ -0,0 +1,233 @@
+import json
+import os
+
+from contract_advisor.document_processor.scratch import job_scratch_dir
+
+# 文本层字符数低于该阈值的页面视为扫描页，交给OCR处理
+MIN_PAGE_TEXT_CHARS = int(os.environ.get("MIN_PAGE_TEXT_CHARS", 80))
+
+# 图片覆盖面积超过该比例且文本很少的页面同样视为扫描页
+MAX_IMAGE_COVERAGE = 0.6
+
+
+def is_available():
+    """检查本地PDF解析依赖（PyMuPDF）是否可用"""
+    try:
+        import fitz  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def table_to_markdown(rows):
+    """
+    将表格单元格转换为markdown表格
+
+    参数:
+    rows (list): 二维单元格列表
+
+    返回:
+    str: markdown格式表格
+    """
+    rows = [
+        [(cell or "").replace("\n", " ").replace("|", "\\|").strip() for cell in row]
+        for row in rows if row
+    ]
+    if not rows:
+        return ""
+
+    width = max(len(row) for row in rows)
+    rows = [row + [""] * (width - len(row)) for row in rows]
+    lines = [
+        "| " + " | ".join(rows[0]) + " |",
+        "| " + " | ".join(["---"] * width) + " |",
+    ]
+    lines.extend("| " + " | ".join(row) + " |" for row in rows[1:])
+    return "\n".join(lines)
+
+
+def _make_segment(page_number, segment_type, content, markdown):
+    return {
+        "page_number": page_number,
+        "segment_type": segment_type,
+        "content": content,
+        "markdown": markdown,
+    }
+
+
+def _overlaps(rect, bbox):
+    x0, y0, x1, y1 = bbox
+    return not (rect[2] <= x0 or rect[0] >= x1 or rect[3] <= y0 or rect[1] >= y1)
+
+
+def extract_page_segments(page):
+    """
+    从单个PDF页面的文本层中提取文本段落和表格
+
+    参数:
+    page (fitz.Page): PyMuPDF页面对象
+
+    返回:
+    tuple: (按阅读顺序排列的分段列表, 文本字符数, 图片覆盖比例)
+    """
+    page_number = page.number + 1
+    page_area = max(page.rect.width * page.rect.height, 1)
+
+    # 先识别表格区域，表格内的文本块不再重复输出为段落
+    tables = []
+    try:
+        tables = page.find_tables().tables
+    except Exception:
+        tables = []
+    table_boxes = [tuple(table.bbox) for table in tables]
+
+    positioned = []
+    for table in tables:
+        markdown = table_to_markdown(table.extract())
+        if markdown:
+            positioned.append((table.bbox[1], table.bbox[0],
+                               _make_segment(page_number, "Table", markdown, markdown)))
+
+    text_chars = 0
+    image_area = 0.0
+    for x0, y0, x1, y1, text, _, block_type in page.get_text("blocks"):
+        if block_type == 1:
+            image_area += (x1 - x0) * (y1 - y0)
+            continue
+        text = text.strip()
+        if not text:
+            continue
+        text_chars += len(text)
+        if any(_overlaps((x0, y0, x1, y1), box) for box in table_boxes):
+            continue
+        paragraph = " ".join(line.strip() for line in text.splitlines() if line.strip())
+        positioned.append((y0, x0, _make_segment(page_number, "Text", paragraph, paragraph)))
+
+    positioned.sort(key=lambda item: (round(item[0], 1), item[1]))
+    segments = [segment for _, _, segment in positioned]
+    return segments, text_chars, min(image_area / page_area, 1.0)
+
+
+def needs_ocr(text_chars, image_coverage):
+    """判断页面是否需要OCR（扫描页或文本过少）"""
+    if text_chars < MIN_PAGE_TEXT_CHARS:
+        return True
+    return image_coverage > MAX_IMAGE_COVERAGE and text_chars < MIN_PAGE_TEXT_CHARS * 4
+
+
+def iter_chunkr_segments(chunkr_output):
+    """
+    遍历Chunkr输出中的所有分段，兼容列表与 {"chunks": [...]} 两种格式
+
+    参数:
+    chunkr_output (str|dict): Chunkr返回的JSON字符串或字典
+
+    返回:
+    generator: 分段字典
+    """
+    data = json.loads(chunkr_output) if isinstance(chunkr_output, str) else chunkr_output
+    output = data.get("output") or []
+    chunks = output.get("chunks", []) if isinstance(output, dict) else output
+    for chunk in chunks:
+        for segment in chunk.get("segments", []):
+            yield segment
+
+
+def chunkr_to_markdown(chunkr_output):
+    """
+    将Chunkr输出转换为按顺序拼接的markdown文本
+
+    参数:
+    chunkr_output (str): Chunkr返回的JSON字符串
+
+    返回:
+    str: markdown文本，无法解析时原样返回
+    """
+    try:
+        parts = [
+            segment.get("markdown") or segment.get("content") or ""
+            for segment in iter_chunkr_segments(chunkr_output)
+        ]
+    except (ValueError, AttributeError, TypeError):
+        return chunkr_output
+    markdown = "\n\n".join(part.strip() for part in parts if part and part.strip())
+    return markdown or chunkr_output
+
+
+def extract_pdf_locally(pdf_path, ocr_pages=None):
+    """
+    优先使用PDF自带文本层提取内容，只将扫描页或低文本页交给OCR
+
+    输出与Chunkr结果相同的JSON结构（output为分块列表，每个分块包含带
+    markdown字段的分段），下游无需区分内容来源。
+
+    参数:
+    pdf_path (str): PDF文件路径
+    ocr_pages (callable, optional): 接收 {页码: 单页PDF路径} 字典，
+        返回 {页码: Chunkr输出} 的OCR回调；为None时低文本页保留原始文本
+
+    返回:
+    str: Chunkr格式的JSON字符串，extraction.failed_pages 列出OCR失败（仍为原始文本层）的页码
+    """
+    import fitz
+
+    doc = fitz.open(pdf_path)
+    try:
+        page_segments = {}
+        low_text_pages = []
+        for page in doc:
+            segments, text_chars, image_coverage = extract_page_segments(page)
+            page_segments[page.number + 1] = segments
+            if needs_ocr(text_chars, image_coverage):
+                low_text_pages.append(page.number)
+
+        ocr_page_numbers = []
+        failed_pages = []
+        if low_text_pages and ocr_pages is not None:
+            with job_scratch_dir(prefix="ocr_pages_") as scratch_dir:
+                # 将需要OCR的页面拆分为单页PDF
+                page_files = {}
+                for page_index in low_text_pages:
+                    single_page = fitz.open()
+                    single_page.insert_pdf(doc, from_page=page_index, to_page=page_index)
+                    page_file = os.path.join(scratch_dir, f"page_{page_index + 1}.pdf")
+                    single_page.save(page_file)
+                    single_page.close()
+                    page_files[page_index + 1] = page_file
+
+                outputs = ocr_pages(page_files)
+                for page_number in page_files:
+                    output = outputs.get(page_number)
+                    if not output:
+                        failed_pages.append(page_number)
+                        continue
+                    segments = []
+                    for segment in iter_chunkr_segments(output):
+                        segment = dict(segment, page_number=page_number)
+                        segments.append(segment)
+                    page_segments[page_number] = segments
+                    ocr_page_numbers.append(page_number)
+
+        # 每页作为一个分块，保持与Chunkr输出一致的结构
+        chunks = []
+        for page_number in sorted(page_segments):
+            segments = page_segments[page_number]
+            if segments:
+                chunks.append({
+                    "segments": segments,
+                    "chunk_length": sum(len(s.get("content") or "") for s in segments),
+                })
+
+        return json.dumps({
+            "status": "Succeeded",
+            "file_name": os.path.basename(pdf_path),
+            "page_count": doc.page_count,
+            "output": chunks,
+            "extraction": {
+                "local_pages": sorted(set(page_segments) - set(ocr_page_numbers)),
+                "ocr_pages": sorted(ocr_page_numbers),
+                "failed_pages": sorted(failed_pages),
+            },
+        }, ensure_ascii=False, indent=4)
+    finally:
+        doc.close()
@@ -0,0 +1,86 @@
+import hashlib
+import mmap
+import os
+import threading
+
+from contract_advisor.utils.disk_cache import DiskCache
+
+# 与 ChunkrReader.submit_task 默认值保持一致的识别参数
+DEFAULT_READER_SETTINGS = {
+    "model": "Fast",
+    "ocr_strategy": "Auto",
+    "target_chunk_length": "512",
+}
+
+# 缓存文件位置及容量设置，可通过环境变量覆盖
+OCR_CACHE_PATH = os.environ.get("OCR_CACHE_PATH", "local_data/cache/ocr_cache.sqlite")
+OCR_CACHE_MAX_BYTES = int(os.environ.get("OCR_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+OCR_CACHE_MAX_AGE = float(os.environ.get("OCR_CACHE_MAX_AGE", 30 * 24 * 3600))
+
+# 超过该大小的文件使用内存映射计算摘要，避免分块复制到用户态缓冲区
+MMAP_THRESHOLD = 16 * 1024 * 1024
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_ocr_cache():
+    """
+    获取进程内共享的OCR结果缓存
+
+    返回:
+    DiskCache: OCR缓存实例
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DiskCache(
+                OCR_CACHE_PATH,
+                max_bytes=OCR_CACHE_MAX_BYTES,
+                max_age=OCR_CACHE_MAX_AGE,
+            )
+        return _cache
+
+
+def file_sha256(path, block_size=1024 * 1024):
+    """
+    计算文件内容的SHA-256摘要
+
+    参数:
+    path (str): 文件路径
+    block_size (int): 每次读取的字节数
+
+    返回:
+    str: 十六进制摘要
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                try:
+                    for offset in range(0, size, block_size):
+                        digest.update(view[offset:offset + block_size])
+                finally:
+                    view.release()
+        else:
+            for block in iter(lambda: f.read(block_size), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def ocr_cache_key(kind, file_hashes, reader_settings=None):
+    """
+    根据文件内容摘要和识别参数生成缓存键
+
+    参数:
+    kind (str): 输入类型，如 "pdf" 或 "images"
+    file_hashes (list): 按顺序排列的文件SHA-256摘要
+    reader_settings (dict, optional): Chunkr识别参数
+
+    返回:
+    str: 缓存键
+    """
+    settings = dict(DEFAULT_READER_SETTINGS, **(reader_settings or {}))
+    return DiskCache.make_key("chunkr", kind, list(file_hashes), settings)
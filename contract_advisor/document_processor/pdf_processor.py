@@ -1,46 +1,124 @@
+import json
 import os
-import shutil
-from camel.loaders import ChunkrReader
+from concurrent.futures import ThreadPoolExecutor
+from contract_advisor.document_processor import local_extractor
+from contract_advisor.document_processor.chunkr_tracker import track_file, track_files
+from contract_advisor.document_processor.ocr_cache import (
+    DEFAULT_READER_SETTINGS,
+    file_sha256,
+    get_ocr_cache,
+    ocr_cache_key,
+)
 
-def process_pdf_document(source_pdf_path, api_key):
+def ocr_pdf_pages(page_files, settings, api_key=None):
+    """
+    将多个单页PDF提交给Chunkr识别
+
+    所有页面一次性提交，并由 ChunkrTaskTracker 在同一个循环中轮询，
+    各页面在服务端并行处理，不会因为某一页较慢而阻塞其他页面
+
+    参数:
+    page_files (dict): {页码: 单页PDF路径}
+    settings (dict): Chunkr识别参数
+    api_key (str, optional): Chunkr API密钥
+
+    返回:
+    dict: {页码: Chunkr输出}，识别失败的页面为None
+    """
+    outputs = track_files(list(page_files.values()), api_key=api_key, reader_settings=settings)
+    return {page_number: outputs.get(path) for page_number, path in page_files.items()}
+
+def failed_ocr_pages(chunkr_output):
+    """
+    返回本地提取结果中OCR失败的页码
+
+    参数:
+    chunkr_output (str): extract_pdf_locally 的输出
+
+    返回:
+    list: OCR失败的页码，无法解析或没有失败页面时为空列表
+    """
+    try:
+        return json.loads(chunkr_output).get("extraction", {}).get("failed_pages", [])
+    except (TypeError, ValueError, AttributeError):
+        return []
+
+def process_pdf_document(source_pdf_path, api_key, use_cache=True, reader_settings=None,
+                         local_first=True):
     """
     处理PDF文档并返回Chunkr的分析结果
-    
+
     参数:
     source_pdf_path (str): 源PDF文件的路径
     api_key (str): Chunkr API密钥
-    
+    use_cache (bool): 是否使用OCR结果缓存
+    reader_settings (dict, optional): Chunkr识别参数，默认与 ChunkrReader 一致
+    local_first (bool): 是否优先读取PDF文本层，只将扫描页逐页交给Chunkr
+
     返回:
-    dict: Chunkr处理后的输出结果
+    dict: Chunkr处理后的输出结果；任何扫描页OCR失败时返回None（不写入缓存，下次重新识别）
     """
     try:
+        settings = dict(DEFAULT_READER_SETTINGS, **(reader_settings or {}))
+        local_first = local_first and local_extractor.is_available()
+
+        # 按文件内容和识别参数查询缓存
+        cache_key = None
+        if use_cache:
+            kind = "pdf-local" if local_first else "pdf"
+            cache_key = ocr_cache_key(kind, [file_sha256(source_pdf_path)], settings)
+            cached_output = get_ocr_cache().get(cache_key)
+            if cached_output is not None:
+                return cached_output
+
         # 设置API密钥
         os.environ["CHUNKR_API_KEY"] = api_key
-        
-        # 创建本地数据目录
-        os.makedirs('local_data', exist_ok=True)
-        
-        # 设置目标文件路径
-        destination_path = "local_data/temp_document.pdf"
-        
-        # 复制文件到本地数据目录
-        shutil.copy2(source_pdf_path, destination_path)
-        
-        # 初始化ChunkrReader
-        chunkr_reader = ChunkrReader()
-        
-        # 提交文档处理任务
-        task_id = chunkr_reader.submit_task(file_path=destination_path)
-        
-        # 获取处理结果
-        chunkr_output = chunkr_reader.get_task_output(task_id, max_retries=10)
-        
-        # 清理临时文件
-        if os.path.exists(destination_path):
-            os.remove(destination_path)
-            
+
+        # 优先使用文本层，扫描页逐页OCR
+        if local_first:
+            chunkr_output = local_extractor.extract_pdf_locally(
+                source_pdf_path,
+                ocr_pages=lambda page_files: ocr_pdf_pages(page_files, settings, api_key),
+            )
+            # 部分页面OCR失败时结果不完整，不能缓存，也不能作为成功结果交给下游阶段
+            failed_pages = failed_ocr_pages(chunkr_output)
+            if failed_pages:
+                print(f"{source_pdf_path} 第 {', '.join(map(str, failed_pages))} 页OCR失败")
+                return None
+            if cache_key and chunkr_output:
+                get_ocr_cache().set(cache_key, chunkr_output)
+            return chunkr_output
+
+        # 直接提交源文件，由共享追踪器统一轮询，不在本线程中阻塞轮询
+        chunkr_output = track_file(source_pdf_path, api_key=api_key, reader_settings=settings)
+
+        # 写入缓存
+        if cache_key and chunkr_output:
+            get_ocr_cache().set(cache_key, chunkr_output)
+
         return chunkr_output
-        
+
     except Exception as e:
         print(f"处理过程中发生错误: {str(e)}")
         return None
+
+def warm_pdf_cache(pdf_paths, api_key, max_concurrency=4, reader_settings=None):
+    """
+    批量预热OCR缓存，已缓存的文件会被直接跳过
+
+    参数:
+    pdf_paths (list): PDF文件路径列表
+    api_key (str): Chunkr API密钥
+    max_concurrency (int): 同时处理的文件数上限
+    reader_settings (dict, optional): Chunkr识别参数
+
+    返回:
+    dict: 每个文件是否已成功写入缓存
+    """
+    pdf_paths = list(pdf_paths)
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+        outputs = executor.map(
+            lambda path: process_pdf_document(path, api_key, True, reader_settings),
+            pdf_paths,
+        )
+        return {path: output is not None for path, output in zip(pdf_paths, outputs)}
@@ -0,0 +1,224 @@
+import os
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from contract_advisor.utils.disk_cache import DiskCache
+
+# 缓存文件位置、有效期和容量上限，可通过环境变量覆盖
+SCRAPE_CACHE_PATH = os.environ.get("SCRAPE_CACHE_PATH", "local_data/cache/scrape_cache.sqlite")
+SCRAPE_CACHE_TTL = float(os.environ.get("SCRAPE_CACHE_TTL", 7 * 24 * 3600))
+SCRAPE_CACHE_MAX_BYTES = int(os.environ.get("SCRAPE_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+# 条件请求（ETag / Last-Modified）的超时时间（秒）
+REVALIDATE_TIMEOUT = 5
+
+# 规范化时去掉的跟踪参数：按名称精确匹配，utm_ 开头的参数按前缀匹配
+TRACKING_PARAMS = frozenset(("spm", "from", "fbclid", "gclid"))
+TRACKING_PREFIXES = ("utm_",)
+
+
+class ScrapeCache:
+    """
+    已抓取网页markdown的持久化缓存
+
+    以规范化URL为键，过期条目在源站支持时通过条件请求重新验证，
+    未变化则直接续期，避免重复调用抓取服务。验证信息（ETag / Last-Modified）优先取自抓取结果，
+    抓取结果中没有时在后台线程中获取，不增加未命中路径的延迟。
+    """
+
+    def __init__(self, path=SCRAPE_CACHE_PATH, ttl=SCRAPE_CACHE_TTL,
+                 max_bytes=SCRAPE_CACHE_MAX_BYTES):
+        """
+        参数:
+        path (str): 缓存文件路径
+        ttl (float): 条目有效期（秒）
+        max_bytes (int): 缓存总大小上限，超出后按最近访问时间淘汰
+        """
+        self.cache = DiskCache(path, max_bytes=max_bytes, max_age=ttl)
+        self.revalidated = 0
+        self._lock = threading.Lock()
+        self._validator_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="scrape-validators")
+
+    @staticmethod
+    def normalize_url(url):
+        """
+        规范化URL：小写协议和域名、去掉片段和跟踪参数、查询参数排序
+
+        参数:
+        url (str): 原始URL
+
+        返回:
+        str: 规范化后的URL
+        """
+        parts = urlsplit(url.strip())
+        scheme = parts.scheme.lower() or "http"
+        netloc = parts.netloc.lower()
+        if (scheme, netloc.rsplit(":", 1)[-1]) in (("http", "80"), ("https", "443")):
+            netloc = netloc.rsplit(":", 1)[0]
+        path = parts.path or "/"
+        if len(path) > 1:
+            path = path.rstrip("/")
+        query = sorted(
+            (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+            if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+        )
+        return urlunsplit((scheme, netloc, path, urlencode(query), ""))
+
+    @staticmethod
+    def _fetch_validators(url, headers=None):
+        """请求源站获取缓存验证信息，返回 (状态码, 验证信息)"""
+        request = urllib.request.Request(url, method="HEAD", headers=headers or {})
+        try:
+            with urllib.request.urlopen(request, timeout=REVALIDATE_TIMEOUT) as response:
+                status = response.status
+                response_headers = response.headers
+        except urllib.error.HTTPError as e:
+            status = e.code
+            response_headers = e.headers
+        validators = {}
+        if response_headers is not None:
+            if response_headers.get("ETag"):
+                validators["etag"] = response_headers["ETag"]
+            if response_headers.get("Last-Modified"):
+                validators["last_modified"] = response_headers["Last-Modified"]
+        return status, validators
+
+    def _revalidate(self, url, meta):
+        """对过期条目发起条件请求，源站返回304时视为未变化"""
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        if not headers:
+            return False
+        try:
+            status, _ = self._fetch_validators(url, headers)
+        except Exception:
+            return False
+        return status == 304
+
+    def get(self, url):
+        """
+        读取缓存内容，过期条目会尝试条件重新验证
+
+        参数:
+        url (str): 网页URL
+
+        返回:
+        str: 缓存的markdown内容，未命中时返回None
+        """
+        key = self.normalize_url(url)
+        content = self.cache.get(key)
+        if content is not None:
+            return content
+
+        entry = self.cache.get_entry(key)
+        if entry is not None and entry["expired"] and self._revalidate(url, entry["meta"]):
+            self.cache.touch(key)
+            # 重新验证成功等同于命中
+            self.cache.record_hit()
+            with self._lock:
+                self.revalidated += 1
+            return entry["value"]
+        return None
+
+    @staticmethod
+    def validators_from_response(response):
+        """
+        从抓取服务的返回结果（如Firecrawl的metadata）中读取ETag / Last-Modified
+
+        参数:
+        response (dict): 抓取结果
+
+        返回:
+        dict: 验证信息，没有时为空字典
+        """
+        metadata = (response or {}).get("metadata") or {}
+        headers = {str(key).lower().replace("_", "-"): value for key, value in metadata.items()}
+        validators = {}
+        if headers.get("etag"):
+            validators["etag"] = headers["etag"]
+        last_modified = headers.get("last-modified") or headers.get("lastmodified")
+        if last_modified:
+            validators["last_modified"] = last_modified
+        return validators
+
+    def _store_fetched_validators(self, url, key, content):
+        try:
+            _, validators = self._fetch_validators(url)
+        except Exception:
+            return
+        # 只在条目仍是本次写入的内容时补充验证信息
+        entry = self.cache.get_entry(key)
+        if validators and entry is not None and entry["value"] == content and not entry["meta"]:
+            self.cache.set(key, content, meta=validators)
+
+    def set(self, url, content, validators=None):
+        """
+        写入抓取结果，同时记录源站的ETag / Last-Modified用于后续重新验证
+
+        参数:
+        url (str): 网页URL
+        content (str): markdown内容
+        validators (dict, optional): 抓取结果中的验证信息；为空时在后台请求源站获取
+        """
+        key = self.normalize_url(url)
+        self.cache.set(key, content, meta=validators or None)
+        if not validators:
+            self._validator_executor.submit(self._store_fetched_validators, url, key, content)
+
+    def get_or_scrape(self, url, scrape):
+        """
+        优先读取缓存，未命中时调用抓取函数并写入缓存
+
+        参数:
+        url (str): 网页URL
+        scrape (callable): 接收URL的抓取函数，返回markdown内容，或包含 markdown 和 metadata 的抓取结果字典
+
+        返回:
+        str: markdown内容
+        """
+        content = self.get(url)
+        if content is not None:
+            return content
+        response = scrape(url)
+        validators = None
+        if isinstance(response, dict):
+            content = response.get("markdown")
+            validators = self.validators_from_response(response)
+        else:
+            content = response
+        if content:
+            self.set(url, content, validators)
+        return content
+
+    def stats(self):
+        """
+        返回命中统计
+
+        返回:
+        dict: 命中数、未命中数、命中率、重新验证次数、条目数和总字节数
+        """
+        return dict(self.cache.stats(), revalidated=self.revalidated)
+
+
+_scrape_cache = None
+_scrape_cache_lock = threading.Lock()
+
+
+def get_scrape_cache():
+    """
+    获取进程内共享的网页抓取缓存
+
+    返回:
+    ScrapeCache: 缓存实例
+    """
+    global _scrape_cache
+    with _scrape_cache_lock:
+        if _scrape_cache is None:
+            _scrape_cache = ScrapeCache()
+        return _scrape_cache
@@ -0,0 +1,25 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+# 所有作业临时目录的根目录，可通过环境变量指定到更快的磁盘
+SCRATCH_ROOT = os.environ.get("SCRATCH_ROOT", "local_data/scratch")
+
+
+@contextmanager
+def job_scratch_dir(prefix="job_"):
+    """
+    为单个处理作业创建独立的临时目录，退出时自动清理
+
+    目录名由 tempfile 生成且全局唯一，同一进程内的多个线程和不同进程
+    可以同时处理文档而不会互相覆盖临时文件。
+
+    参数:
+    prefix (str): 临时目录名前缀
+
+    返回:
+    str: 临时目录路径
+    """
+    os.makedirs(SCRATCH_ROOT, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix=prefix, dir=SCRATCH_ROOT) as path:
+        yield path
@@ -1,8 +1,62 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from camel.loaders import Firecrawl
-from camel.retrievers import AutoRetriever
 from camel.toolkits import FunctionTool, SearchToolkit
 from camel.types import ModelPlatformType, ModelType, StorageType
 from camel.embeddings import MistralEmbedding
+from contract_advisor.document_processor.scrape_cache import get_scrape_cache
+from contract_advisor.knowledge_base.lexical_rank import pre_rank
+from contract_advisor.knowledge_base.precedent_index import get_precedent_index
+from contract_advisor.knowledge_base.vector_corpus import chunk_text, get_corpus
+from contract_advisor.utils.token_budget import CONTRACT_KEYWORDS, SAFE_RATIO, TokenBudget
+
+# 单次检索结果可占用的Mistral上下文窗口比例（按 MODEL_CONTEXT_WINDOWS 查表，再乘以统一的安全比例）；
+# 对话中还有任务提示词、多轮消息和其他工具结果，单个工具结果只占窗口的一小部分
+RETRIEVAL_CONTEXT_SHARE = float(os.environ.get("RETRIEVAL_CONTEXT_SHARE", 0.125))
+
+# 检索返回的文本块数量
+RETRIEVAL_TOP_K = 3
+
+# 本地案例索引命中所需的最低相似度，低于该值时改为联网检索
+PRECEDENT_MIN_SIMILARITY = float(os.environ.get("PRECEDENT_MIN_SIMILARITY", 0.75))
+
+# 联网检索时搜索的URL数量
+PRECEDENT_SEARCH_RESULTS = 5
+
+# 并发抓取的线程数和单个URL的服务端超时时间（秒）
+SCRAPE_MAX_WORKERS = 8
+SCRAPE_TIMEOUT = 30
+
+# 一次检索中所有URL共享的总等待时间（秒），到期后仍未完成的抓取全部取消
+SCRAPE_TOTAL_TIMEOUT = 45
+
+_firecrawl = None
+_firecrawl_lock = threading.Lock()
+
+
+def get_firecrawl():
+    """
+    获取进程内共享的Firecrawl客户端，避免每个URL重新创建
+
+    返回:
+    Firecrawl: 共享客户端实例
+    """
+    global _firecrawl
+    with _firecrawl_lock:
+        if _firecrawl is None:
+            _firecrawl = Firecrawl()
+        return _firecrawl
+
+
+def _scrape_markdown(url, timeout=SCRAPE_TIMEOUT):
+    """抓取单个URL并返回markdown内容，优先读取抓取缓存，服务端超时与本地等待超时保持一致"""
+    def scrape(target_url):
+        # 返回完整抓取结果，缓存从 metadata 中读取 ETag / Last-Modified
+        return get_firecrawl().scrape(target_url, params={"timeout": int(timeout * 1000)}) or None
+
+    return get_scrape_cache().get_or_scrape(url, scrape)
 
 def scrape_url_content(url):
     """
@@ -16,14 +70,10 @@ def scrape_url_content(url):
         如果发生错误则返回None
     """
     try:
-        # 初始化Firecrawl实例
-        firecrawl = Firecrawl()
-        
-        # 抓取并清理内容
-        response = firecrawl.scrape(url=url)
-        
-        # 返回markdown格式的内容
-        return response["markdown"]
+        # 优先读取缓存，未命中时使用共享的Firecrawl实例抓取并清理内容
+        return get_scrape_cache().get_or_scrape(
+            url, lambda target_url: get_firecrawl().scrape(url=target_url)
+        )
         
     except Exception as e:
         print(f"抓取内容时发生错误: {str(e)}")
@@ -40,41 +90,62 @@ def retrieve_information_from_urls(urls: list[str], query: str) -> str:
     Returns:
         str: 基于查询检索到的最相关信息,如果所有URL都失败则返回空字符串
     """
-    # 设置Mistral API的token限制和安全阈值(80%)
-    MAX_TOKENS = 16384
-    SAFE_TOKEN_LIMIT = int(MAX_TOKENS * 0.1)  # 13107 tokens
-    CHAR_PER_TOKEN = 4  
-    SAFE_CHAR_LIMIT = SAFE_TOKEN_LIMIT * CHAR_PER_TOKEN
-    
+    # 按Mistral分词器计算token预算，中文内容不再按4字符/token估算
+    budget = TokenBudget(ModelType.MISTRAL_LARGE, ratio=SAFE_RATIO * RETRIEVAL_CONTEXT_SHARE)
+
     aggregated_content = ''
-    total_chars = 0
+    collected = []
+    total_tokens = 0
     success = False
 
-    # 抓取并聚合每个URL的内容
-    for url in urls:
-        try:
-            scraped_content = Firecrawl().scrape(url)
-            if scraped_content and "markdown" in scraped_content:
-                content = scraped_content["markdown"]
-                if content:  # 确保内容不为空
-                    content_length = len(content)
-                    
-                    # 检查是否超过安全阈值
-                    if total_chars + content_length > SAFE_CHAR_LIMIT:
-                        print(f"达到安全阈值 (50% = {SAFE_CHAR_LIMIT} 字符), 停止内容收集")
-                        break
-                        
+    # 并发抓取所有URL，按原始顺序依次汇总，保证结果确定
+    executor = ThreadPoolExecutor(max_workers=max(1, min(SCRAPE_MAX_WORKERS, len(urls))))
+    futures = [executor.submit(_scrape_markdown, url) for url in urls]
+    # 所有URL共用一个截止时间，排队等待线程的URL不会各自重新计时
+    deadline = time.monotonic() + SCRAPE_TOTAL_TIMEOUT
+    try:
+        for url, future in zip(urls, futures):
+            try:
+                content = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeoutError:
+                print(f"抓取 {url} 未在总时限 ({SCRAPE_TOTAL_TIMEOUT} 秒) 内完成，跳过")
+                continue
+            except Exception as e:
+                print(f"抓取 {url} 的内容时出错: {str(e)}")
+                continue
+
+            if content:  # 确保内容不为空
+                content_tokens = budget.count(content)
+
+                # 超过预算时，按段落保留剩余预算内价值最高的内容后停止
+                reached_limit = total_tokens + content_tokens > budget.limit
+                if reached_limit:
+                    content = budget.pack_text(
+                        content, CONTRACT_KEYWORDS, limit=budget.limit - total_tokens
+                    )
+                    content_tokens = budget.count(content)
+
+                if content:
                     aggregated_content += content
-                    total_chars += content_length
+                    collected.append((url, content))
+                    total_tokens += content_tokens
                     success = True  # 至少有一个URL成功抓取
-                    
-                    # 打印当前使用情况
-                    usage_percentage = (total_chars / SAFE_CHAR_LIMIT) * 100
-                    print(f"当前使用量: {total_chars}/{SAFE_CHAR_LIMIT} 字符 ({usage_percentage:.2f}%)")
-                
-        except Exception as e:
-            print(f"抓取 {url} 的内容时出错: {str(e)}")
-            continue
+
+                # 打印当前使用情况
+                usage_percentage = (total_tokens / budget.limit) * 100
+                print(f"当前使用量: {total_tokens}/{budget.limit} tokens ({usage_percentage:.2f}%)")
+
+                if reached_limit:
+                    print(f"达到安全阈值 ({budget.limit} tokens), 停止内容收集")
+                    break
+    finally:
+        # 达到阈值、总时限到期或全部完成后取消尚未开始的抓取，不等待仍在进行的请求
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    cache_stats = get_scrape_cache().stats()
+    print(f"抓取缓存: 命中 {cache_stats['hits']} 次, 未命中 {cache_stats['misses']} 次")
 
     # 如果没有成功抓取任何内容,返回空字符串
     if not success or not aggregated_content.strip():
@@ -82,92 +153,81 @@ def retrieve_information_from_urls(urls: list[str], query: str) -> str:
         return ""
 
     try:
-        # 设置向量检索器
-        auto_retriever = AutoRetriever(
-            vector_storage_local_path="local_data",
-            storage_type=StorageType.QDRANT,
-            embedding_model=MistralEmbedding(),
-        )
+        # 先用本地BM25对本次抓取的文本块排序，只嵌入词法相关度靠前的文本块
+        candidates = [(url, chunk) for url, content in collected for chunk in chunk_text(content)]
+        kept = pre_rank(query, [chunk for _, chunk in candidates])
+        print(f"词法预排序: 共 {len(candidates)} 个文本块，保留 {len(kept)} 个用于嵌入")
 
-        # 基于查询检索最相关的信息
-        retrieved_info = auto_retriever.run_vector_retriever(
-            query=query,
-            contents=aggregated_content,
-            top_k=3,
-            similarity_threshold=0.5,
+        # 只嵌入语料库中尚未索引的文本块，并在已索引的全部语料上检索
+        corpus = get_corpus()
+        calls_before = corpus.embedding.stats()["api_calls"]
+        kept_indexes = sorted(index for index, _ in kept)
+        new_chunks = corpus.add_chunks(
+            [candidates[index][1] for index in kept_indexes],
+            [candidates[index][0] for index in kept_indexes],
         )
-        
-        return retrieved_info if retrieved_info else ""
+
+        # 语料库只收录预排序保留的文本块，直接按向量相似度排序；预排序后再做RRF融合的召回率
+        # 低于只用向量排序（见 recall_eval.compare_recall），因此词法分数只用于筛选、不参与排序
+        retrieved = [
+            item["text"]
+            for item in corpus.query(query, top_k=RETRIEVAL_TOP_K, similarity_threshold=0.5)
+        ]
+
+        embedding_calls = corpus.embedding.stats()["api_calls"] - calls_before
+        print(f"新增文本块: {new_chunks}, 本次嵌入API调用: {embedding_calls} 次")
+
+        # 没有向量结果达到相似度阈值时视为未检索到相关内容
+        if not retrieved:
+            return ""
+        return {
+            "Original Query": query,
+            "Retrieved Context": retrieved,
+        }
 
     except Exception as e:
         print(f"检索过程中出错: {str(e)}")
         return ""
-    r"""Retrieves relevant information from a list of URLs based on a given
-    query.
 
-    This function uses the `Firecrawl` tool to scrape content from the
-    provided URLs and then uses the `AutoRetriever` from CAMEL to retrieve the
-    most relevant information based on the query from the scraped content.
+
+def retrieve_precedents(query: str) -> str:
+    """检索与查询相关的判例、法条和历史报告
+
+    优先查询本地离线案例索引，只有索引不存在或没有足够相关的结果时，
+    才联网搜索并抓取网页内容。
 
     Args:
-        urls (list[str]): A list of URLs to scrape content from.
-        query (str): The query string to search for relevant information.
+        query (str): 描述风险点或法律问题的查询字符串
 
     Returns:
-        str: The most relevant information retrieved based on the query.
-
-    Example:
-        >>> urls = ["https://example.com/article1", "https://example.com/
-        article2"]
-        >>> query = "latest advancements in AI"
-        >>> result = retrieve_information_from_urls(urls, query)
+        str: 检索到的相关内容，未找到时返回空字符串
     """
-    # 设置Mistral API的token限制和安全阈值(80%)
-    MAX_TOKENS = 16384
-    SAFE_TOKEN_LIMIT = int(MAX_TOKENS * 0.7)  # 13107 tokens
-    CHAR_PER_TOKEN = 4  # 假设平均每个token对应4个字符
-    SAFE_CHAR_LIMIT = SAFE_TOKEN_LIMIT * CHAR_PER_TOKEN
-    
-    aggregated_content = ''
-    total_chars = 0
-
-    # Scrape and aggregate content from each URL
-    for url in urls:
+    index = get_precedent_index()
+    if index is not None:
         try:
-            scraped_content = Firecrawl().scrape(url)
-            content = scraped_content["markdown"]
-            content_length = len(content)
-            
-            # 检查是否会超过安全阈值
-            if total_chars + content_length > SAFE_CHAR_LIMIT:
-                print(f"Reached safety threshold (70% = {SAFE_CHAR_LIMIT} chars), stopping content collection")
-                break
-                
-            aggregated_content += content
-            total_chars += content_length
-            
-            # 打印当前使用情况
-            usage_percentage = (total_chars / SAFE_CHAR_LIMIT) * 100
-            print(f"Current usage: {total_chars}/{SAFE_CHAR_LIMIT} chars ({usage_percentage:.2f}%)")
-            
+            results = [
+                item for item in index.query(query, top_k=RETRIEVAL_TOP_K)
+                if item["similarity"] >= PRECEDENT_MIN_SIMILARITY
+            ]
+            if results:
+                print(f"本地案例索引命中 {len(results)} 条结果")
+                return {
+                    "Original Query": query,
+                    "Retrieved Context": [item["text"] for item in results],
+                    "Sources": [item["source"] for item in results],
+                }
+            print("本地案例索引未命中，改为联网检索")
         except Exception as e:
-            print(f"Error scraping content from {url}: {str(e)}")
-            continue
-
-    # Set up a vector retriever with local storage and embedding model from Mistral AI
-    auto_retriever = AutoRetriever(
-        vector_storage_local_path="local_data",
-        storage_type=StorageType.QDRANT,
-        embedding_model=MistralEmbedding(),
-    )
-
-    # Retrieve the most relevant information based on the query
-    # You can adjust the top_k and similarity_threshold value based on your needs
-    retrieved_info = auto_retriever.run_vector_retriever(
-        query=query,
-        contents=aggregated_content,
-        top_k=3,
-        similarity_threshold=0.5,
-    )
-
-    return retrieved_info
\ No newline at end of file
+            print(f"查询本地案例索引时出错: {str(e)}")
+
+    try:
+        search_results = SearchToolkit().search_duckduckgo(
+            query, source="text", max_results=PRECEDENT_SEARCH_RESULTS
+        )
+        urls = [item["url"] for item in search_results if isinstance(item, dict) and item.get("url")]
+    except Exception as e:
+        print(f"联网搜索时出错: {str(e)}")
+        return ""
+    if not urls:
+        return ""
+    return retrieve_information_from_urls(urls, query)
@@ -0,0 +1,194 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from contract_advisor.utils.disk_cache import DiskCache
+from contract_advisor.utils.minhash import LSH_BANDS, MinHasher, band_keys, jaccard, normalize_text
+
+CLAUSE_STORE_PATH = os.environ.get("CLAUSE_STORE_PATH", "local_data/clause_store/clauses.sqlite")
+
+# 近似重复查找的估计Jaccard相似度下限（数字屏蔽后计算），设为大于1的值可关闭近似查找
+CLAUSE_NEAR_DUPLICATE_THRESHOLD = float(os.environ.get("CLAUSE_NEAR_DUPLICATE_THRESHOLD", 0.9))
+
+
+class ClauseStore:
+    """
+    条款级分析结果库
+
+    以规范化后的单个条款文本为键保存该条款的抽取结果（条款类型、摘录、风险提示等）。
+    查找时先按文本精确匹配（忽略空白和全半角差异），命中时整条结果可直接复用；
+    未命中时再用MinHash分带索引查找近似重复的条款（数字屏蔽后比较，只有金额、日期、期限等不同）。
+    近似重复的条款只有一部分字段可以复用，由调用方在写入时通过 near_duplicate 决定
+    哪些结果进入近似索引，并负责从当前条款原文重新取摘录。
+    namespace 区分不同的抽取提示词或模型，提示词变化后旧结果不再命中。
+    """
+
+    def __init__(self, path=CLAUSE_STORE_PATH, namespace="default",
+                 near_threshold=CLAUSE_NEAR_DUPLICATE_THRESHOLD, bands=LSH_BANDS):
+        """
+        参数:
+        path (str): SQLite文件路径
+        namespace (str): 结果命名空间（如抽取提示词和模型的摘要）
+        near_threshold (float): 近似重复的估计相似度下限
+        bands (int): MinHash签名的分带数
+        """
+        self.path = path
+        self.namespace = namespace
+        self.near_threshold = near_threshold
+        self.bands = bands
+        self.hasher = MinHasher()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS clauses (
+                key TEXT PRIMARY KEY,
+                namespace TEXT NOT NULL,
+                result TEXT NOT NULL,
+                signature BLOB NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS clause_bands (
+                namespace TEXT NOT NULL,
+                band INTEGER NOT NULL,
+                bucket BLOB NOT NULL,
+                key TEXT NOT NULL,
+                PRIMARY KEY (namespace, band, bucket, key)
+            );
+            """
+        )
+        self._conn.commit()
+
+    def _key(self, clause):
+        return DiskCache.make_key(self.namespace, normalize_text(clause, mask_numbers=False))
+
+    def _near_duplicate(self, clause):
+        """在近似索引中查找估计相似度最高的条款，返回 (结果JSON, 相似度) 或 None"""
+        signature = self.hasher.text_signature(clause)
+        candidates = set()
+        for band, bucket in band_keys(signature, self.bands):
+            rows = self._conn.execute(
+                "SELECT key FROM clause_bands WHERE namespace = ? AND band = ? AND bucket = ?",
+                (self.namespace, band, bucket),
+            ).fetchall()
+            candidates.update(key for key, in rows)
+
+        best = None
+        for key in candidates:
+            row = self._conn.execute("SELECT result, signature FROM clauses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                continue
+            similarity = jaccard(signature, np.frombuffer(row[1], dtype=np.uint64))
+            if similarity >= self.near_threshold and (best is None or similarity > best[2]):
+                best = (key, row[0], similarity)
+        return best
+
+    def lookup(self, clause):
+        """
+        查找条款的已有分析结果
+
+        参数:
+        clause (str): 条款原文
+
+        返回:
+        dict: match（"exact" 或 "near"）、similarity（估计相似度）、result（保存的抽取结果），
+            未命中时为None
+        """
+        key = self._key(clause)
+        with self._lock:
+            row = self._conn.execute("SELECT result FROM clauses WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                match = {"match": "exact", "similarity": 1.0, "result": row[0]}
+            else:
+                near = self._near_duplicate(clause) if self.near_threshold <= 1.0 else None
+                if near is None:
+                    self.misses += 1
+                    return None
+                key = near[0]
+                match = {"match": "near", "similarity": round(near[2], 3), "result": near[1]}
+            self._conn.execute("UPDATE clauses SET hits = hits + 1 WHERE key = ?", (key,))
+            self._conn.commit()
+            if match["match"] == "exact":
+                self.hits += 1
+            else:
+                self.near_hits += 1
+        match["result"] = json.loads(match["result"])
+        return match
+
+    def add(self, clause, result, near_duplicate=True):
+        """
+        保存条款的分析结果
+
+        参数:
+        clause (str): 条款原文
+        result (dict): 该条款的抽取结果
+        near_duplicate (bool): 是否加入近似重复索引（结果中含有只适用于该条款原文的内容时为False）
+        """
+        key = self._key(clause)
+        signature = self.hasher.text_signature(clause)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO clauses (key, namespace, result, signature, hits, created_at) "
+                "VALUES (?, ?, ?, ?, 0, ?)",
+                (key, self.namespace, json.dumps(result, ensure_ascii=False), signature.tobytes(), time.time()),
+            )
+            self._conn.execute("DELETE FROM clause_bands WHERE key = ?", (key,))
+            if near_duplicate:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO clause_bands (namespace, band, bucket, key) VALUES (?, ?, ?, ?)",
+                    [(self.namespace, band, bucket, key) for band, bucket in band_keys(signature, self.bands)],
+                )
+            self._conn.commit()
+
+    def stats(self):
+        """
+        返回统计信息
+
+        返回:
+        dict: 精确命中、近似命中、未命中次数，以及当前命名空间下的条款数
+        """
+        with self._lock:
+            clauses = self._conn.execute(
+                "SELECT COUNT(*) FROM clauses WHERE namespace = ?", (self.namespace,)
+            ).fetchone()[0]
+        return {"hits": self.hits, "near_hits": self.near_hits, "misses": self.misses, "clauses": clauses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_clause_store(namespace="default", path=CLAUSE_STORE_PATH):
+    """
+    获取指定命名空间的条款结果库（进程内共享）
+
+    参数:
+    namespace (str): 结果命名空间
+    path (str): SQLite文件路径
+
+    返回:
+    ClauseStore: 条款结果库
+    """
+    with _stores_lock:
+        store = _stores.get((path, namespace))
+        if store is None:
+            store = ClauseStore(path, namespace)
+            _stores[(path, namespace)] = store
+        return store
@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import threading
+
+from camel.embeddings import BaseEmbedding
+
+from contract_advisor.utils.disk_cache import DiskCache
+
+EMBEDDING_CACHE_PATH = os.environ.get(
+    "EMBEDDING_CACHE_PATH", "local_data/cache/embedding_cache.sqlite"
+)
+EMBEDDING_CACHE_MAX_BYTES = int(os.environ.get("EMBEDDING_CACHE_MAX_BYTES", 2 * 1024 * 1024 * 1024))
+
+# 单次嵌入API调用的最大文本数
+EMBED_BATCH_SIZE = 64
+
+
+def text_hash(text):
+    """计算文本块的SHA-256摘要"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class CachedEmbedding(BaseEmbedding[str]):
+    """
+    带持久化缓存的嵌入模型包装器
+
+    以（模型名, 文本块摘要）为键缓存向量，只对缓存中没有的文本调用
+    底层嵌入API，并统计API调用次数和命中情况。
+    """
+
+    def __init__(self, embedding_model, cache=None):
+        """
+        参数:
+        embedding_model (BaseEmbedding): 底层嵌入模型，如 MistralEmbedding
+        cache (DiskCache, optional): 向量缓存，默认使用共享的磁盘缓存
+        """
+        self.embedding_model = embedding_model
+        self.cache = cache or DiskCache(EMBEDDING_CACHE_PATH, max_bytes=EMBEDDING_CACHE_MAX_BYTES)
+        self.model_name = str(getattr(embedding_model, "model_type", type(embedding_model).__name__))
+        self.api_calls = 0
+        self.embedded_texts = 0
+        self.cache_hits = 0
+        self._lock = threading.Lock()
+
+    def _key(self, text):
+        return f"{self.model_name}:{text_hash(text)}"
+
+    def embed_list(self, objs, **kwargs):
+        """
+        生成文本向量，已缓存的文本不再调用API
+
+        参数:
+        objs (list[str]): 文本列表
+
+        返回:
+        list[list[float]]: 与输入顺序一致的向量列表
+        """
+        vectors = [None] * len(objs)
+        missing = {}
+        for index, text in enumerate(objs):
+            cached = self.cache.get(self._key(text))
+            if cached is not None:
+                vectors[index] = json.loads(cached)
+            else:
+                missing.setdefault(text, []).append(index)
+
+        with self._lock:
+            self.cache_hits += len(objs) - sum(len(indexes) for indexes in missing.values())
+
+        texts = list(missing)
+        for start in range(0, len(texts), EMBED_BATCH_SIZE):
+            batch = texts[start:start + EMBED_BATCH_SIZE]
+            batch_vectors = self.embedding_model.embed_list(batch, **kwargs)
+            with self._lock:
+                self.api_calls += 1
+                self.embedded_texts += len(batch)
+            for text, vector in zip(batch, batch_vectors):
+                self.cache.set(self._key(text), json.dumps(vector))
+                for index in missing[text]:
+                    vectors[index] = vector
+
+        return vectors
+
+    def get_output_dim(self):
+        return self.embedding_model.get_output_dim()
+
+    def stats(self):
+        """
+        返回嵌入调用统计
+
+        返回:
+        dict: API调用次数、实际嵌入的文本数、缓存命中的文本数
+        """
+        with self._lock:
+            return {
+                "api_calls": self.api_calls,
+                "embedded_texts": self.embedded_texts,
+                "cache_hits": self.cache_hits,
+            }
@@ -0,0 +1,303 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from abc import ABC, abstractmethod
+
+# 图存储后端：sqlite（嵌入式，默认）或 neo4j
+CONTRACT_GRAPH_BACKEND = os.environ.get("CONTRACT_GRAPH_BACKEND", "sqlite")
+GRAPH_STORE_PATH = os.environ.get("GRAPH_STORE_PATH", "local_data/graph/risk_graph.sqlite")
+
+# 风险因素到后果的路径查询默认最大深度和返回数量
+DEFAULT_MAX_DEPTH = 3
+DEFAULT_PATH_LIMIT = 50
+
+_ENTITY_NOISE = re.compile(r"[\s\"'“”‘’《》「」【】()（）\[\]]+")
+
+
+def normalize_entity(name):
+    """
+    生成实体的规范名称，用于跨文本块、跨合同合并重复实体，以及按名称查询图存储
+
+    参数:
+    name (str): 实体名称
+
+    返回:
+    str: NFKC、去除空白和引号括号、大小写折叠后的名称
+    """
+    normalized = unicodedata.normalize("NFKC", str(name)).casefold()
+    return _ENTITY_NOISE.sub("", normalized) or normalized.strip()
+
+
+def _relationship_type(rel_type):
+    """关系类型统一为大写下划线形式，与Neo4j写入保持一致"""
+    return str(rel_type).replace(" ", "_").upper()
+
+
+class BaseGraphStore(ABC):
+    """
+    风险知识图谱存储接口
+
+    所有后端都接收知识图谱代理生成的图元素，并提供邻居查询和
+    “风险因素 → 后果”路径查询。节点ID是 normalize_entity 生成的规范名称，
+    查询时传入的名称也先规范化，按原文名称（如“竞业限制 条款”）查询同样可以命中。
+    """
+
+    @abstractmethod
+    def add_graph_elements(self, graph_elements):
+        """
+        幂等地写入图元素
+
+        参数:
+        graph_elements (list): GraphElement 列表
+
+        返回:
+        dict: 写入的节点数和关系数
+        """
+
+    @abstractmethod
+    def neighbors(self, node_id, rel_type=None):
+        """
+        查询节点的直接后继
+
+        参数:
+        node_id (str): 节点ID或实体名称
+        rel_type (str, optional): 只返回该类型的关系
+
+        返回:
+        list: 包含 id、type、relationship 的字典列表
+        """
+
+    @abstractmethod
+    def query_consequences(self, risk_factor, max_depth=DEFAULT_MAX_DEPTH,
+                           relationship_types=None, target_type=None, limit=DEFAULT_PATH_LIMIT):
+        """
+        查询从风险因素出发的后果路径
+
+        参数:
+        risk_factor (str): 起点节点ID或实体名称
+        max_depth (int): 最大路径长度
+        relationship_types (list, optional): 只沿这些类型的关系遍历
+        target_type (str, optional): 只返回终点为该节点类型的路径
+        limit (int): 最多返回的路径数
+
+        返回:
+        list: 包含 target、depth、path（节点ID列表）、relationships 的字典列表，按长度排序
+        """
+
+    def close(self):
+        pass
+
+
+class SQLiteGraphStore(BaseGraphStore):
+    """
+    基于SQLite的嵌入式邻接表图存储
+
+    节点表按类型建索引，边表按（起点, 类型）、终点和类型建索引，
+    路径查询使用递归CTE在本地完成，无需网络往返。
+    """
+
+    def __init__(self, path=GRAPH_STORE_PATH):
+        """
+        参数:
+        path (str): SQLite文件路径
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS nodes (
+                id TEXT PRIMARY KEY,
+                type TEXT NOT NULL,
+                properties TEXT
+            );
+            CREATE TABLE IF NOT EXISTS edges (
+                src TEXT NOT NULL,
+                type TEXT NOT NULL,
+                dst TEXT NOT NULL,
+                properties TEXT,
+                PRIMARY KEY (src, type, dst)
+            );
+            CREATE INDEX IF NOT EXISTS idx_nodes_type ON nodes(type);
+            CREATE INDEX IF NOT EXISTS idx_edges_dst ON edges(dst);
+            CREATE INDEX IF NOT EXISTS idx_edges_type ON edges(type);
+            """
+        )
+        self._conn.commit()
+
+    def add_graph_elements(self, graph_elements):
+        nodes = {}
+        edges = {}
+        for element in graph_elements:
+            for node in element.nodes:
+                nodes[normalize_entity(node.id)] = (node.type, node.properties)
+            for rel in element.relationships:
+                for node in (rel.subj, rel.obj):
+                    nodes.setdefault(normalize_entity(node.id), (node.type, node.properties))
+                key = (normalize_entity(rel.subj.id), _relationship_type(rel.type), normalize_entity(rel.obj.id))
+                edges[key] = rel.properties
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO nodes (id, type, properties) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET type = excluded.type, properties = excluded.properties",
+                [
+                    (node_id, node_type, json.dumps(props or {}, ensure_ascii=False, default=str))
+                    for node_id, (node_type, props) in nodes.items()
+                ],
+            )
+            self._conn.executemany(
+                "INSERT INTO edges (src, type, dst, properties) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(src, type, dst) DO UPDATE SET properties = excluded.properties",
+                [
+                    (src, rel_type, dst, json.dumps(props or {}, ensure_ascii=False, default=str))
+                    for (src, rel_type, dst), props in edges.items()
+                ],
+            )
+            self._conn.commit()
+        return {"nodes": len(nodes), "relationships": len(edges)}
+
+    def neighbors(self, node_id, rel_type=None):
+        sql = (
+            "SELECT e.dst, n.type, e.type FROM edges e "
+            "LEFT JOIN nodes n ON n.id = e.dst WHERE e.src = ?"
+        )
+        params = [normalize_entity(node_id)]
+        if rel_type:
+            sql += " AND e.type = ?"
+            params.append(_relationship_type(rel_type))
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [{"id": dst, "type": node_type, "relationship": rel} for dst, node_type, rel in rows]
+
+    def query_consequences(self, risk_factor, max_depth=DEFAULT_MAX_DEPTH,
+                           relationship_types=None, target_type=None, limit=DEFAULT_PATH_LIMIT):
+        params = {"start": normalize_entity(risk_factor), "max_depth": max_depth, "limit": limit}
+        edge_filter = ""
+        if relationship_types:
+            names = []
+            for index, rel_type in enumerate(relationship_types):
+                params[f"rel_{index}"] = _relationship_type(rel_type)
+                names.append(f":rel_{index}")
+            edge_filter = f" AND e.type IN ({', '.join(names)})"
+
+        target_filter = ""
+        if target_type:
+            params["target_type"] = target_type
+            target_filter = " AND n.type = :target_type"
+
+        # 递归沿边扩展路径，路径中已出现的节点不再访问以避免环路
+        sql = f"""
+            WITH RECURSIVE walk(node, depth, path, rels) AS (
+                SELECT :start, 0, json_array(:start), json_array()
+                UNION ALL
+                SELECT e.dst, w.depth + 1,
+                       json_insert(w.path, '$[#]', e.dst),
+                       json_insert(w.rels, '$[#]', e.type)
+                FROM walk w JOIN edges e ON e.src = w.node
+                WHERE w.depth < :max_depth AND instr(w.path, json_quote(e.dst)) = 0{edge_filter}
+            )
+            SELECT w.node, w.depth, w.path, w.rels FROM walk w
+            LEFT JOIN nodes n ON n.id = w.node
+            WHERE w.depth > 0{target_filter}
+            ORDER BY w.depth
+            LIMIT :limit
+        """
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [
+            {"target": node, "depth": depth, "path": json.loads(path), "relationships": json.loads(rels)}
+            for node, depth, path, rels in rows
+        ]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class Neo4jGraphStore(BaseGraphStore):
+    """使用共享Neo4j连接池的图存储后端"""
+
+    def __init__(self, client=None):
+        """
+        参数:
+        client (GraphClient, optional): Neo4j客户端，默认使用进程内共享客户端
+        """
+        from contract_advisor.knowledge_base.nebula_graph.neo import get_graph_client
+
+        self.client = client or get_graph_client()
+
+    def add_graph_elements(self, graph_elements):
+        from contract_advisor.knowledge_base.nebula_graph.neo import write_graph_elements
+
+        stats = write_graph_elements(graph_elements, self.client)
+        return {"nodes": stats["nodes"], "relationships": stats["relationships"]}
+
+    def neighbors(self, node_id, rel_type=None):
+        from contract_advisor.knowledge_base.nebula_graph.neo import ENTITY_LABEL
+
+        rel_filter = "WHERE type(r) = $rel_type " if rel_type else ""
+        return self.client.query(
+            f"MATCH (s:{ENTITY_LABEL} {{id: $id}})-[r]->(t:{ENTITY_LABEL}) {rel_filter}"
+            f"RETURN t.id AS id, t.type AS type, type(r) AS relationship",
+            {"id": normalize_entity(node_id), "rel_type": _relationship_type(rel_type) if rel_type else None},
+        )
+
+    def query_consequences(self, risk_factor, max_depth=DEFAULT_MAX_DEPTH,
+                           relationship_types=None, target_type=None, limit=DEFAULT_PATH_LIMIT):
+        from contract_advisor.knowledge_base.nebula_graph.neo import ENTITY_LABEL
+
+        conditions = []
+        if relationship_types:
+            conditions.append("all(r IN relationships(p) WHERE type(r) IN $rel_types)")
+        if target_type:
+            conditions.append("t.type = $target_type")
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        rows = self.client.query(
+            f"MATCH p = (s:{ENTITY_LABEL} {{id: $id}})-[*1..{int(max_depth)}]->(t:{ENTITY_LABEL}) "
+            f"{where}"
+            f"RETURN t.id AS target, length(p) AS depth, "
+            f"[n IN nodes(p) | n.id] AS path, [r IN relationships(p) | type(r)] AS relationships "
+            f"ORDER BY depth LIMIT $limit",
+            {
+                "id": normalize_entity(risk_factor),
+                "rel_types": [_relationship_type(t) for t in relationship_types or []],
+                "target_type": target_type,
+                "limit": limit,
+            },
+        )
+        return rows
+
+
+_graph_stores = {}
+_graph_store_lock = threading.Lock()
+
+
+def get_graph_store(backend=None):
+    """
+    获取进程内共享的图存储
+
+    参数:
+    backend (str, optional): "sqlite" 或 "neo4j"，默认读取环境变量 CONTRACT_GRAPH_BACKEND
+
+    返回:
+    BaseGraphStore: 图存储实例
+    """
+    backend = (backend or CONTRACT_GRAPH_BACKEND).lower()
+    with _graph_store_lock:
+        if backend not in _graph_stores:
+            if backend == "neo4j":
+                _graph_stores[backend] = Neo4jGraphStore()
+            elif backend == "sqlite":
+                _graph_stores[backend] = SQLiteGraphStore()
+            else:
+                raise ValueError(f"不支持的图存储后端: {backend}")
+        return _graph_stores[backend]
@@ -0,0 +1,211 @@
+import json
+import os
+import re
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+
+from camel.loaders import UnstructuredIO
+from camel.storages.graph_storages.graph_element import GraphElement, Node, Relationship
+
+from contract_advisor.knowledge_base.embedding_cache import text_hash
+from contract_advisor.knowledge_base.graph_store import normalize_entity
+from contract_advisor.knowledge_base.vector_corpus import chunk_text
+from contract_advisor.utils.disk_cache import DiskCache
+
+KG_CACHE_PATH = os.environ.get("KG_CACHE_PATH", "local_data/cache/kg_cache.sqlite")
+
+# 知识图谱抽取的文本块大小和并发抽取线程数
+KG_CHUNK_SIZE = int(os.environ.get("KG_CHUNK_SIZE", 1200))
+KG_EXTRACT_WORKERS = int(os.environ.get("KG_EXTRACT_WORKERS", 4))
+
+# 抽取提示词或解析逻辑变化时递增，使旧缓存失效
+KG_EXTRACTOR_VERSION = 1
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_chunk(text):
+    """规范化文本块（NFKC、合并空白），排版差异不影响缓存命中"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def _serialize(graph_element):
+    """将图元素转换为可缓存的JSON结构"""
+    return json.dumps({
+        "nodes": [
+            {"id": str(node.id), "type": node.type, "properties": node.properties}
+            for node in graph_element.nodes
+        ],
+        "relationships": [
+            {
+                "subj": {"id": str(rel.subj.id), "type": rel.subj.type},
+                "obj": {"id": str(rel.obj.id), "type": rel.obj.type},
+                "type": rel.type,
+                "properties": rel.properties,
+            }
+            for rel in graph_element.relationships
+        ],
+    }, ensure_ascii=False, default=str)
+
+
+class KnowledgeGraphExtractor:
+    """
+    增量、去重的知识图谱抽取器
+
+    输入文本按段落切块，每个文本块的抽取结果按规范化内容摘要缓存，
+    只有新增或改动的文本块才会调用大模型；合并时按规范名称解析实体，
+    同一实体在不同文本块和不同合同中只保留一个节点。
+    """
+
+    def __init__(self, cache=None, chunk_size=KG_CHUNK_SIZE, max_workers=KG_EXTRACT_WORKERS):
+        """
+        参数:
+        cache (DiskCache, optional): 抽取结果缓存
+        chunk_size (int): 文本块字符数上限
+        max_workers (int): 并发抽取的线程数
+        """
+        self.cache = cache or DiskCache(KG_CACHE_PATH)
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.llm_calls = 0
+        self.cached_chunks = 0
+        self.failed_chunks = 0
+        self._lock = threading.Lock()
+
+    def _key(self, chunk_hash):
+        return f"v{KG_EXTRACTOR_VERSION}:{chunk_hash}"
+
+    def _extract_chunk(self, chunk, chunk_hash):
+        """调用知识图谱代理抽取单个文本块，并写入缓存"""
+        from contract_advisor.knowledge_base.nebula_graph.neo import kg_agent_pool
+
+        element = UnstructuredIO().create_element_from_text(text=chunk, element_id=chunk_hash[:16])
+        with kg_agent_pool().lease() as agent:
+            graph_element = agent.run(element, parse_graph_elements=True)
+        with self._lock:
+            self.llm_calls += 1
+        payload = _serialize(graph_element)
+        self.cache.set(self._key(chunk_hash), payload)
+        return payload
+
+    def extract(self, text):
+        """
+        抽取文本的知识图谱
+
+        参数:
+        text (str): 输入文本（如风险报告）
+
+        返回:
+        tuple: (合并后的 GraphElement, 本次统计字典)；抽取失败的文本块不写入缓存，
+            其数量和摘要记录在 failed_chunks / failed 中，下次调用会重新抽取
+        """
+        chunks = {}
+        for chunk in chunk_text(text, self.chunk_size):
+            chunks.setdefault(text_hash(normalize_chunk(chunk)), chunk)
+
+        payloads = {}
+        missing = {}
+        failed = []
+        for chunk_hash, chunk in chunks.items():
+            cached = self.cache.get(self._key(chunk_hash))
+            if cached is not None:
+                payloads[chunk_hash] = cached
+            else:
+                missing[chunk_hash] = chunk
+
+        if missing:
+            with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(missing)))) as executor:
+                futures = {
+                    chunk_hash: executor.submit(self._extract_chunk, chunk, chunk_hash)
+                    for chunk_hash, chunk in missing.items()
+                }
+                for chunk_hash, future in futures.items():
+                    try:
+                        payloads[chunk_hash] = future.result()
+                    except Exception as e:
+                        failed.append(chunk_hash)
+                        print(f"知识图谱抽取文本块失败: {str(e)}")
+
+        with self._lock:
+            self.cached_chunks += len(chunks) - len(missing)
+            self.failed_chunks += len(failed)
+
+        graph_element = self._merge([payloads[h] for h in chunks if h in payloads], text)
+        stats = {
+            "chunks": len(chunks),
+            "cached_chunks": len(chunks) - len(missing),
+            "llm_calls": len(missing) - len(failed),
+            "failed_chunks": len(failed),
+            "failed": failed,
+            "nodes": len(graph_element.nodes),
+            "relationships": len(graph_element.relationships),
+        }
+        return graph_element, stats
+
+    @staticmethod
+    def _merge(payloads, text):
+        """按规范名称合并各文本块的节点和关系"""
+        nodes = {}
+        relationships = {}
+
+        def resolve(raw):
+            key = normalize_entity(raw["id"])
+            if key not in nodes:
+                properties = dict(raw.get("properties") or {})
+                properties.setdefault("name", raw["id"])
+                nodes[key] = Node(id=key, type=raw.get("type") or "Node", properties=properties)
+            return nodes[key]
+
+        for payload in payloads:
+            data = json.loads(payload)
+            for raw in data["nodes"]:
+                resolve(raw)
+            for raw in data["relationships"]:
+                subj = resolve(raw["subj"])
+                obj = resolve(raw["obj"])
+                rel_type = str(raw["type"]).replace(" ", "_").upper()
+                relationships.setdefault(
+                    (subj.id, rel_type, obj.id),
+                    Relationship(subj=subj, obj=obj, type=rel_type,
+                                 properties=raw.get("properties") or {}),
+                )
+
+        source = UnstructuredIO().create_element_from_text(text=text, element_id=text_hash(text)[:16])
+        return GraphElement(
+            nodes=list(nodes.values()),
+            relationships=list(relationships.values()),
+            source=source,
+        )
+
+    def stats(self):
+        """
+        返回累计统计
+
+        返回:
+        dict: 累计大模型抽取成功次数、缓存命中的文本块数和抽取失败的文本块数
+        """
+        with self._lock:
+            return {
+                "llm_calls": self.llm_calls,
+                "cached_chunks": self.cached_chunks,
+                "failed_chunks": self.failed_chunks,
+            }
+
+
+_kg_extractor = None
+_kg_extractor_lock = threading.Lock()
+
+
+def get_kg_extractor():
+    """
+    获取进程内共享的知识图谱抽取器
+
+    返回:
+    KnowledgeGraphExtractor: 抽取器实例
+    """
+    global _kg_extractor
+    with _kg_extractor_lock:
+        if _kg_extractor is None:
+            _kg_extractor = KnowledgeGraphExtractor()
+        return _kg_extractor
@@ -0,0 +1,192 @@
+import math
+import os
+import re
+from collections import Counter
+
+# 嵌入前每次检索保留的文本块数量，其余低相关文本块不再嵌入
+PRE_RANK_TOP_N = int(os.environ.get("PRE_RANK_TOP_N", 24))
+
+# 与查询没有任何词项重合（BM25分数为0）的文本块不嵌入；但分数大于0的文本块少于该数量时，
+# 说明查询和网页用词不同、词法分数没有区分度，此时不按分数过滤，仍保留前 PRE_RANK_TOP_N 个
+PRE_RANK_MIN_KEEP = int(os.environ.get("PRE_RANK_MIN_KEEP", 4))
+
+# 倒数排名融合（RRF）的平滑常数
+RRF_K = 60
+
+_CJK_RUN = re.compile(r"[㐀-䶿一-鿿]+")
+_WORD = re.compile(r"[a-z0-9]+(?:[.'-][a-z0-9]+)*")
+
+# 检索中没有区分度的常见词
+STOPWORDS = frozenset(
+    "的 了 和 与 及 或 在 是 为 对 等 中 上 下 由 其 该 此 将 被 把 从 以 于 之 也 都 而 就 "
+    "the a an and or of to in on for is are be by with as at this that it from".split()
+)
+
+
+def _load_jieba():
+    """加载jieba中文分词，不可用时返回None"""
+    try:
+        import jieba
+    except ImportError:
+        return None
+    jieba.setLogLevel(60)
+    return jieba
+
+
+_jieba = _load_jieba()
+
+
+def tokenize(text):
+    """
+    将文本切分为检索词项
+
+    安装了jieba时使用搜索引擎模式分词，否则中文按二元组（bigram）切分，
+    英文和数字按单词切分。
+
+    参数:
+    text (str): 文本
+
+    返回:
+    list: 词项列表
+    """
+    text = text.lower()
+    if _jieba is not None:
+        return [
+            token for token in (t.strip() for t in _jieba.lcut_for_search(text))
+            if token and token not in STOPWORDS and (_CJK_RUN.fullmatch(token) or _WORD.fullmatch(token))
+        ]
+
+    tokens = [word for word in _WORD.findall(text) if word not in STOPWORDS]
+    for run in _CJK_RUN.findall(text):
+        if len(run) == 1:
+            if run not in STOPWORDS:
+                tokens.append(run)
+            continue
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class BM25:
+    """
+    轻量级BM25词法排序
+
+    只在单次检索的候选文本块上构建，用于嵌入前剔除导航、页脚等低相关内容。
+    """
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        """
+        参数:
+        documents (list): 文本列表
+        k1 (float): 词频饱和参数
+        b (float): 文档长度归一化参数
+        """
+        self.k1 = k1
+        self.b = b
+        self.term_freqs = [Counter(tokenize(document)) for document in documents]
+        self.lengths = [sum(freqs.values()) for freqs in self.term_freqs]
+        self.avg_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+
+        doc_freqs = Counter()
+        for freqs in self.term_freqs:
+            doc_freqs.update(freqs.keys())
+        total = len(self.term_freqs)
+        self.idf = {
+            term: math.log(1 + (total - df + 0.5) / (df + 0.5))
+            for term, df in doc_freqs.items()
+        }
+
+    def scores(self, query):
+        """
+        计算查询与每个文本的BM25分数
+
+        参数:
+        query (str): 查询字符串
+
+        返回:
+        list: 与文本顺序一致的分数列表
+        """
+        terms = set(tokenize(query))
+        results = []
+        for freqs, length in zip(self.term_freqs, self.lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / self.avg_length) if self.avg_length else self.k1
+            score = 0.0
+            for term in terms:
+                tf = freqs.get(term)
+                if tf:
+                    score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            results.append(score)
+        return results
+
+
+def pre_rank(query, chunks, top_n=PRE_RANK_TOP_N, min_keep=PRE_RANK_MIN_KEEP):
+    """
+    按BM25分数对文本块排序，保留前 top_n 个分数大于0的文本块
+
+    分数大于0的文本块不足 min_keep 个时词法分数不可靠（如“加班费”与“延长工作时间”），
+    不再剔除0分文本块，直接保留前 top_n 个，交给向量检索判断。
+
+    参数:
+    query (str): 查询字符串
+    chunks (list): 文本块列表
+    top_n (int): 保留数量上限
+    min_keep (int): 按分数过滤所需的最少命中文本块数
+
+    返回:
+    list: (文本块下标, 分数) 列表，按分数从高到低排列
+    """
+    if not chunks:
+        return []
+    scores = BM25(chunks).scores(query)
+    order = sorted(range(len(chunks)), key=lambda index: (-scores[index], index))
+    matched = sum(1 for score in scores if score > 0)
+    keep = min(top_n, matched) if matched >= min_keep else top_n
+    return [(index, scores[index]) for index in order[:keep]]
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K, weights=None):
+    """
+    使用倒数排名融合（RRF）合并多个排序结果
+
+    参数:
+    rankings (list): 多个排序列表，每个列表按相关性从高到低排列的条目（可哈希）
+    k (int): 平滑常数
+    weights (list, optional): 各排序列表的权重
+
+    返回:
+    list: (条目, 融合分数) 列表，按分数从高到低排列
+    """
+    weights = weights or [1.0] * len(rankings)
+    fused = {}
+    first_seen = {}
+    for weight, ranking in zip(weights, rankings):
+        for rank, item in enumerate(ranking):
+            fused[item] = fused.get(item, 0.0) + weight / (k + rank + 1)
+            first_seen.setdefault(item, len(first_seen))
+    return sorted(fused.items(), key=lambda pair: (-pair[1], first_seen[pair[0]]))
+
+
+def evaluate_recall(retrieve, labelled_queries, k=3):
+    """
+    在标注查询集上评估检索召回率
+
+    参数:
+    retrieve (callable): 接收查询并返回文本列表（按相关性排序）的检索函数
+    labelled_queries (list): 字典列表，包含 "query" 和 "relevant"（相关文本片段列表）
+    k (int): 只统计前 k 个结果
+
+    返回:
+    dict: 平均召回率 "recall" 和每条查询的召回率 "per_query"
+    """
+    per_query = []
+    for item in labelled_queries:
+        relevant = item["relevant"]
+        retrieved = retrieve(item["query"])[:k]
+        found = sum(
+            1 for snippet in relevant if any(snippet in text for text in retrieved)
+        )
+        per_query.append({
+            "query": item["query"],
+            "recall": found / len(relevant) if relevant else 1.0,
+        })
+    recall = sum(item["recall"] for item in per_query) / len(per_query) if per_query else 0.0
+    return {"recall": recall, "per_query": per_query}
@@ -1,12 +1,253 @@
-from camel.storages import Neo4jGraph
-from camel.loaders import UnstructuredIO
+import argparse
+import json
+import os
+import re
+import threading
+import time
+
 from camel.agents import KnowledgeGraphAgent
 
+from contract_advisor.knowledge_base.graph_store import _relationship_type, normalize_entity
+
+# 连接信息优先读取环境变量
+NEO4J_URI = os.environ.get("NEO4J_URI", "neo4j+s://653e33c2.databases.neo4j.io")
+NEO4J_USERNAME = os.environ.get("NEO4J_USERNAME", "neo4j")
+NEO4J_PASSWORD = os.environ.get("NEO4J_PASSWORD", "ZQzOnxmr2mzWa-t5F9op-DwaNStb24KAt0EgFps0H7s")
+NEO4J_DATABASE = os.environ.get("NEO4J_DATABASE", "neo4j")
+
+# 连接池大小和单次UNWIND写入的行数
+NEO4J_POOL_SIZE = int(os.environ.get("NEO4J_POOL_SIZE", 50))
+WRITE_BATCH_SIZE = 1000
+
+# 所有实体节点共有的标签，id在该标签上唯一
+ENTITY_LABEL = "Entity"
+
+_IDENTIFIER = re.compile(r"[^\w]+")
+
+
+def _identifier(name, default):
+    """将节点类型或关系类型转换为安全的Cypher标识符"""
+    cleaned = _IDENTIFIER.sub("_", str(name or "")).strip("_")
+    return cleaned or default
+
+
+def _quoted(name):
+    """转义反引号，使任意关系类型都可以作为反引号包裹的Cypher标识符"""
+    return name.replace("`", "``")
+
+
+def _properties(properties):
+    """只保留Neo4j可以存储的属性值"""
+    result = {}
+    for key, value in (properties or {}).items():
+        if isinstance(value, (str, int, float, bool)):
+            result[key] = value
+        elif value is not None:
+            result[key] = json.dumps(value, ensure_ascii=False, default=str)
+    return result
+
+
+class GraphClient:
+    """
+    基于连接池的Neo4j客户端
+
+    整个进程共享一个驱动（内部维护连接池），实体唯一性约束只在首次连接时创建。
+    """
+
+    def __init__(self, url=NEO4J_URI, username=NEO4J_USERNAME, password=NEO4J_PASSWORD,
+                 database=NEO4J_DATABASE, pool_size=NEO4J_POOL_SIZE):
+        """
+        参数:
+        url (str): Neo4j连接地址
+        username (str): 用户名
+        password (str): 密码
+        database (str): 数据库名称
+        pool_size (int): 连接池最大连接数
+        """
+        import neo4j
+
+        self.driver = neo4j.GraphDatabase.driver(
+            url, auth=(username, password), max_connection_pool_size=pool_size
+        )
+        self.driver.verify_connectivity()
+        self.database = database
+        self.queries = 0
+        self._lock = threading.Lock()
+        self.ensure_schema()
+
+    def ensure_schema(self):
+        """创建实体id唯一性约束和类型索引（已存在时不做任何事）"""
+        self.query(
+            f"CREATE CONSTRAINT entity_id IF NOT EXISTS "
+            f"FOR (e:{ENTITY_LABEL}) REQUIRE e.id IS UNIQUE"
+        )
+        self.query(
+            f"CREATE INDEX entity_type IF NOT EXISTS FOR (e:{ENTITY_LABEL}) ON (e.type)"
+        )
+
+    def query(self, cypher, params=None):
+        """
+        执行Cypher查询
+
+        参数:
+        cypher (str): Cypher语句
+        params (dict, optional): 查询参数
+
+        返回:
+        list: 结果记录字典列表
+        """
+        with self._lock:
+            self.queries += 1
+        with self.driver.session(database=self.database) as session:
+            return session.run(cypher, params or {}).data()
+
+    def write_batches(self, cypher, rows, batch_size=WRITE_BATCH_SIZE):
+        """
+        以UNWIND方式分批写入，每批一个写事务
+
+        参数:
+        cypher (str): 以 UNWIND $rows AS row 开头的Cypher语句
+        rows (list): 参数行
+        batch_size (int): 每批行数
+        """
+        with self.driver.session(database=self.database) as session:
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start:start + batch_size]
+                session.execute_write(lambda tx: tx.run(cypher, rows=batch).consume())
+                with self._lock:
+                    self.queries += 1
+
+    def close(self):
+        self.driver.close()
+
+
+def write_graph_elements(graph_elements, client=None, batch_size=WRITE_BATCH_SIZE):
+    """
+    将多个图元素批量、幂等地写入Neo4j
+
+    节点按类型分组、关系按类型分组，每组使用UNWIND + MERGE分批写入，
+    重复写入同一图元素不会产生重复节点或关系。节点ID用 normalize_entity 规范化、
+    关系类型用 _relationship_type 转换，与SQLite后端和 Neo4jGraphStore 的查询保持一致。
+
+    参数:
+    graph_elements (list): GraphElement 列表（含 nodes 和 relationships）
+    client (GraphClient, optional): 图数据库客户端，默认使用共享客户端
+    batch_size (int): 每批行数
+
+    返回:
+    dict: 写入的节点数、关系数和查询次数
+    """
+    client = client or get_graph_client()
+    queries_before = client.queries
+
+    nodes = {}
+    relationships = {}
+    for element in graph_elements:
+        for node in element.nodes:
+            nodes.setdefault(node.type, {})[normalize_entity(node.id)] = _properties(node.properties)
+        for rel in element.relationships:
+            for node in (rel.subj, rel.obj):
+                nodes.setdefault(node.type, {}).setdefault(normalize_entity(node.id), _properties(node.properties))
+            rel_type = _relationship_type(rel.type) or "RELATED_TO"
+            key = (normalize_entity(rel.subj.id), normalize_entity(rel.obj.id))
+            relationships.setdefault(rel_type, {})[key] = _properties(rel.properties)
+
+    node_count = 0
+    for node_type, rows in nodes.items():
+        label = _identifier(node_type, "Node")
+        client.write_batches(
+            f"UNWIND $rows AS row "
+            f"MERGE (n:{ENTITY_LABEL} {{id: row.id}}) "
+            f"SET n:`{label}`, n.type = row.type, n += row.properties",
+            [{"id": node_id, "type": node_type, "properties": props} for node_id, props in rows.items()],
+            batch_size,
+        )
+        node_count += len(rows)
+
+    rel_count = 0
+    for rel_type, rows in relationships.items():
+        client.write_batches(
+            f"UNWIND $rows AS row "
+            f"MATCH (s:{ENTITY_LABEL} {{id: row.subj}}) "
+            f"MATCH (o:{ENTITY_LABEL} {{id: row.obj}}) "
+            f"MERGE (s)-[r:`{_quoted(rel_type)}`]->(o) "
+            f"SET r += row.properties",
+            [{"subj": subj, "obj": obj, "properties": props} for (subj, obj), props in rows.items()],
+            batch_size,
+        )
+        rel_count += len(rows)
+
+    return {
+        "nodes": node_count,
+        "relationships": rel_count,
+        "queries": client.queries - queries_before,
+    }
+
+
+_graph_client = None
+_graph_client_lock = threading.Lock()
+
+
+def get_graph_client():
+    """
+    获取进程内共享的Neo4j客户端
+
+    返回:
+    GraphClient: 共享客户端实例
+    """
+    global _graph_client
+    with _graph_client_lock:
+        if _graph_client is None:
+            _graph_client = GraphClient()
+        return _graph_client
+
+
+def create_kg_agent():
+    """
+    创建知识图谱抽取代理
+
+    返回:
+    KnowledgeGraphAgent: 知识图谱代理
+    """
+    from camel.types import ModelPlatformType, ModelType
+    from camel.configs import MistralConfig
+
+    from contract_advisor.llm_agents.model_pool import get_model
+
+    mistral_large_2 = get_model(
+        ModelPlatformType.MISTRAL,
+        ModelType.MISTRAL_LARGE,
+        MistralConfig(temperature=0.2).as_dict(),
+        call_site="knowledge_graph",
+    )
+    return KnowledgeGraphAgent(model=mistral_large_2)
+
+
+def kg_agent_pool():
+    """
+    获取知识图谱抽取代理池
+
+    代理在一次抽取中会重置并使用自身的对话状态，抽取线程每次从池中借用一个代理，
+    用完归还；抽取线程池每次调用都会新建，代理池使预热的代理在后续抽取中被复用
+
+    返回:
+    AgentPool: 代理池
+    """
+    from contract_advisor.llm_agents.model_pool import get_agent_pool
+
+    return get_agent_pool("knowledge_graph", create_kg_agent)
+
+
+def warm_up_kg_agents(count=1):
+    """预先创建知识图谱抽取代理"""
+    kg_agent_pool().warm(count)
+
+
 def knowledge_graph_builder(text_input: str) -> None:
     r"""Build and store a knowledge graph from the provided text.
 
     This function processes the input text to create and extract nodes and relationships,
-    which are then added to a Neo4j database as a knowledge graph.
+    which are then added to the configured graph store (embedded SQLite or Neo4j).
 
     Args:
         text_input (str): The input text from which the knowledge graph is to be constructed.
@@ -14,25 +255,120 @@ def knowledge_graph_builder(text_input: str) -> None:
     Returns:
         graph_elements: The generated graph element from knowlegde graph agent.
     """
+    from contract_advisor.knowledge_base.graph_store import get_graph_store
+    from contract_advisor.knowledge_base.kg_extractor import get_kg_extractor
 
-    # Set Neo4j instance
-    n4j = Neo4jGraph(
-        url="neo4j+s://653e33c2.databases.neo4j.io",
-        username="neo4j",
-        password="ZQzOnxmr2mzWa-t5F9op-DwaNStb24KAt0EgFps0H7s",
+    # Extract nodes and relationships chunk by chunk; unchanged chunks come from the cache
+    graph_elements, stats = get_kg_extractor().extract(text_input)
+    print(
+        f"知识图谱抽取: {stats['chunks']} 个文本块, 缓存命中 {stats['cached_chunks']} 个, "
+        f"大模型调用 {stats['llm_calls']} 次"
     )
+    if stats["failed_chunks"]:
+        print(
+            f"警告: {stats['failed_chunks']}/{stats['chunks']} 个文本块抽取失败，"
+            f"知识图谱缺少这部分内容，下次构建时会重新抽取"
+        )
+
+    # Add the extracted graph elements to the configured graph store (SQLite or Neo4j)
+    get_graph_store().add_graph_elements([graph_elements])
+
+    return graph_elements
+
+
+def _synthetic_elements(n_contracts, nodes_per_contract, relationships_per_contract):
+    """生成用于写入基准测试的合成图元素，相邻合同之间共享部分实体"""
+    from types import SimpleNamespace
+    from camel.storages.graph_storages.graph_element import Node, Relationship
+
+    elements = []
+    for contract in range(n_contracts):
+        nodes = [
+            Node(id=f"entity-{(contract * nodes_per_contract // 2 + i)}",
+                 type=("Risk", "Clause", "Party", "Consequence")[i % 4],
+                 properties={"contract": contract})
+            for i in range(nodes_per_contract)
+        ]
+        relationships = [
+            Relationship(subj=nodes[i % nodes_per_contract],
+                         obj=nodes[(i * 7 + 1) % nodes_per_contract],
+                         type=("LEADS_TO", "MENTIONS", "OBLIGATES")[i % 3])
+            for i in range(relationships_per_contract)
+        ]
+        elements.append(SimpleNamespace(nodes=nodes, relationships=relationships))
+    return elements
+
+
+def benchmark_graph_writes(url="bolt://localhost:7687", username="neo4j", password="password",
+                           n_contracts=1000, nodes_per_contract=20, relationships_per_contract=30,
+                           baseline_contracts=20):
+    """
+    在本地Neo4j（如Docker容器）上对比逐个写入和批量写入的耗时
+
+    基线为每份合同新建连接、逐个图元素写入；批量方式为共享连接池后一次性分组UNWIND写入。
+
+    参数:
+    url (str): 本地Neo4j地址
+    username (str): 用户名
+    password (str): 密码
+    n_contracts (int): 批量写入的合同数
+    nodes_per_contract (int): 每份合同的节点数
+    relationships_per_contract (int): 每份合同的关系数
+    baseline_contracts (int): 基线测试的合同数，0表示跳过
+
+    返回:
+    dict: 基准测试结果
+    """
+    elements = _synthetic_elements(n_contracts, nodes_per_contract, relationships_per_contract)
+    results = {"contracts": n_contracts}
+
+    client = GraphClient(url, username, password)
+    client.query(f"MATCH (n:{ENTITY_LABEL}) DETACH DELETE n")
+    try:
+        if baseline_contracts:
+            start_time = time.monotonic()
+            for element in elements[:baseline_contracts]:
+                per_call_client = GraphClient(url, username, password)
+                write_graph_elements([element], per_call_client, batch_size=1)
+                per_call_client.close()
+            elapsed = time.monotonic() - start_time
+            results["baseline_seconds_per_contract"] = round(elapsed / baseline_contracts, 4)
+            client.query(f"MATCH (n:{ENTITY_LABEL}) DETACH DELETE n")
 
-    # Initialize instances
-    uio = UnstructuredIO()
-    kg_agent = KnowledgeGraphAgent(model=mistral_large_2)
+        start_time = time.monotonic()
+        stats = write_graph_elements(elements, client)
+        elapsed = time.monotonic() - start_time
+        results.update(stats)
+        results["batched_seconds"] = round(elapsed, 3)
+        results["batched_seconds_per_contract"] = round(elapsed / n_contracts, 5)
+        if baseline_contracts:
+            results["speedup"] = round(
+                results["baseline_seconds_per_contract"] / max(results["batched_seconds_per_contract"], 1e-9), 1
+            )
 
-    # Create an element from the provided text
-    element_example = uio.create_element_from_text(text=text_input, element_id="001")
+        # 重复写入验证幂等性
+        write_graph_elements(elements, client)
+        results["entities_after_rewrite"] = client.query(
+            f"MATCH (n:{ENTITY_LABEL}) RETURN count(n) AS count"
+        )[0]["count"]
+    finally:
+        client.close()
+    return results
 
-    # Extract nodes and relationships using the Knowledge Graph Agent
-    graph_elements = kg_agent.run(element_example, parse_graph_elements=True)
 
-    # Add the extracted graph elements to the Neo4j database
-    n4j.add_graph_elements(graph_elements=[graph_elements])
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Neo4j批量写入基准测试")
+    parser.add_argument("--url", default="bolt://localhost:7687")
+    parser.add_argument("--username", default="neo4j")
+    parser.add_argument("--password", default="password")
+    parser.add_argument("--contracts", type=int, default=1000)
+    parser.add_argument("--baseline-contracts", type=int, default=20)
+    args = parser.parse_args()
 
-    return graph_elements
\ No newline at end of file
+    print(json.dumps(benchmark_graph_writes(
+        url=args.url,
+        username=args.username,
+        password=args.password,
+        n_contracts=args.contracts,
+        baseline_contracts=args.baseline_contracts,
+    ), ensure_ascii=False, indent=2))
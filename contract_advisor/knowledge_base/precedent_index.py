@@ -0,0 +1,339 @@
+import argparse
+import json
+import mmap
+import os
+import threading
+import time
+
+import numpy as np
+
+from contract_advisor.knowledge_base.vector_corpus import chunk_text
+
+PRECEDENT_INDEX_PATH = os.environ.get("PRECEDENT_INDEX_PATH", "local_data/precedent_index")
+
+# 参与索引的文件类型
+SOURCE_EXTENSIONS = (".txt", ".md", ".pdf")
+
+# 每次查询探查的聚类数量
+DEFAULT_NPROBE = 8
+
+# K-means 迭代次数
+KMEANS_ITERATIONS = 20
+
+
+def _default_embedding():
+    """默认使用带缓存的Mistral嵌入，与在线语料库保持一致的向量空间"""
+    from camel.embeddings import MistralEmbedding
+
+    from contract_advisor.knowledge_base.embedding_cache import CachedEmbedding
+
+    return CachedEmbedding(MistralEmbedding())
+
+
+def read_source_file(path):
+    """
+    读取案例、法条或历史报告文件的文本
+
+    参数:
+    path (str): 文件路径（.txt / .md / .pdf）
+
+    返回:
+    str: 文本内容，无法读取时返回None
+    """
+    try:
+        if path.lower().endswith(".pdf"):
+            from contract_advisor.document_processor.local_extractor import (
+                chunkr_to_markdown,
+                extract_pdf_locally,
+            )
+
+            output = extract_pdf_locally(path)
+            return chunkr_to_markdown(output) if output else None
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            return f.read()
+    except Exception as e:
+        print(f"读取 {path} 时出错: {str(e)}")
+        return None
+
+
+def iter_source_files(directory):
+    """递归列出目录中所有可索引的文件（按路径排序）"""
+    paths = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.lower().endswith(SOURCE_EXTENSIONS):
+                paths.append(os.path.join(root, name))
+    return sorted(paths)
+
+
+def normalize_rows(vectors):
+    """将向量按行归一化为单位长度"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def quantize_int8(vectors):
+    """
+    按向量对称量化为int8
+
+    参数:
+    vectors (np.ndarray): float32 向量矩阵
+
+    返回:
+    tuple: (int8 向量矩阵, 每个向量的float32缩放系数)
+    """
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    quantized = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+def train_kmeans(vectors, n_clusters, iterations=KMEANS_ITERATIONS, seed=0):
+    """
+    球面K-means聚类（余弦相似度），用于倒排文件（IVF）近似检索
+
+    参数:
+    vectors (np.ndarray): 已归一化的向量矩阵
+    n_clusters (int): 聚类数量
+    iterations (int): 迭代次数
+    seed (int): 随机种子
+
+    返回:
+    tuple: (聚类中心矩阵, 每个向量所属的聚类下标)
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    assignments = np.zeros(len(vectors), dtype=np.int64)
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        for cluster in range(n_clusters):
+            members = vectors[assignments == cluster]
+            if len(members):
+                centroids[cluster] = members.sum(axis=0)
+            else:
+                # 空聚类重新选取一个随机向量作为中心
+                centroids[cluster] = vectors[rng.integers(len(vectors))]
+        centroids = normalize_rows(centroids)
+    return centroids.astype(np.float32), np.argmax(vectors @ centroids.T, axis=1)
+
+
+def build_precedent_index(source_dir, output_dir=PRECEDENT_INDEX_PATH, embedding_model=None,
+                          n_clusters=None):
+    """
+    从案例、法条和历史报告目录离线构建本地检索索引
+
+    输出目录包含：
+    - vectors.npy: 按聚类排序的int8量化向量（可内存映射）
+    - scales.npy: 每个向量的缩放系数
+    - centroids.npy / offsets.npy: IVF聚类中心和每个聚类在向量中的起止位置
+    - meta.jsonl / meta_offsets.npy: 每个文本块的内容和来源，按行偏移按需读取
+    - manifest.json: 维度、数量、嵌入模型等信息
+
+    参数:
+    source_dir (str): 源文件目录
+    output_dir (str): 索引输出目录
+    embedding_model (BaseEmbedding, optional): 嵌入模型
+    n_clusters (int, optional): 聚类数量，默认约为文本块数量的平方根
+
+    返回:
+    dict: 构建统计
+    """
+    start_time = time.monotonic()
+    embedding = embedding_model or _default_embedding()
+
+    chunks = []
+    sources = []
+    files = iter_source_files(source_dir)
+    for path in files:
+        text = read_source_file(path)
+        if not text:
+            continue
+        for chunk in chunk_text(text):
+            chunks.append(chunk)
+            sources.append(os.path.relpath(path, source_dir))
+    if not chunks:
+        print(f"警告: {source_dir} 中没有可索引的内容")
+        return None
+
+    vectors = normalize_rows(np.asarray(embedding.embed_list(chunks), dtype=np.float32))
+    n_clusters = max(1, min(n_clusters or int(np.sqrt(len(chunks))), len(chunks)))
+    centroids, assignments = train_kmeans(vectors, n_clusters)
+
+    # 按聚类排序，使每个聚类的向量在文件中连续，查询时只需读取对应区间
+    order = np.argsort(assignments, kind="stable")
+    counts = np.bincount(assignments, minlength=n_clusters)
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    quantized, scales = quantize_int8(vectors[order])
+
+    os.makedirs(output_dir, exist_ok=True)
+    np.save(os.path.join(output_dir, "vectors.npy"), quantized)
+    np.save(os.path.join(output_dir, "scales.npy"), scales)
+    np.save(os.path.join(output_dir, "centroids.npy"), centroids)
+    np.save(os.path.join(output_dir, "offsets.npy"), offsets)
+
+    meta_offsets = []
+    position = 0
+    with open(os.path.join(output_dir, "meta.jsonl"), "wb") as f:
+        for index in order:
+            line = (json.dumps(
+                {"text": chunks[index], "source": sources[index]}, ensure_ascii=False
+            ) + "\n").encode("utf-8")
+            meta_offsets.append(position)
+            f.write(line)
+            position += len(line)
+    np.save(os.path.join(output_dir, "meta_offsets.npy"), np.asarray(meta_offsets, dtype=np.int64))
+
+    manifest = {
+        "dim": int(vectors.shape[1]),
+        "count": len(chunks),
+        "clusters": n_clusters,
+        "files": len(files),
+        "embedding_model": str(getattr(embedding, "model_name", type(embedding).__name__)),
+        "built_at": time.time(),
+    }
+    with open(os.path.join(output_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    manifest["elapsed"] = round(time.monotonic() - start_time, 2)
+    manifest["bytes"] = quantized.nbytes + scales.nbytes
+    print(f"案例索引构建完成: {len(files)} 个文件, {len(chunks)} 个文本块, {n_clusters} 个聚类")
+    return manifest
+
+
+class PrecedentIndex:
+    """
+    只读、内存映射的本地案例索引
+
+    向量以int8存储并内存映射，多个工作进程加载同一索引时共享操作系统页缓存；
+    查询先比较IVF聚类中心，只对最相近的 nprobe 个聚类内的向量精确打分。
+    """
+
+    def __init__(self, path=PRECEDENT_INDEX_PATH, embedding_model=None):
+        """
+        参数:
+        path (str): 索引目录
+        embedding_model (BaseEmbedding, optional): 查询用嵌入模型，须与构建时一致
+        """
+        self.path = path
+        with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.scales = np.load(os.path.join(path, "scales.npy"), mmap_mode="r")
+        self.centroids = np.load(os.path.join(path, "centroids.npy"))
+        self.offsets = np.load(os.path.join(path, "offsets.npy"))
+        self.meta_offsets = np.load(os.path.join(path, "meta_offsets.npy"), mmap_mode="r")
+        self._meta_file = open(os.path.join(path, "meta.jsonl"), "rb")
+        self._meta = mmap.mmap(self._meta_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._embedding = embedding_model
+        self._lock = threading.Lock()
+
+    @property
+    def embedding(self):
+        with self._lock:
+            if self._embedding is None:
+                self._embedding = _default_embedding()
+            return self._embedding
+
+    def __len__(self):
+        return int(self.manifest["count"])
+
+    def _metadata(self, position):
+        start = int(self.meta_offsets[position])
+        end = self._meta.find(b"\n", start)
+        return json.loads(self._meta[start:end if end != -1 else len(self._meta)])
+
+    def search_vector(self, query_vector, top_k=3, nprobe=DEFAULT_NPROBE):
+        """
+        用查询向量检索最相近的文本块
+
+        参数:
+        query_vector (list): 查询向量
+        top_k (int): 返回数量
+        nprobe (int): 探查的聚类数量
+
+        返回:
+        list: 包含 text、source、similarity 的字典列表
+        """
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        query = query / norm
+
+        clusters = np.argsort(-(self.centroids @ query))[:max(1, nprobe)]
+        positions = []
+        similarities = []
+        for cluster in clusters:
+            start, end = int(self.offsets[cluster]), int(self.offsets[cluster + 1])
+            if start == end:
+                continue
+            block = self.vectors[start:end].astype(np.float32)
+            scores = (block @ query) * self.scales[start:end]
+            positions.append(np.arange(start, end))
+            similarities.append(scores)
+        if not positions:
+            return []
+
+        positions = np.concatenate(positions)
+        similarities = np.concatenate(similarities)
+        best = np.argsort(-similarities)[:top_k]
+        return [
+            dict(self._metadata(int(positions[index])), similarity=float(similarities[index]))
+            for index in best
+        ]
+
+    def query(self, query, top_k=3, nprobe=DEFAULT_NPROBE):
+        """
+        检索与查询文本最相关的案例文本块
+
+        参数:
+        query (str): 查询字符串
+        top_k (int): 返回数量
+        nprobe (int): 探查的聚类数量
+
+        返回:
+        list: 包含 text、source、similarity 的字典列表
+        """
+        return self.search_vector(self.embedding.embed(query), top_k=top_k, nprobe=nprobe)
+
+    def close(self):
+        self._meta.close()
+        self._meta_file.close()
+
+
+_precedent_index = None
+_precedent_index_loaded = False
+_precedent_index_lock = threading.Lock()
+
+
+def get_precedent_index():
+    """
+    获取进程内共享的本地案例索引
+
+    返回:
+    PrecedentIndex: 索引实例，索引尚未构建时返回None
+    """
+    global _precedent_index, _precedent_index_loaded
+    with _precedent_index_lock:
+        if not _precedent_index_loaded:
+            _precedent_index_loaded = True
+            if os.path.exists(os.path.join(PRECEDENT_INDEX_PATH, "manifest.json")):
+                try:
+                    _precedent_index = PrecedentIndex(PRECEDENT_INDEX_PATH)
+                except Exception as e:
+                    print(f"加载本地案例索引失败: {str(e)}")
+        return _precedent_index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="构建本地案例检索索引")
+    parser.add_argument("source_dir", help="判决书、法条和历史报告所在目录")
+    parser.add_argument("--output", default=PRECEDENT_INDEX_PATH)
+    parser.add_argument("--clusters", type=int, default=None)
+    args = parser.parse_args()
+
+    print(json.dumps(
+        build_precedent_index(args.source_dir, args.output, n_clusters=args.clusters),
+        ensure_ascii=False, indent=2,
+    ))
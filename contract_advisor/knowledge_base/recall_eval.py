@@ -0,0 +1,181 @@
+import argparse
+import json
+
+import numpy as np
+
+from contract_advisor.knowledge_base.lexical_rank import (
+    PRE_RANK_MIN_KEEP,
+    PRE_RANK_TOP_N,
+    evaluate_recall,
+    pre_rank,
+    reciprocal_rank_fusion,
+)
+
+# 模拟一次联网检索抓取到的文本块：判例、法条解读，以及导航、页脚、广告等噪声
+RECALL_CORPUS = [
+    "首页 | 法律法规 | 案例库 | 律师咨询 | 登录 | 注册 | 手机版 | 关于我们",
+    "版权所有 © 2024 某某法律网 京ICP备00000000号 未经许可不得转载 联系电话 400-000-0000",
+    "《劳动合同法》第四十七条规定，经济补偿按劳动者在本单位工作的年限，每满一年支付一个月工资的标准向劳动者支付。"
+    "六个月以上不满一年的，按一年计算；不满六个月的，向劳动者支付半个月工资的经济补偿。",
+    "劳动者月工资高于用人单位所在直辖市、设区的市级人民政府公布的本地区上年度职工月平均工资三倍的，"
+    "向其支付经济补偿的标准按职工月平均工资三倍的数额支付，支付经济补偿的年限最高不超过十二年。",
+    "用人单位违反本法规定解除或者终止劳动合同的，应当依照本法第四十七条规定的经济补偿标准的二倍向劳动者支付赔偿金。"
+    "实践中通常称为2N赔偿。",
+    "案例：张某与某科技公司劳动争议案。公司以业务调整为由单方解除劳动合同，未提前三十日书面通知，"
+    "也未支付代通知金。法院认定公司违法解除，判令支付违法解除劳动合同赔偿金。",
+    "竞业限制期限不得超过二年。用人单位应当在竞业限制期限内按月给予劳动者经济补偿，"
+    "未约定补偿的，劳动者可以要求按离职前十二个月平均工资的30%按月支付。",
+    "案例：李某竞业限制纠纷案。公司在李某离职后三个月未支付竞业限制补偿金，李某请求解除竞业限制约定，法院予以支持。",
+    "同一用人单位与同一劳动者只能约定一次试用期。劳动合同期限三个月以上不满一年的，试用期不得超过一个月；"
+    "劳动合同期限一年以上不满三年的，试用期不得超过二个月。",
+    "试用期工资不得低于本单位相同岗位最低档工资或者劳动合同约定工资的百分之八十，并不得低于用人单位所在地的最低工资标准。",
+    "安排劳动者延长工作时间的，支付不低于工资的百分之一百五十的工资报酬；休息日安排工作又不能安排补休的，"
+    "支付不低于工资的百分之二百的工资报酬；法定休假日安排工作的，支付不低于工资的百分之三百的工资报酬。",
+    "用人单位与劳动者协商一致，可以解除劳动合同。由用人单位提出协商解除的，应当向劳动者支付经济补偿；"
+    "由劳动者主动提出的，用人单位无需支付经济补偿。",
+    "协商解除协议中约定“双方再无其他争议”的条款，如存在欺诈、胁迫或者显失公平的情形，劳动者可以请求撤销。",
+    "用人单位未依法为劳动者缴纳社会保险费的，劳动者可以解除劳动合同，并要求用人单位支付经济补偿。",
+    "保密协议可以约定劳动者对用人单位的商业秘密和与知识产权相关的保密事项负有保密义务，保密义务不以支付补偿为前提。",
+    "热门推荐：2024年最新离婚财产分割指南 | 交通事故赔偿标准计算器 | 房产继承常见问题",
+    "广告：专业律师团队一对一在线咨询，首次咨询免费，立即扫码添加客服微信。",
+    "相关阅读：如何选择靠谱的律师事务所？五个方面帮你判断律师的专业能力。",
+    "本站部分内容来源于网络，如有侵权请联系删除。免责声明：本网站提供的信息仅供参考，不构成法律意见。",
+    "用户评论（128）：写得很好，收藏了 | 请问律师费怎么收？ | 感谢分享",
+    "劳动争议申请仲裁的时效期间为一年，从当事人知道或者应当知道其权利被侵害之日起计算。",
+    "用人单位自用工之日起超过一个月不满一年未与劳动者订立书面劳动合同的，应当向劳动者每月支付二倍的工资。",
+    "房屋租赁合同中，出租人应当履行房屋维修义务，承租人擅自转租的，出租人可以解除合同。",
+    "公司裁员二十人以上或者裁减不足二十人但占企业职工总数百分之十以上的，应当提前三十日向工会或者全体职工说明情况。",
+]
+
+# 标注查询集：查询仿照 extract_risk_items 产生的风险项，relevant 为相关文本块中的特征片段
+RECALL_QUERIES = [
+    {"query": "协商解除劳动合同 经济补偿 计算标准", "relevant": ["第四十七条规定", "由用人单位提出协商解除"]},
+    {"query": "高收入员工 经济补偿 上限", "relevant": ["职工月平均工资三倍"]},
+    {"query": "违法解除劳动合同 赔偿金", "relevant": ["经济补偿标准的二倍", "判令支付违法解除劳动合同赔偿金"]},
+    {"query": "竞业限制 补偿金 未支付", "relevant": ["按月给予劳动者经济补偿", "未支付竞业限制补偿金"]},
+    {"query": "试用期 期限 工资", "relevant": ["只能约定一次试用期", "试用期工资不得低于"]},
+    {"query": "加班费 计算", "relevant": ["延长工作时间"]},
+    {"query": "协商解除协议 再无争议 条款 效力", "relevant": ["双方再无其他争议"]},
+    {"query": "未缴纳社保 解除劳动合同", "relevant": ["未依法为劳动者缴纳社会保险费"]},
+    {"query": "裁员 提前通知", "relevant": ["裁员二十人以上"]},
+    {"query": "未签书面劳动合同 双倍工资", "relevant": ["未与劳动者订立书面劳动合同"]},
+]
+
+
+def candidate_recall(queries=RECALL_QUERIES, corpus=RECALL_CORPUS, top_n=PRE_RANK_TOP_N,
+                     min_keep=PRE_RANK_MIN_KEEP):
+    """
+    评估词法预排序保留下来的候选是否覆盖全部相关文本块（无需调用嵌入API）
+
+    相关文本块全部保留时，向量检索在保留集合上的排序与在全部文本块上的排序相比，
+    相关文本块的名次只会更靠前，因此预排序不会降低向量检索的召回率。
+
+    参数:
+    queries (list): 标注查询集
+    corpus (list): 文本块列表
+    top_n (int): 预排序保留数量上限
+    min_keep (int): 预排序保留数量下限
+
+    返回:
+    dict: 候选召回率 "recall"、平均保留文本块数 "avg_kept"、文本块总数 "chunks" 和每条查询的结果
+    """
+    per_query = []
+    for item in queries:
+        kept = [corpus[index] for index, _ in pre_rank(item["query"], corpus, top_n, min_keep)]
+        found = sum(1 for snippet in item["relevant"] if any(snippet in text for text in kept))
+        per_query.append({
+            "query": item["query"],
+            "recall": found / len(item["relevant"]) if item["relevant"] else 1.0,
+            "kept": len(kept),
+        })
+    return {
+        "recall": sum(item["recall"] for item in per_query) / len(per_query) if per_query else 0.0,
+        "avg_kept": sum(item["kept"] for item in per_query) / len(per_query) if per_query else 0.0,
+        "chunks": len(corpus),
+        "per_query": per_query,
+    }
+
+
+def _dense_ranking(embed, query, chunks, vectors):
+    """按余弦相似度对文本块排序"""
+    if not chunks:
+        return []
+    matrix = np.asarray(vectors, dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+    query_vector = np.asarray(embed([query])[0], dtype=np.float32)
+    query_vector /= np.linalg.norm(query_vector) + 1e-12
+    order = np.argsort(-(matrix @ query_vector), kind="stable")
+    return [chunks[index] for index in order]
+
+
+def compare_recall(embed, queries=RECALL_QUERIES, corpus=RECALL_CORPUS, k=3,
+                   top_n=PRE_RANK_TOP_N, min_keep=PRE_RANK_MIN_KEEP):
+    """
+    对比三种检索方式的召回率：只用向量检索（dense_only）、在预排序保留的文本块上做向量检索
+    （pre_ranked，即 url_crawler 的检索方式）、以及预排序 + 向量检索 + RRF融合
+    （pre_ranked_rrf，作为对照，调整融合方式时用来确认是否达到 pre_ranked 的召回率）
+
+    参数:
+    embed (callable): 接收文本列表并返回向量列表的嵌入函数，如 CachedEmbedding(...).embed_list
+    queries (list): 标注查询集
+    corpus (list): 文本块列表
+    k (int): 只统计前 k 个结果
+    top_n (int): 预排序保留数量上限
+    min_keep (int): 预排序保留数量下限
+
+    返回:
+    dict: 各方式的召回率，以及每次查询平均需要嵌入的文本块数
+    """
+    vectors = dict(zip(corpus, embed(list(corpus))))
+
+    def dense_only(query):
+        return _dense_ranking(embed, query, corpus, [vectors[text] for text in corpus])
+
+    kept_counts = []
+
+    def rankings(query):
+        kept = pre_rank(query, corpus, top_n, min_keep)
+        lexical = [corpus[index] for index, _ in kept]
+        dense = _dense_ranking(embed, query, lexical, [vectors[text] for text in lexical])
+        return lexical, dense
+
+    def pre_ranked(query):
+        lexical, dense = rankings(query)
+        kept_counts.append(len(lexical))
+        return dense
+
+    def pre_ranked_rrf(query):
+        lexical, dense = rankings(query)
+        return [text for text, _ in reciprocal_rank_fusion([dense, lexical])]
+
+    results = {
+        "dense_only": evaluate_recall(dense_only, queries, k),
+        "pre_ranked": evaluate_recall(pre_ranked, queries, k),
+        "pre_ranked_rrf": evaluate_recall(pre_ranked_rrf, queries, k),
+    }
+    embedded = sum(kept_counts) / len(kept_counts) if kept_counts else 0.0
+    report = {"k": k}
+    for name, result in results.items():
+        report[name] = {
+            "recall": result["recall"],
+            "embedded_chunks": len(corpus) if name == "dense_only" else embedded,
+        }
+    report["per_query"] = [
+        dict(query=entries[0]["query"], **{name: entry["recall"] for name, entry in zip(results, entries)})
+        for entries in zip(*(result["per_query"] for result in results.values()))
+    ]
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="词法预排序召回率评估")
+    parser.add_argument("--dense", action="store_true", help="同时用Mistral嵌入对比向量检索召回率（需要API密钥）")
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    report = {"candidates": candidate_recall()}
+    if args.dense:
+        from contract_advisor.knowledge_base.precedent_index import _default_embedding
+
+        report["retrieval"] = compare_recall(_default_embedding().embed_list, k=args.k)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
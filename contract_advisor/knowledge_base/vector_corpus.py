@@ -0,0 +1,178 @@
+import os
+import threading
+import uuid
+
+from camel.embeddings import MistralEmbedding
+from camel.storages import QdrantStorage, VectorDBQuery, VectorRecord
+
+from contract_advisor.knowledge_base.embedding_cache import CachedEmbedding, text_hash
+from contract_advisor.utils.disk_cache import DiskCache
+
+CORPUS_STORAGE_PATH = os.environ.get("CORPUS_STORAGE_PATH", "local_data/qdrant_corpus")
+CORPUS_COLLECTION = os.environ.get("CORPUS_COLLECTION", "legal_corpus")
+CORPUS_INDEX_PATH = os.environ.get("CORPUS_INDEX_PATH", "local_data/cache/corpus_index.sqlite")
+
+# 文本块的目标字符数
+CHUNK_SIZE = 800
+
+
+def chunk_text(text, chunk_size=CHUNK_SIZE):
+    """
+    按段落将文本切分为不超过 chunk_size 字符的文本块
+
+    参数:
+    text (str): 原始文本
+    chunk_size (int): 文本块字符数上限
+
+    返回:
+    list: 文本块列表
+    """
+    chunks = []
+    current = ""
+    for paragraph in text.split("\n"):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        while len(paragraph) > chunk_size:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(paragraph[:chunk_size])
+            paragraph = paragraph[chunk_size:]
+        if current and len(current) + len(paragraph) + 1 > chunk_size:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n{paragraph}" if current else paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class IncrementalCorpus:
+    """
+    持久化、增量更新的向量语料库
+
+    所有抓取内容写入同一个本地Qdrant集合，文本块以内容摘要作为ID，
+    已索引的文本块不会重复嵌入，查询直接面向已索引的全部语料。
+    """
+
+    def __init__(self, embedding_model=None, path=CORPUS_STORAGE_PATH,
+                 collection_name=CORPUS_COLLECTION, index_path=CORPUS_INDEX_PATH):
+        """
+        参数:
+        embedding_model (BaseEmbedding, optional): 嵌入模型，默认使用带缓存的 MistralEmbedding
+        path (str): 本地Qdrant存储目录
+        collection_name (str): 集合名称
+        index_path (str): 已索引文本块记录的路径
+        """
+        self.embedding = embedding_model or CachedEmbedding(MistralEmbedding())
+        self.storage = QdrantStorage(
+            vector_dim=self.embedding.get_output_dim(),
+            collection_name=collection_name,
+            path=path,
+        )
+        self.collection_name = collection_name
+        self.indexed = DiskCache(index_path)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def chunk_id(chunk_hash):
+        """由文本块摘要生成稳定的Qdrant点ID"""
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, chunk_hash))
+
+    def _index_key(self, chunk_hash):
+        return f"{self.collection_name}:{chunk_hash}"
+
+    def add_texts(self, text, source=None):
+        """
+        将文本切块后增量写入语料库，只嵌入尚未索引的文本块
+
+        参数:
+        text (str): 文本内容
+        source (str, optional): 来源（如URL）
+
+        返回:
+        int: 新增的文本块数量
+        """
+        chunks = chunk_text(text)
+        return self.add_chunks(chunks, [source] * len(chunks))
+
+    def add_chunks(self, chunks, sources=None):
+        """
+        增量写入已切好的文本块，只嵌入尚未索引的文本块（一次批量嵌入）
+
+        参数:
+        chunks (list): 文本块列表
+        sources (list, optional): 与文本块一一对应的来源（如URL）
+
+        返回:
+        int: 新增的文本块数量
+        """
+        sources = sources or [None] * len(chunks)
+        new_chunks = {}
+        for chunk, source in zip(chunks, sources):
+            chunk_hash = text_hash(chunk)
+            if chunk_hash not in new_chunks and self.indexed.get(self._index_key(chunk_hash)) is None:
+                new_chunks[chunk_hash] = (chunk, source)
+        if not new_chunks:
+            return 0
+
+        vectors = self.embedding.embed_list([chunk for chunk, _ in new_chunks.values()])
+        records = [
+            VectorRecord(
+                id=self.chunk_id(chunk_hash),
+                vector=vector,
+                payload={"text": chunk, "source": source, "hash": chunk_hash},
+            )
+            for (chunk_hash, (chunk, source)), vector in zip(new_chunks.items(), vectors)
+        ]
+        with self._lock:
+            self.storage.add(records)
+        for chunk_hash, (_, source) in new_chunks.items():
+            self.indexed.set(self._index_key(chunk_hash), source or "")
+        return len(records)
+
+    def query(self, query, top_k=3, similarity_threshold=0.5):
+        """
+        在已索引的语料中检索与查询最相关的文本块
+
+        参数:
+        query (str): 查询字符串
+        top_k (int): 返回的文本块数量
+        similarity_threshold (float): 相似度阈值
+
+        返回:
+        list: 包含 text、source、similarity 的字典列表
+        """
+        query_vector = self.embedding.embed(query)
+        with self._lock:
+            results = self.storage.query(VectorDBQuery(query_vector=query_vector, top_k=top_k))
+        return [
+            {
+                "text": result.record.payload.get("text", ""),
+                "source": result.record.payload.get("source"),
+                "similarity": result.similarity,
+            }
+            for result in results
+            if result.similarity >= similarity_threshold and result.record.payload
+        ]
+
+
+_corpus = None
+_corpus_lock = threading.Lock()
+
+
+def get_corpus():
+    """
+    获取进程内共享的向量语料库
+
+    本地Qdrant存储目录同一时间只能被一个客户端打开，因此整个进程共用一个实例
+
+    返回:
+    IncrementalCorpus: 语料库实例
+    """
+    global _corpus
+    with _corpus_lock:
+        if _corpus is None:
+            _corpus = IncrementalCorpus()
+        return _corpus
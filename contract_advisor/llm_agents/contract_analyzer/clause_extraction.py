@@ -0,0 +1,504 @@
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from difflib import SequenceMatcher
+
+from camel.agents import ChatAgent
+from camel.configs import QwenConfig
+from camel.types import ModelPlatformType, ModelType
+
+from contract_advisor.knowledge_base.clause_store import get_clause_store
+from contract_advisor.llm_agents.model_pool import get_agent_pool, get_model
+from contract_advisor.utils.disk_cache import DiskCache
+from contract_advisor.utils.minhash import normalize_text
+
+# 单个分段的字符数上限，相邻条款在上限内合并为一个分段
+SECTION_MAX_CHARS = int(os.environ.get("SECTION_MAX_CHARS", 3000))
+
+# 并发抽取的分段数
+SECTION_WORKERS = int(os.environ.get("SECTION_WORKERS", 6))
+
+# 合同条款类型（与单次分析的系统提示词保持一致）
+CLAUSE_TYPES = [
+    "竞争限制例外",
+    "竞业禁止条款",
+    "排他性条款",
+    "禁止招揽客户",
+    "禁止招揽员工",
+    "不得诋毁条款",
+    "方便终止条款",
+    "优先购买权条款",
+    "控制权变更条款",
+    "反转让条款",
+    "不设上限的责任条款",
+    "责任上限条款",
+]
+
+# 合并时取第一个非空值的字段（按分段在合同中的顺序）
+FIRST_WINS_KEYS = ("合同类型", "协议日期", "生效日期")
+
+# 近似重复的条款可以复用的字段：条款类型判断和风险提示；摘录从当前条款原文重新选取，
+# 其他字段（当事方、日期、补偿金额等）只适用于原条款，含有这些内容的结果不进入近似索引
+NEAR_DUPLICATE_KEYS = ("合同类型", "合同条款", "风险提示")
+
+_SENTENCE = re.compile(r"[^。；;！？!?\n]+[。；;！？!?]?")
+
+# 标题或条款起始行：markdown标题、“第X条”、“一、”、“1.” / “1、”
+_HEADING = re.compile(
+    r"^\s*(#{1,6}\s+\S|第[一二三四五六七八九十百零〇\d]+[条章节]|[一二三四五六七八九十]+、|\d+(\.\d+)*[\.、]\s*\S)"
+)
+
+# 抽取结果的JSON结构（分段抽取和条款抽取共用）
+RESULT_SCHEMA = """{
+  "合同类型": "",
+  "当事方": [{"名称": "", "角色": "", "注册地": ""}],
+  "协议日期": "",
+  "生效日期": "",
+  "合同条款": {"<条款类型>": {"存在": "是/否", "摘录": [""]}},
+  "解除补偿": {"未结工资": [""], "经济补偿": [""], "支付安排": [""], "其他补偿": [""]},
+  "义务约定": {"离职交接": [""], "保密义务": [""], "违约责任": [""]},
+  "合规性分析": {"支付安排合规性": [""], "显失公平条款": [""], "争议条款": [""]},
+  "风险提示": {"付款风险": [""], "义务履行风险": [""], "其他事项": [""]}
+}"""
+
+SECTION_SYSTEM_PROMPT = """您是一位专业的劳动纠纷方向的律师专家。您将只看到合同的一个片段，请仅根据该片段内容提取信息，片段中没有的信息留空。
+
+请输出且只输出一个 JSON 对象，结构如下：
+""" + RESULT_SCHEMA + """
+
+“合同条款”只需列出在该片段中出现的条款类型，可选类型：""" + "、".join(CLAUSE_TYPES) + """。
+不要包含任何可以直接关联到个人的信息。"""
+
+# 条款库模式的抽取提示词：一次调用抽取多个条款，但每个条款单独给出结果，以便按条款保存和复用
+CLAUSE_SYSTEM_PROMPT = """您是一位专业的劳动纠纷方向的律师专家。您将看到合同中若干带编号的条款（【条款1】、【条款2】……），
+请逐条、仅根据该条款本身的内容提取信息，条款中没有的信息留空。
+
+请输出且只输出一个 JSON 对象：{"条款": [<结果>, ...]}，每个编号的条款都必须输出一项，其中“编号”为条款编号，其余字段结构如下：
+""" + RESULT_SCHEMA + """
+
+“合同条款”只需列出在该条款中出现的条款类型，可选类型：""" + "、".join(CLAUSE_TYPES) + """。
+不要包含任何可以直接关联到个人的信息。"""
+
+
+def split_clauses(markdown, max_chars=SECTION_MAX_CHARS):
+    """
+    在标题、“第X条”等条款起始处把合同markdown切成条款块，单个超长条款按行切分
+
+    参数:
+    markdown (str): 合同markdown文本
+    max_chars (int): 单个条款块的字符数上限
+
+    返回:
+    list: 条款块列表（保持原文顺序）
+    """
+    blocks = []
+    current = []
+    for line in markdown.split("\n"):
+        if _HEADING.match(line) and current:
+            blocks.append("\n".join(current).strip())
+            current = []
+        current.append(line)
+    if current:
+        blocks.append("\n".join(current).strip())
+
+    clauses = []
+    for block in blocks:
+        while len(block) > max_chars:
+            cut = block.rfind("\n", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            clauses.append(block[:cut].strip())
+            block = block[cut:].strip()
+        if block:
+            clauses.append(block)
+    return clauses
+
+
+def pack_clauses(clauses, max_chars=SECTION_MAX_CHARS):
+    """
+    按原文顺序把相邻条款块合并到不超过 max_chars 的分段中
+
+    参数:
+    clauses (list): 条款块列表
+    max_chars (int): 分段字符数上限
+
+    返回:
+    list: 每个分段包含的条款块下标列表
+    """
+    groups = []
+    pending = []
+    size = 0
+    for index, clause in enumerate(clauses):
+        if pending and size + len(clause) + 1 > max_chars:
+            groups.append(pending)
+            pending, size = [], 0
+        pending.append(index)
+        size += len(clause) + 1
+    if pending:
+        groups.append(pending)
+    return groups
+
+
+def split_sections(markdown, max_chars=SECTION_MAX_CHARS):
+    """
+    按标题或条款编号切分合同markdown
+
+    先在标题、“第X条”等条款起始处切成条款块，再按原文顺序把相邻条款块
+    合并到不超过 max_chars 的分段中；单个超长条款按行切分。
+
+    参数:
+    markdown (str): 合同markdown文本
+    max_chars (int): 分段字符数上限
+
+    返回:
+    list: 分段文本列表（保持原文顺序）
+    """
+    clauses = split_clauses(markdown, max_chars)
+    return ["\n".join(clauses[index] for index in group) for group in pack_clauses(clauses, max_chars)]
+
+
+def parse_json_object(text):
+    """
+    从模型回复中解析JSON对象（允许包含```json代码块或前后说明文字）
+
+    参数:
+    text (str): 模型回复
+
+    返回:
+    dict: 解析结果，无法解析时返回None
+    """
+    start = text.find("{")
+    end = text.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    try:
+        value = json.loads(text[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+    return value if isinstance(value, dict) else None
+
+
+def _is_empty(value):
+    return value in (None, "", [], {}) or (isinstance(value, str) and not value.strip())
+
+
+def _merge_values(left, right, key=None):
+    """确定性地合并两个分段结果中的同一字段"""
+    if _is_empty(right):
+        return left
+    if _is_empty(left):
+        return right
+    if key in FIRST_WINS_KEYS:
+        return left
+    if key == "存在":
+        return "是" if "是" in (left, right) else left
+    if isinstance(left, dict) and isinstance(right, dict):
+        merged = dict(left)
+        for sub_key, value in right.items():
+            merged[sub_key] = _merge_values(merged.get(sub_key), value, sub_key)
+        return merged
+    if isinstance(left, list) or isinstance(right, list):
+        merged = []
+        seen = set()
+        for item in (left if isinstance(left, list) else [left]) + (right if isinstance(right, list) else [right]):
+            marker = json.dumps(item, ensure_ascii=False, sort_keys=True)
+            if not _is_empty(item) and marker not in seen:
+                seen.add(marker)
+                merged.append(item)
+        return merged
+    if left == right:
+        return left
+    return f"{left}；{right}"
+
+
+def merge_partials(partials):
+    """
+    按分段顺序合并各分段的抽取结果
+
+    标量字段取第一个非空值，列表按出现顺序去重合并，条款“存在”任一分段为“是”即为“是”。
+    所有条款类型都会出现在结果中，未出现的记为“否”。
+
+    参数:
+    partials (list): 各分段的JSON结果（按原文顺序）
+
+    返回:
+    dict: 合并后的完整结果
+    """
+    merged = {}
+    for partial in partials:
+        for key, value in partial.items():
+            merged[key] = _merge_values(merged.get(key), value, key)
+
+    clauses = merged.get("合同条款") if isinstance(merged.get("合同条款"), dict) else {}
+    merged["合同条款"] = {
+        clause_type: {
+            "存在": (clauses.get(clause_type) or {}).get("存在") or "否",
+            "摘录": (clauses.get(clause_type) or {}).get("摘录") or [],
+        }
+        for clause_type in CLAUSE_TYPES
+    }
+    return merged
+
+
+def create_section_agent():
+    """创建分段抽取代理（模型客户端来自模型池）"""
+    return ChatAgent(
+        system_message=SECTION_SYSTEM_PROMPT,
+        model=get_model(
+            ModelPlatformType.QWEN,
+            ModelType.QWEN_TURBO,
+            QwenConfig(temperature=0.0).as_dict(),
+            call_site="clause_extraction",
+        ),
+        message_window_size=2,
+        output_language='Chinese'
+    )
+
+
+def _extract_section(section):
+    with get_agent_pool("clause_extraction", create_section_agent).lease() as agent:
+        response = agent.step(f"合同片段：\n{section}")
+    return parse_json_object(response.msgs[0].content) if response.msgs else None
+
+
+def extract_sections(sections, max_workers=SECTION_WORKERS):
+    """
+    并发抽取各分段的信息
+
+    参数:
+    sections (list): 分段文本列表
+    max_workers (int): 并发分段数
+
+    返回:
+    tuple: (各分段的JSON结果列表，失败的分段为None, 失败的分段下标列表)
+    """
+    partials = [None] * len(sections)
+    failed = []
+    if not sections:
+        return partials, failed
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(sections)))) as executor:
+        futures = [executor.submit(_extract_section, section) for section in sections]
+        for index, future in enumerate(futures):
+            try:
+                partials[index] = future.result()
+            except Exception as e:
+                print(f"第 {index + 1} 段抽取失败: {str(e)}")
+            if partials[index] is None:
+                failed.append(index)
+    return partials, failed
+
+
+def extract_clauses_sectioned(markdown, max_workers=SECTION_WORKERS):
+    """
+    分段并发抽取合同信息，再合并为完整结果
+
+    参数:
+    markdown (str): 合同markdown文本
+    max_workers (int): 并发分段数
+
+    返回:
+    dict: result（合并结果）、sections（分段数）、failed（失败的分段下标）、elapsed（秒）
+    """
+    start_time = time.monotonic()
+    sections = split_sections(markdown)
+    partials, failed = extract_sections(sections, max_workers)
+
+    return {
+        "result": merge_partials([partial for partial in partials if partial]),
+        "sections": len(sections),
+        "failed": failed,
+        "elapsed": round(time.monotonic() - start_time, 2),
+    }
+
+
+
+# 条款库的命名空间：抽取提示词或模型变化后不再复用旧结果
+CLAUSE_NAMESPACE = DiskCache.make_key(CLAUSE_SYSTEM_PROMPT, str(ModelType.QWEN_TURBO), 0.0)[:16]
+
+
+def _is_blank(value):
+    """值本身及其所有嵌套字段都为空"""
+    if isinstance(value, dict):
+        return all(_is_blank(item) for item in value.values())
+    if isinstance(value, list):
+        return all(_is_blank(item) for item in value)
+    return _is_empty(value)
+
+
+def near_duplicate_reusable(result):
+    """条款结果除条款类型判断、摘录和风险提示外没有其他内容时，才可供近似重复的条款复用"""
+    return all(_is_blank(value) for key, value in result.items() if key not in NEAR_DUPLICATE_KEYS)
+
+
+def realign_excerpts(excerpts, clause):
+    """
+    把保存的摘录替换为当前条款原文中最相近的句子
+
+    参数:
+    excerpts (list): 近似重复条款的摘录
+    clause (str): 当前条款原文
+
+    返回:
+    list: 取自当前条款原文的摘录（去重，保持顺序）
+    """
+    sentences = [sentence.strip() for sentence in _SENTENCE.findall(clause) if sentence.strip()]
+    realigned = []
+    for excerpt in excerpts:
+        if _is_empty(excerpt) or not sentences:
+            continue
+        best = max(sentences, key=lambda sentence: SequenceMatcher(None, str(excerpt), sentence).ratio())
+        if best not in realigned:
+            realigned.append(best)
+    return realigned
+
+
+def reuse_near_duplicate(result, clause):
+    """
+    由近似重复条款的结果生成当前条款的结果：保留条款类型判断和风险提示，摘录从当前条款原文重新选取
+
+    参数:
+    result (dict): 近似重复条款保存的结果
+    clause (str): 当前条款原文
+
+    返回:
+    dict: 当前条款的结果
+    """
+    reused = {key: result[key] for key in NEAR_DUPLICATE_KEYS if key in result}
+    clauses = reused.get("合同条款") if isinstance(reused.get("合同条款"), dict) else {}
+    reused["合同条款"] = {
+        clause_type: {
+            "存在": (entry or {}).get("存在") or "否",
+            "摘录": realign_excerpts((entry or {}).get("摘录") or [], clause),
+        }
+        for clause_type, entry in clauses.items()
+    }
+    return reused
+
+
+def create_clause_agent():
+    """创建条款库模式的条款抽取代理（模型客户端来自模型池）"""
+    return ChatAgent(
+        system_message=CLAUSE_SYSTEM_PROMPT,
+        model=get_model(
+            ModelPlatformType.QWEN,
+            ModelType.QWEN_TURBO,
+            QwenConfig(temperature=0.0).as_dict(),
+            call_site="clause_store_extraction",
+        ),
+        message_window_size=2,
+        output_language='Chinese'
+    )
+
+
+def _extract_clause_batch(clauses):
+    """一次调用抽取一批条款，返回与输入顺序一致的各条款结果，缺失的条款为None"""
+    numbered = "\n".join(f"【条款{number}】{clause}" for number, clause in enumerate(clauses, 1))
+    with get_agent_pool("clause_store_extraction", create_clause_agent).lease() as agent:
+        response = agent.step(f"合同条款：\n{numbered}")
+    data = parse_json_object(response.msgs[0].content) if response.msgs else None
+    items = data.get("条款") if data else None
+    by_number = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        item = dict(item)
+        try:
+            number = int(item.pop("编号"))
+        except (KeyError, TypeError, ValueError):
+            continue
+        by_number.setdefault(number, item)
+    return [by_number.get(number) for number in range(1, len(clauses) + 1)]
+
+
+def extract_clause_batches(batches, max_workers=SECTION_WORKERS):
+    """
+    并发抽取多批条款，每批一次大模型调用
+
+    参数:
+    batches (list): 每批的条款文本列表
+    max_workers (int): 并发批数
+
+    返回:
+    list: 每批的各条款结果列表，抽取失败或模型遗漏的条款为None
+    """
+    results = [[None] * len(batch) for batch in batches]
+    if not batches:
+        return results
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches)))) as executor:
+        futures = [executor.submit(_extract_clause_batch, batch) for batch in batches]
+        for index, future in enumerate(futures):
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                print(f"第 {index + 1} 批条款抽取失败: {str(e)}")
+    return results
+
+
+def extract_clauses_with_store(markdown, store=None, max_workers=SECTION_WORKERS):
+    """
+    按条款复用条款库中的结果，只把未见过的条款交给大模型
+
+    合同切分为条款块后逐条查找条款库：文本相同的条款直接复用完整结果；近似重复的条款
+    （只有金额、日期、期限等不同）复用条款类型判断和风险提示，摘录从当前条款原文重新选取。
+    其余条款按原文顺序打包为不超过 SECTION_MAX_CHARS 的批次并发抽取（每批一次调用），
+    模型按条款分别返回结果，逐条写回条款库，最后按原文顺序合并。
+
+    参数:
+    markdown (str): 合同markdown文本
+    store (ClauseStore, optional): 条款库，默认使用共享条款库
+    max_workers (int): 并发批数
+
+    返回:
+    dict: result（合并结果）、clauses（条款数）、reused（精确复用的条款数）、
+        near_reused（近似复用的条款数）、extracted（交给大模型的条款数）、sections（大模型调用次数）、
+        failed（失败的条款下标）、elapsed（秒）
+    """
+    start_time = time.monotonic()
+    store = store or get_clause_store(CLAUSE_NAMESPACE)
+    clauses = split_clauses(markdown)
+    partials = [None] * len(clauses)
+    reused = near_reused = 0
+    unseen = {}
+    for index, clause in enumerate(clauses):
+        match = store.lookup(clause)
+        if match is None:
+            # 同一份合同中重复出现的条款只抽取一次
+            unseen.setdefault(normalize_text(clause, mask_numbers=False), []).append(index)
+        elif match["match"] == "exact":
+            partials[index] = match["result"]
+            reused += 1
+        else:
+            partials[index] = reuse_near_duplicate(match["result"], clause)
+            near_reused += 1
+
+    pending = [indexes[0] for indexes in unseen.values()]
+    groups = pack_clauses([clauses[index] for index in pending])
+    batches = [[clauses[pending[k]] for k in group] for group in groups]
+    failed = []
+    for group, results in zip(groups, extract_clause_batches(batches, max_workers)):
+        for k, result in zip(group, results):
+            index = pending[k]
+            indexes = unseen[normalize_text(clauses[index], mask_numbers=False)]
+            if result is None:
+                failed.extend(indexes)
+                continue
+            store.add(clauses[index], result, near_duplicate=near_duplicate_reusable(result))
+            for duplicate in indexes:
+                partials[duplicate] = result
+
+    return {
+        "result": merge_partials([partial for partial in partials if partial]),
+        "clauses": len(clauses),
+        "reused": reused,
+        "near_reused": near_reused,
+        "extracted": sum(len(indexes) for indexes in unseen.values()),
+        "sections": len(batches),
+        "failed": sorted(failed),
+        "elapsed": round(time.monotonic() - start_time, 2),
+    }
+
+
+def clause_store_stats():
+    """返回共享条款库的命中统计"""
+    return get_clause_store(CLAUSE_NAMESPACE).stats()
@@ -1,55 +1,8 @@
 # contract_advisor/llm_agents/contract_analyzer/contract_analyzer.py
-from contract_advisor.document_processor.url_crawler import retrieve_information_from_urls
-from contract_advisor.llm_agents.debate_agents.debate import analyze_contract_risk
+from contract_advisor.document_processor.url_crawler import retrieve_information_from_urls, retrieve_precedents
+from contract_advisor.llm_agents.debate_agents.debate import analyze_contract_risk, debate_fingerprint
 
-# from contract_advisor.knowledge_base.nebula_graph.neo import knowledge_graph_builder
-from camel.storages import Neo4jGraph
-from camel.loaders import UnstructuredIO
-from camel.agents import KnowledgeGraphAgent
-
-def knowledge_graph_builder(text_input: str) -> None:
-    r"""Build and store a knowledge graph from the provided text.
-
-    This function processes the input text to create and extract nodes and relationships,
-    which are then added to a Neo4j database as a knowledge graph.
-
-    Args:
-        text_input (str): The input text from which the knowledge graph is to be constructed.
-
-    Returns:
-        graph_elements: The generated graph element from knowlegde graph agent.
-    """
-
-    # Set Neo4j instance
-    n4j = Neo4jGraph(
-        url="neo4j+s://653e33c2.databases.neo4j.io",
-        username="neo4j",
-        password="ZQzOnxmr2mzWa-t5F9op-DwaNStb24KAt0EgFps0H7s",
-    )
-    from camel.models import ModelFactory
-    from camel.types import ModelPlatformType, ModelType
-    from camel.configs import MistralConfig
-
-    # Set up model
-    mistral_large_2 = ModelFactory.create(
-        model_platform=ModelPlatformType.MISTRAL,
-        model_type=ModelType.MISTRAL_LARGE,
-        model_config_dict=MistralConfig(temperature=0.2).as_dict(),
-    )  
-    # Initialize instances
-    uio = UnstructuredIO()
-    kg_agent = KnowledgeGraphAgent(model=mistral_large_2)
-
-    # Create an element from the provided text
-    element_example = uio.create_element_from_text(text=text_input, element_id="001")
-
-    # Extract nodes and relationships using the Knowledge Graph Agent
-    graph_elements = kg_agent.run(element_example, parse_graph_elements=True)
-
-    # Add the extracted graph elements to the Neo4j database
-    n4j.add_graph_elements(graph_elements=[graph_elements])
-
-    return graph_elements
+from contract_advisor.knowledge_base.nebula_graph.neo import knowledge_graph_builder
 
 import os
 import sys
@@ -58,25 +11,50 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(current_dir)))
 sys.path.append(project_root)
 
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 from contract_advisor.document_processor.pdf_processor import process_pdf_document
+from contract_advisor.document_processor.local_extractor import chunkr_to_markdown
+from contract_advisor.document_processor.ocr_cache import DEFAULT_READER_SETTINGS, file_sha256
+from contract_advisor.utils.stage_runner import Stage, StageRunner, get_artifact_store
+from contract_advisor.output_handlers.event_sink import get_event_sink
+from contract_advisor.llm_agents.contract_analyzer.planned_report import (
+    REPORT_WRITER_PROMPT,
+    create_report_writer,
+    run_planned_report,
+)
+from contract_advisor.utils.token_budget import CONTRACT_KEYWORDS, TokenBudget, count_tokens
+from contract_advisor.llm_agents.llm_cache import llm_cache_stats
+from contract_advisor.llm_agents.model_pool import agent_pool_stats, get_agent_pool, get_model
+from contract_advisor.knowledge_base.clause_store import CLAUSE_NEAR_DUPLICATE_THRESHOLD
+from contract_advisor.llm_agents.contract_analyzer.clause_extraction import (
+    CLAUSE_SYSTEM_PROMPT,
+    SECTION_SYSTEM_PROMPT,
+    clause_store_stats,
+    extract_clauses_sectioned,
+    extract_clauses_with_store,
+)
 from getpass import getpass
-from camel.models import ModelFactory
 from camel.types import ModelPlatformType, ModelType
-from camel.configs import ChatGPTConfig
+from camel.configs import QwenConfig
 from camel.agents import ChatAgent
 
-class ContractAnalyzer:
-    def __init__(self, chunkr_api_key, openai_api_key=None):
-        """
-        初始化合同分析器
-        
-        参数:
-        chunkr_api_key (str): Chunkr API密钥
-        openai_api_key (str, optional): OpenAI API密钥
-        """
-        self.chunkr_api_key = chunkr_api_key
-        self.openai_api_key = openai_api_key
-        self.sys_msg = """您是一位专业的劳动纠纷方向的律师专家。请仅使用此合同内容回答以下问题：
+# 为合同分析结果（JSON文档）预留的输出token数
+ANALYSIS_OUTPUT_TOKENS = 4096
+
+# 分析模式：single（单次分析，默认）、sectioned（分段并发抽取）、auto（按合同长度选择 single / sectioned）、
+# clauses（按条款复用条款库中相同或近似重复条款的结果）；除 single 外都需显式启用。
+# single 对整份合同只调用一次模型，结果无法对应到具体条款，因此条款库只能在 clauses 模式下使用
+ANALYSIS_MODE = os.environ.get("ANALYSIS_MODE", "single")
+
+# auto 模式下超过该token数的合同使用分段抽取
+SECTIONED_MIN_TOKENS = int(os.environ.get("SECTIONED_MIN_TOKENS", 6000))
+
+
+# 合同分析的系统提示词
+ANALYSIS_SYSTEM_PROMPT = """您是一位专业的劳动纠纷方向的律师专家。请仅使用此合同内容回答以下问题：
 
         1）这是什么类型的合同？
         2）合同的当事方及其角色是什么？它们在哪注册成立？请列出州和国家（使用 ISO 3166 国家名称）。
@@ -124,37 +102,120 @@ class ContractAnalyzer:
 
         请将最终答案以 JSON 文档的形式提供，确保包含上述所有分析内容，并不会包含任何可以直接关联到个人的信息。"""
 
+
+# 风险知识报告生成模式：planned（固定计划直接调用工具，只在撰写报告时调用模型）或 roleplay
+REPORT_MODE = os.environ.get("REPORT_MODE", "planned")
+
+# 风险知识报告的任务说明（接在结构化分析结果之后）
+RISK_REPORT_INSTRUCTIONS = """Research potential consequences based on the combinations of contract types and their associated risk factors
+    Generate a comprehensive report, Create a knowledge graph representation of the report findings
+    You should use the precedent tool first to get related judgments, statutes and prior reports.
+    Only if it returns nothing, use search tool to get related URLs, then use retrieval tool
+    to get the retrieved content back by providing the list of URLs, finially 
+    use tool to build the knowledge graph to finish the task.
+    No more other actions needed"""
+
+
+def create_analysis_agent(system_message):
+    """
+    创建合同分析代理，模型客户端从进程内模型池获取
+
+    参数:
+    system_message (str): 系统提示词
+
+    返回:
+    ChatAgent: 合同分析代理
+    """
+    return ChatAgent(
+        system_message=system_message,
+        model=get_model(
+            ModelPlatformType.QWEN,
+            ModelType.QWEN_TURBO,
+            QwenConfig(temperature=0.2).as_dict(),
+            call_site="contract_analyzer",
+        ),
+        message_window_size=10,
+        output_language='Chinese'
+    )
+
+
+def _section_failure(failed, total, unit="分段"):
+    """
+    分段或条款抽取有失败时的错误信息
+
+    缺少的分段中的条款会被合并为“否”，结果看似完整实则错误，因此整份合同按失败处理，
+    分析阶段不保存检查点，重跑时重新抽取
+
+    参数:
+    failed (list): 失败的分段或条款下标
+    total (int): 分段或条款总数
+    unit (str): “分段”或“条款”
+
+    返回:
+    str: 错误信息
+    """
+    return f"{unit}抽取失败: {len(failed)}/{total} 个{unit}未能抽取（{unit}下标 {failed}），分析结果不完整"
+
+
+def warm_up_analyzer(count=1):
+    """预先创建合同分析代理和风险报告使用的模型客户端"""
+    from camel.configs import MistralConfig
+
+    pool = get_agent_pool("contract_analyzer", lambda: create_analysis_agent(ANALYSIS_SYSTEM_PROMPT))
+    pool.warm(count)
+    get_agent_pool("risk_report_writer", create_report_writer).warm(count)
+    get_model(ModelPlatformType.MISTRAL, ModelType.MISTRAL_LARGE, MistralConfig(temperature=0.2).as_dict())
+
+
+class ContractAnalyzer:
+    def __init__(self, chunkr_api_key, openai_api_key=None, interactive=False, event_sink=None):
+        """
+        初始化合同分析器
+        
+        参数:
+        chunkr_api_key (str): Chunkr API密钥
+        openai_api_key (str, optional): OpenAI API密钥
+        interactive (bool): 风险报告会话是否在控制台以动画方式打印
+        event_sink (EventSink, optional): 接收风险报告会话事件的接收器
+        """
+        self.chunkr_api_key = chunkr_api_key
+        self.openai_api_key = openai_api_key
+        self.interactive = interactive
+        self.event_sink = event_sink
+        self.sys_msg = ANALYSIS_SYSTEM_PROMPT
+
     def _initialize_openai(self):
         """初始化OpenAI设置"""
+        self._ensure_openai_key()
+        self.agent = self._create_agent()
+
+    def _ensure_openai_key(self):
+        """确保OpenAI API密钥已设置"""
         if not self.openai_api_key:
             self.openai_api_key = getpass('请输入您的OpenAI API密钥: ')
         os.environ["OPENAI_API_KEY"] = self.openai_api_key
 
-        # 创建模型实例
-        model = ModelFactory.create(
-            model_platform=ModelPlatformType.OPENAI,
-            model_type=ModelType.GPT_4O_MINI,
-            model_config_dict=ChatGPTConfig().as_dict(),
-        )
-        qwen_model = ModelFactory.create(
-            model_platform=ModelPlatformType.QWEN,
-            model_type=ModelType.QWEN_TURBO,
-            model_config_dict=QwenConfig(temperature=0.2).as_dict(),
-        )
-        # 创建聊天代理
-        self.agent = ChatAgent(
-            system_message=self.sys_msg,
-            model=qwen_model,
-            message_window_size=10,
-            output_language='Chinese'
-        )
+    def _create_agent(self):
+        """
+        创建一个新的合同分析代理（模型客户端来自进程内模型池）
 
-    def analyze_contract(self, pdf_path):
+        返回:
+        ChatAgent: 合同分析代理
+        """
+        return create_analysis_agent(self.sys_msg)
+
+    @property
+    def agent_pool(self):
+        """合同分析代理池，批量模式下每个并发线程借用各自的代理，用完重置后复用"""
+        return get_agent_pool("contract_analyzer", self._create_agent)
+
+    def analyze_contract(self, pdf_path, mode=None):
         """
         分析合同文档
         
         参数:
         pdf_path (str): PDF文件路径
+        mode (str, optional): 分析模式（single / sectioned / clauses / auto），默认读取环境变量 ANALYSIS_MODE
         
         返回:
         dict: 分析结果
@@ -166,14 +227,76 @@ class ContractAnalyzer:
             if not pdf_content:
                 return {"error": "PDF处理失败"}
 
+            return self.analyze_content(pdf_content, mode)
+
+        except Exception as e:
+            return {
+                "error": f"分析过程中发生错误: {str(e)}"
+            }
+
+    def analyze_content(self, pdf_content, mode=None):
+        """
+        分析已完成OCR的合同内容
+
+        参数:
+        pdf_content (str): Chunkr返回的JSON字符串
+        mode (str, optional): 分析模式（single / sectioned / clauses / auto），默认读取环境变量 ANALYSIS_MODE
+
+        返回:
+        dict: 分析结果
+        """
+        try:
             # 初始化OpenAI设置
-            self._initialize_openai()
+            self._ensure_openai_key()
+
+            mode = mode or ANALYSIS_MODE
+            if mode == "auto":
+                markdown = chunkr_to_markdown(pdf_content)
+                mode = "sectioned" if count_tokens(markdown, ModelType.QWEN_TURBO) > SECTIONED_MIN_TOKENS else "single"
+
+            if mode == "clauses":
+                # 只把条款库中没有精确或近似命中的条款交给大模型
+                extraction = extract_clauses_with_store(chunkr_to_markdown(pdf_content))
+                print(
+                    f"条款库: {extraction['clauses']} 条, 精确复用 {extraction['reused']} 条, "
+                    f"近似复用 {extraction['near_reused']} 条, 新分析 {extraction['extracted']} 条"
+                    f"（{extraction['sections']} 次调用）, 失败 {len(extraction['failed'])} 条, "
+                    f"耗时 {extraction['elapsed']} 秒"
+                )
+                if extraction["failed"]:
+                    return {"error": _section_failure(extraction["failed"], extraction["clauses"], "条款")}
+                return {
+                    "raw_content": pdf_content,
+                    "analysis": json.dumps(extraction["result"], ensure_ascii=False, indent=2),
+                    "clauses": extraction["clauses"],
+                    "reused_clauses": extraction["reused"],
+                    "near_reused_clauses": extraction["near_reused"],
+                }
+
+            if mode == "sectioned":
+                # 按条款/标题分段并发抽取，再确定性地合并为同一结构
+                extraction = extract_clauses_sectioned(chunkr_to_markdown(pdf_content))
+                print(
+                    f"分段抽取: {extraction['sections']} 段, 失败 {len(extraction['failed'])} 段, "
+                    f"耗时 {extraction['elapsed']} 秒"
+                )
+                if extraction["failed"]:
+                    return {"error": _section_failure(extraction["failed"], extraction["sections"])}
+                return {
+                    "raw_content": pdf_content,
+                    "analysis": json.dumps(extraction["result"], ensure_ascii=False, indent=2),
+                    "sections": extraction["sections"],
+                }
+
+            # 只把Chunkr结果中的正文markdown发给模型，并按Qwen分词结果控制在预算内
+            contract_text = self._fit_contract_text(pdf_content)
 
             # 构建用户消息
-            usr_msg = f"请分析以下合同内容：\n{pdf_content}"
+            usr_msg = f"请分析以下合同内容：\n{contract_text}"
 
-            # 发送消息给代理并获取响应
-            response = self.agent.step(usr_msg)
+            # 从代理池借用代理发送消息并获取响应
+            with self.agent_pool.lease() as agent:
+                response = agent.step(usr_msg)
 
             # 返回分析结果
             return {
@@ -186,52 +309,400 @@ class ContractAnalyzer:
                 "error": f"分析过程中发生错误: {str(e)}"
             }
 
+    def _fit_contract_text(self, pdf_content):
+        """
+        将Chunkr输出转换为markdown，超出模型预算时优先保留关键条款段落
+
+        参数:
+        pdf_content (str): Chunkr返回的JSON字符串
+
+        返回:
+        str: 预算内的合同文本
+        """
+        budget = TokenBudget(
+            ModelType.QWEN_TURBO,
+            reserved=count_tokens(self.sys_msg, ModelType.QWEN_TURBO) + ANALYSIS_OUTPUT_TOKENS,
+        )
+        contract_text = chunkr_to_markdown(pdf_content)
+        packed = budget.pack_text(contract_text, CONTRACT_KEYWORDS)
+        if len(packed) < len(contract_text):
+            print(f"合同内容超出模型预算 ({budget.limit} tokens)，已按关键条款优先保留")
+        return packed
+
+    def analysis_fingerprint(self, mode=None):
+        """
+        合同分析阶段的配置指纹（提示词、模型和分析模式），变化后分析结果及下游阶段需要重新计算
+
+        参数:
+        mode (str, optional): 分析模式，默认读取环境变量 ANALYSIS_MODE
+
+        返回:
+        dict: 可JSON序列化的配置
+        """
+        fingerprint = {
+            "mode": mode or ANALYSIS_MODE,
+            "sectioned_min_tokens": SECTIONED_MIN_TOKENS,
+            "model": str(ModelType.QWEN_TURBO),
+            "system_prompt": self.sys_msg,
+            "section_prompt": SECTION_SYSTEM_PROMPT,
+        }
+        if fingerprint["mode"] == "clauses":
+            fingerprint["clause_prompt"] = CLAUSE_SYSTEM_PROMPT
+            fingerprint["near_duplicate_threshold"] = CLAUSE_NEAR_DUPLICATE_THRESHOLD
+        return fingerprint
+
+    def pipeline_stages(self, pdf_path, with_risk_report=True, with_debate=True, speech_dir=None,
+                        analysis_stage=None):
+        """
+        构建单份合同的阶段图：OCR → 合同分析 → 风险知识报告 → 多角色评估 → 语音
+
+        参数:
+        pdf_path (str): PDF文件路径
+        with_risk_report (bool): 是否生成风险知识报告
+        with_debate (bool): 是否进行多角色风险评估
+        speech_dir (str, optional): 评估结果语音的保存目录，为空时不生成语音
+        analysis_stage (Stage, optional): 替换默认合同分析阶段的阶段（如按模板复用分段结果）
+
+        返回:
+        list: 按执行顺序排列的 Stage 列表
+        """
+        def ocr(inputs):
+            pdf_content = process_pdf_document(pdf_path, self.chunkr_api_key)
+            if not pdf_content:
+                raise RuntimeError("PDF处理失败")
+            return pdf_content
+
+        def analyze(inputs):
+            analysis = self.analyze_content(inputs["ocr"])
+            if "error" in analysis:
+                raise RuntimeError(analysis["error"])
+            analysis.pop("raw_content", None)
+            return analysis
+
+        def report(inputs):
+            report = create_risk_knowledge_report(
+                inputs["analyze"]["analysis"], sink=self.event_sink, interactive=self.interactive
+            )
+            return getattr(report, "content", str(report))
+
+        def debate(inputs):
+            return analyze_contract_risk(inputs.get("report") or inputs["analyze"]["analysis"])
+
+        stages = [
+            Stage("ocr", ocr, fingerprint={"reader_settings": DEFAULT_READER_SETTINGS}),
+            analysis_stage or Stage("analyze", analyze, ("ocr",), fingerprint=self.analysis_fingerprint()),
+        ]
+        if with_risk_report:
+            stages.append(Stage(
+                "report", report, ("analyze",),
+                fingerprint={
+                    "mode": REPORT_MODE,
+                    "model": str(ModelType.MISTRAL_LARGE),
+                    "instructions": RISK_REPORT_INSTRUCTIONS,
+                    "writer_prompt": REPORT_WRITER_PROMPT,
+                },
+            ))
+        if with_debate:
+            stages.append(Stage(
+                "debate", debate, ("analyze", "report") if with_risk_report else ("analyze",),
+                fingerprint=debate_fingerprint(),
+            ))
+            if speech_dir:
+                name = os.path.splitext(os.path.basename(pdf_path))[0]
+                speech_path = os.path.join(speech_dir, f"{name}.mp3")
+
+                def speech(inputs):
+                    from contract_advisor.output_handlers.speech_synthesis import generate_speech
+
+                    generate_speech(inputs["debate"], speech_path)
+                    return speech_path
+
+                # 语音文件被删除后重新生成
+                stages.append(Stage(
+                    "speech", speech, ("debate",),
+                    fingerprint={"engine": "fish_audio", "path": speech_path},
+                    is_valid=os.path.exists,
+                ))
+        return stages
+
+    def run_pipeline(self, pdf_path, with_risk_report=True, with_debate=True,
+                     speech_dir=None, resume=False, artifact_path=None, analysis_stage=None):
+        """
+        对单份合同执行完整流程：OCR、合同分析、风险研究、多角色评估和语音生成
+
+        每个阶段完成后都会把结果保存到产物存储（按PDF内容摘要和阶段配置索引），
+        resume 为 True 时已完成的阶段直接读取保存的结果，中途失败后重跑只需计算剩余阶段。
+
+        参数:
+        pdf_path (str): PDF文件路径
+        with_risk_report (bool): 是否生成风险知识报告
+        with_debate (bool): 是否进行多角色风险评估
+        speech_dir (str, optional): 评估结果语音的保存目录
+        resume (bool): 是否复用已保存的阶段结果
+        artifact_path (str, optional): 产物存储文件路径
+        analysis_stage (Stage, optional): 替换默认合同分析阶段的阶段
+
+        返回:
+        dict: 各阶段的结果，出错时包含 "error" 字段；"stages" 记录每个阶段的状态
+        """
+        result = {"path": pdf_path}
+        try:
+            input_hash = file_sha256(pdf_path)
+        except OSError as e:
+            result["error"] = f"分析过程中发生错误: {str(e)}"
+            return result
+
+        runner = StageRunner(
+            self.pipeline_stages(pdf_path, with_risk_report, with_debate, speech_dir, analysis_stage),
+            store=get_artifact_store(artifact_path),
+            resume=resume,
+        )
+        run = runner.run(input_hash)
+        outputs = run["outputs"]
+        result["stages"] = run["status"]
+
+        if "ocr" in outputs:
+            result["raw_content"] = outputs["ocr"]
+        if "analyze" in outputs:
+            result.update(outputs["analyze"])
+        if "report" in outputs:
+            result["risk_report"] = outputs["report"]
+        if "debate" in outputs:
+            result["debate"] = outputs["debate"]
+        if "speech" in outputs:
+            result["speech"] = outputs["speech"]
+
+        if run["failed"] in ("ocr", "analyze"):
+            result["error"] = run["error"]
+        elif run["failed"] == "speech":
+            result["error"] = f"语音生成失败: {run['error']}"
+        elif run["failed"]:
+            result["error"] = f"风险评估过程中发生错误: {run['error']}"
+
+        return result
+
+    def analyze_contracts(self, pdf_paths, max_concurrency=4,
+                          with_risk_report=True, with_debate=True,
+                          speech_dir=None, resume=False, artifact_path=None):
+        """
+        并发批量分析多份合同，按完成顺序逐个返回结果
+
+        每份合同在独立线程中执行完整流程，同时运行的合同数量不超过
+        max_concurrency。每个结果都附带已用时间和当前吞吐量（份/分钟）。
+
+        参数:
+        pdf_paths (list): PDF文件路径列表
+        max_concurrency (int): 最大并发合同数
+        with_risk_report (bool): 是否生成风险知识报告
+        with_debate (bool): 是否进行多角色风险评估
+        speech_dir (str, optional): 评估结果语音的保存目录
+        resume (bool): 是否从上次保存的阶段结果继续（已完成的阶段不再计算）
+        artifact_path (str, optional): 产物存储文件路径
+
+        返回:
+        generator: 逐个产出每份合同的结果字典
+        """
+        pdf_paths = list(pdf_paths)
+        if not pdf_paths:
+            return
+
+        # 在主线程中提前确认密钥，避免工作线程中交互输入
+        self._ensure_openai_key()
+
+        start_time = time.monotonic()
+        completed = 0
+        failed = 0
+        stage_status = {}
+
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+            futures = {
+                executor.submit(
+                    self._timed_pipeline, path, with_risk_report, with_debate,
+                    speech_dir, resume, artifact_path,
+                ): path
+                for path in pdf_paths
+            }
+
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {"path": path, "error": f"处理过程中发生错误: {str(e)}"}
+
+                completed += 1
+                if "error" in result:
+                    failed += 1
+                for status in result.get("stages", {}).values():
+                    stage_status[status] = stage_status.get(status, 0) + 1
+
+                elapsed_minutes = (time.monotonic() - start_time) / 60
+                throughput = completed / elapsed_minutes if elapsed_minutes > 0 else 0.0
+                result["completed"] = completed
+                result["total"] = len(pdf_paths)
+                result["throughput"] = round(throughput, 2)
+
+                print(
+                    f"已完成 {completed}/{len(pdf_paths)} 份合同"
+                    f"（失败 {failed} 份），吞吐量: {throughput:.2f} 份/分钟"
+                )
+                yield result
+
+        total_minutes = (time.monotonic() - start_time) / 60
+        print(
+            f"批量分析结束: 共 {completed} 份，失败 {failed} 份，"
+            f"耗时 {total_minutes:.2f} 分钟，"
+            f"平均吞吐量 {completed / total_minutes if total_minutes > 0 else 0:.2f} 份/分钟"
+        )
+        if stage_status:
+            print(
+                f"阶段检查点: 复用 {stage_status.get('cached', 0)} 个, "
+                f"新计算 {stage_status.get('done', 0)} 个, "
+                f"失败 {stage_status.get('failed', 0)} 个, 跳过 {stage_status.get('skipped', 0)} 个"
+            )
+        if ANALYSIS_MODE == "clauses":
+            stats = clause_store_stats()
+            print(
+                f"条款库: 精确命中 {stats['hits']} 次, 近似命中 {stats['near_hits']} 次, "
+                f"未命中 {stats['misses']} 次, 共 {stats['clauses']} 个条款"
+            )
+        for name, stats in agent_pool_stats().items():
+            print(f"代理池 [{name}]: 新建 {stats['created']} 个, 复用 {stats['reused']} 次")
+        for call_site, stats in llm_cache_stats().items():
+            print(
+                f"大模型缓存 [{call_site}]: 命中 {stats['hits']} 次, "
+                f"未命中 {stats['misses']} 次, 命中率 {stats['hit_rate']:.0%}"
+            )
+
+    def analyze_contracts_by_template(self, pdf_paths, **kwargs):
+        """
+        按模板去重的批量分析，参数与 analyze_contracts 相同
+
+        同一模板的合同只完整分析一份，其余合同只重新分析与模板不同的条款，
+        并复用模板合同的风险报告和多角色评估；结束时打印每个模板的加速比。
+
+        返回:
+        generator: 逐个产出每份合同的结果字典
+        """
+        from contract_advisor.llm_agents.contract_analyzer.template_dedup import analyze_contracts_by_template
+
+        return analyze_contracts_by_template(self, pdf_paths, **kwargs)
+
+    def _timed_pipeline(self, pdf_path, with_risk_report, with_debate,
+                        speech_dir=None, resume=False, artifact_path=None):
+        """执行单份合同的完整流程并记录耗时"""
+        start_time = time.monotonic()
+        result = self.run_pipeline(
+            pdf_path, with_risk_report, with_debate, speech_dir, resume, artifact_path
+        )
+        result["elapsed"] = round(time.monotonic() - start_time, 2)
+        return result
+
 
   
-def create_risk_knowledge_report(input_data: str):
+def create_risk_knowledge_report(input_data: str, sink=None, interactive=False, mode=None):
     """
     针对输入数据创建风险知识报告和知识图谱
     
     Args:
         input_data: 输入的结构化数据
+        sink: 接收会话事件的 EventSink，默认按 interactive 选择
+        interactive: 是否在控制台以动画方式打印会话（默认写入JSONL事件日志）
+        mode: 生成模式，"planned"（固定计划直接调用工具）或 "roleplay"（多轮角色扮演），
+            默认读取环境变量 REPORT_MODE
         
     Returns:
-        dict: 包含报告和知识图谱的结果
+        BaseMessage: 最终的报告消息
+    """
+    import uuid
+
+    mode = mode or REPORT_MODE
+    sink = sink or get_event_sink(interactive)
+    session = uuid.uuid4().hex[:12]
+    if mode == "planned":
+        message, stats = run_planned_report(input_data, sink, session)
+    elif mode == "roleplay":
+        message, stats = _run_roleplay_report(input_data, sink, session)
+    else:
+        raise ValueError(f"不支持的报告生成模式: {mode}")
+    sink.emit("session_end", session=session, mode=mode, **stats)
+    return message
+
+
+def benchmark_report_modes(input_data: str, sink=None):
+    """
+    对同一份分析结果分别运行角色扮演和固定计划两种模式，比较模型轮数、token数和耗时
+
+    两种模式的检索都会经过网页和案例缓存，大模型响应缓存（CONTRACT_LLM_CACHE）
+    也会影响结果，对比时建议关闭大模型响应缓存。
+
+    Args:
+        input_data: 输入的结构化数据
+        sink: 接收会话事件的 EventSink，默认写入JSONL事件日志
+
+    Returns:
+        dict: 每种模式的 turns / tokens / seconds（出错时为 error），以及耗时加速比
+    """
+    import uuid
+
+    sink = sink or get_event_sink()
+    results = {}
+    for mode, runner in (("roleplay", _run_roleplay_report), ("planned", run_planned_report)):
+        session = uuid.uuid4().hex[:12]
+        start_time = time.monotonic()
+        try:
+            _, stats = runner(input_data, sink, session)
+        except Exception as e:
+            stats = {"error": str(e), "seconds": round(time.monotonic() - start_time, 2)}
+        sink.emit("session_end", session=session, mode=mode, **stats)
+        results[mode] = stats
+
+    roleplay, planned = results["roleplay"]["seconds"], results["planned"]["seconds"]
+    results["speedup"] = round(roleplay / planned, 2) if planned else None
+    return results
+
+
+def _run_roleplay_report(input_data, sink, session):
+    """
+    通过多轮角色扮演会话生成风险知识报告
+
+    Args:
+        input_data: 输入的结构化数据
+        sink: 接收会话事件的 EventSink
+        session: 会话标识
+
+    Returns:
+        tuple: (最后一条助手消息, 统计字典 turns / tokens / seconds / reason)
     """
     from typing import List
-    from colorama import Fore
     from camel.agents.chat_agent import FunctionCallingRecord 
     from camel.societies import RolePlaying
-    from camel.utils import print_text_animated
     from camel.retrievers import AutoRetriever
     from camel.toolkits import FunctionTool, SearchToolkit
     from camel.types import ModelPlatformType, ModelType, StorageType
     from camel.embeddings import MistralEmbedding
 
-    from camel.models import ModelFactory
     from camel.types import ModelPlatformType, ModelType
     from camel.configs import MistralConfig
 
-# Set up model
-    mistral_large_2 = ModelFactory.create(
-        model_platform=ModelPlatformType.MISTRAL,
-        model_type=ModelType.MISTRAL_LARGE,
-        model_config_dict=MistralConfig(temperature=0.2).as_dict(),
-    )  
+    # Set up model (shared client from the model pool)
+    mistral_large_2 = get_model(
+        ModelPlatformType.MISTRAL,
+        ModelType.MISTRAL_LARGE,
+        MistralConfig(temperature=0.2).as_dict(),
+        call_site="risk_report_user",
+    )
     # 定义任务提示语
-    task_prompt = "Analyze the input structured data to:"+str(input_data)+"""Research potential consequences based on the combinations of contract types and their associated risk factors
-    Generate a comprehensive report, Create a knowledge graph representation of the report findings
-    You should use search tool to get related URLs first, then use retrieval tool
-    to get the retrieved content back by providing the list of URLs, finially 
-    use tool to build the knowledge graph to finish the task.
-    No more other actions needed"""
+    task_prompt = "Analyze the input structured data to:"+str(input_data)+RISK_REPORT_INSTRUCTIONS
 
     # 定义工具函数
+    precedent_tool = FunctionTool(retrieve_precedents)
     retrieval_tool = FunctionTool(retrieve_information_from_urls)
     search_tool = FunctionTool(SearchToolkit().search_duckduckgo)
     knowledge_graph_tool = FunctionTool(knowledge_graph_builder)
 
     tool_list = [
+        precedent_tool,
         retrieval_tool,
         search_tool, 
         knowledge_graph_tool,
@@ -249,10 +720,12 @@ def create_risk_knowledge_report(input_data: str):
         assistant_role_name="CAMEL Assistant",
         user_role_name="CAMEL User",
         assistant_agent_kwargs=dict(
-            model=ModelFactory.create(
-                model_platform=ModelPlatformType.MISTRAL,
-                model_type=ModelType.MISTRAL_LARGE,
-                model_config_dict=assistant_model_config.as_dict(),
+            model=get_model(
+                ModelPlatformType.MISTRAL,
+                ModelType.MISTRAL_LARGE,
+                assistant_model_config.as_dict(),
+                call_site="risk_report_assistant",
+                tools=tool_list,
             ),
             tools=tool_list,
         ),
@@ -260,63 +733,67 @@ def create_risk_knowledge_report(input_data: str):
         task_prompt=task_prompt,
         with_task_specify=False,
     )
-    # Print system and task messages
-    print(
-        Fore.GREEN
-        + f"AI Assistant sys message:\n{role_play_session.assistant_sys_msg}\n"
-    )
-    print(Fore.BLUE + f"AI User sys message:\n{role_play_session.user_sys_msg}\n")
-
-    print(Fore.YELLOW + f"Original task prompt:\n{task_prompt}\n")
-    print(
-        Fore.CYAN
-        + "Specified task prompt:"
-        + f"\n{role_play_session.specified_task_prompt}\n"
+    # 会话事件交给接收器：交互模式在控制台动画打印，默认写入结构化事件日志
+    start_time = time.monotonic()
+    tokens = 0
+    sink.emit(
+        "session_start",
+        session=session,
+        assistant_sys_msg=str(role_play_session.assistant_sys_msg),
+        user_sys_msg=str(role_play_session.user_sys_msg),
+        task_prompt=task_prompt,
+        specified_task_prompt=str(role_play_session.specified_task_prompt),
+        final_task_prompt=str(role_play_session.task_prompt),
     )
-    print(Fore.RED + f"Final task prompt:\n{role_play_session.task_prompt}\n")
     n = 0
+    end_reason = "max_turns"
     input_msg = role_play_session.init_chat()
     while n < 20: # Limit the chat to 20 turns
         n += 1
         assistant_response, user_response = role_play_session.step(input_msg)
+        for response in (assistant_response, user_response):
+            tokens += (response.info.get('usage') or {}).get('total_tokens', 0)
 
         if assistant_response.terminated:
-            print(
-                Fore.GREEN
-                + (
-                    "AI Assistant terminated. Reason: "
-                    f"{assistant_response.info['termination_reasons']}."
-                )
+            sink.emit(
+                "terminated", session=session, turn=n, role="Assistant",
+                reasons=assistant_response.info['termination_reasons'],
             )
+            end_reason = "assistant_terminated"
             break
         if user_response.terminated:
-            print(
-                Fore.GREEN
-                + (
-                    "AI User terminated. "
-                    f"Reason: {user_response.info['termination_reasons']}."
-                )
+            sink.emit(
+                "terminated", session=session, turn=n, role="User",
+                reasons=user_response.info['termination_reasons'],
             )
+            end_reason = "user_terminated"
             break
-        # Print output from the user
-        print_text_animated(
-            Fore.BLUE + f"AI User:\n\n{user_response.msg.content}\n",
-            0.01
-        )
+        # Output from the user
+        sink.emit("user_message", session=session, turn=n, content=user_response.msg.content)
 
         if "CAMEL_TASK_DONE" in user_response.msg.content:
+            end_reason = "task_done"
             break
 
-        # Print output from the assistant, including any function
+        # Output from the assistant, including any function
         # execution information
-        print_text_animated(Fore.GREEN + "AI Assistant:", 0.01)
         tool_calls: List[FunctionCallingRecord] = [
             FunctionCallingRecord(**call.as_dict())
             for call in assistant_response.info['tool_calls']
         ]
-        for func_record in tool_calls:
-            print_text_animated(f"{func_record}", 0.01)
-        print_text_animated(f"{assistant_response.msg.content}\n", 0.01)
+        sink.emit(
+            "assistant_message",
+            session=session,
+            turn=n,
+            content=assistant_response.msg.content,
+            tool_calls=[record.as_dict() for record in tool_calls],
+        )
 
         input_msg = assistant_response.msg
-    return input_msg
\ No newline at end of file
+    stats = {
+        "turns": n,
+        "tokens": tokens,
+        "seconds": round(time.monotonic() - start_time, 2),
+        "reason": end_reason,
+    }
+    return input_msg, stats
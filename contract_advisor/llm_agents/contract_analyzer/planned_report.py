@@ -0,0 +1,229 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from camel.agents import ChatAgent
+from camel.configs import MistralConfig
+from camel.messages import BaseMessage
+from camel.types import ModelPlatformType, ModelType
+
+from contract_advisor.document_processor.url_crawler import retrieve_precedents
+from contract_advisor.knowledge_base.nebula_graph.neo import knowledge_graph_builder
+from contract_advisor.llm_agents.contract_analyzer.clause_extraction import parse_json_object
+from contract_advisor.llm_agents.model_pool import get_agent_pool, get_model
+from contract_advisor.utils.token_budget import CONTRACT_KEYWORDS, TokenBudget, count_tokens
+
+# 每份报告最多研究的风险项数和并发检索线程数
+REPORT_MAX_ITEMS = int(os.environ.get("REPORT_MAX_ITEMS", 6))
+REPORT_WORKERS = int(os.environ.get("REPORT_WORKERS", 4))
+
+# 为报告正文预留的输出token数
+REPORT_OUTPUT_TOKENS = 4096
+
+# 结构化分析结果中与风险相关的字段名关键字
+RISK_KEY_MARKERS = ("风险", "合规", "争议", "显失公平", "违约", "补偿")
+
+REPORT_WRITER_PROMPT = """您是一位专业的劳动纠纷方向的律师专家。您将收到一份合同的结构化分析结果，以及针对其中每个风险项检索到的判例、法条和历史报告。
+
+请撰写一份完整的风险知识报告：
+1）逐项说明合同类型与风险因素的组合可能带来的法律和财务后果；
+2）每项后果尽量引用检索材料中的判例或法条，并注明来源；
+3）给出每项风险的严重程度和可执行的应对建议；
+4）最后给出整体结论。
+
+只使用提供的材料，不要编造判例，也不要包含任何可以直接关联到个人的信息。"""
+
+
+def _leaves(value, path=()):
+    """遍历JSON结构中的所有非空字符串叶子节点，返回（键路径, 文本）"""
+    if isinstance(value, dict):
+        for key, child in value.items():
+            yield from _leaves(child, path + (str(key),))
+    elif isinstance(value, list):
+        for child in value:
+            yield from _leaves(child, path)
+    elif isinstance(value, str) and value.strip():
+        yield path, value.strip()
+
+
+def extract_risk_items(analysis, max_items=REPORT_MAX_ITEMS):
+    """
+    从合同分析结果中提取需要研究的风险项
+
+    JSON结果中取存在的合同条款以及风险、合规、争议等字段下的内容；
+    无法解析为JSON时按行提取。按命中的合同关键词数量排序，去重后保留前 max_items 项。
+
+    参数:
+    analysis (str|dict): 合同分析结果
+    max_items (int): 最多保留的风险项数
+
+    返回:
+    list: 风险项查询字符串
+    """
+    data = analysis if isinstance(analysis, dict) else parse_json_object(analysis or "")
+    candidates = []
+    if data:
+        contract_type = str(data.get("合同类型") or "").strip()
+        clauses = data.get("合同条款")
+        if isinstance(clauses, dict):
+            for clause_type, value in clauses.items():
+                if isinstance(value, dict) and str(value.get("存在", "")).startswith("是"):
+                    candidates.append(f"{contract_type} {clause_type}".strip())
+        for path, text in _leaves(data):
+            if any(marker in key for key in path for marker in RISK_KEY_MARKERS):
+                candidates.append(f"{contract_type} {text}".strip() if contract_type else text)
+    else:
+        candidates = [line.strip(" -*#\t") for line in str(analysis or "").splitlines()]
+        candidates = [line for line in candidates if any(k in line for k in CONTRACT_KEYWORDS)]
+
+    scored = {}
+    for index, text in enumerate(candidates):
+        text = text[:200]
+        if text and text not in scored:
+            scored[text] = (sum(text.count(k) for k in CONTRACT_KEYWORDS), -index)
+    return sorted(scored, key=lambda text: scored[text], reverse=True)[:max_items]
+
+
+def _format_evidence(evidence):
+    """将检索结果统一转换为文本"""
+    if not evidence:
+        return ""
+    if isinstance(evidence, str):
+        return evidence
+    if isinstance(evidence, dict):
+        context = evidence.get("Retrieved Context")
+        sources = evidence.get("Sources") or []
+        if isinstance(context, list):
+            lines = []
+            for index, text in enumerate(context):
+                source = sources[index] if index < len(sources) else ""
+                lines.append(f"[{source}] {text}" if source else str(text))
+            return "\n".join(lines)
+        if context:
+            return str(context)
+    return json.dumps(evidence, ensure_ascii=False, default=str)
+
+
+def _research_item(item):
+    """对单个风险项执行检索（本地案例索引优先，未命中时联网搜索并抓取）"""
+    start_time = time.monotonic()
+    try:
+        evidence = _format_evidence(retrieve_precedents(item))
+        error = None
+    except Exception as e:
+        evidence, error = "", str(e)
+    return {
+        "item": item,
+        "evidence": evidence,
+        "error": error,
+        "seconds": round(time.monotonic() - start_time, 2),
+    }
+
+
+def create_report_writer():
+    """创建报告撰写代理（模型客户端来自模型池）"""
+    return ChatAgent(
+        system_message=REPORT_WRITER_PROMPT,
+        model=get_model(
+            ModelPlatformType.MISTRAL,
+            ModelType.MISTRAL_LARGE,
+            MistralConfig(temperature=0.2).as_dict(),
+            call_site="risk_report_writer",
+        ),
+        message_window_size=2,
+        output_language='Chinese'
+    )
+
+
+def build_report_prompt(input_data, research):
+    """
+    组装报告撰写请求，按Mistral的上下文预算压缩分析结果和检索材料
+
+    分析结果最多占预算的三分之一，其余预算在各风险项的检索材料之间平均分配。
+
+    参数:
+    input_data (str): 合同结构化分析结果
+    research (list): 各风险项的检索结果
+
+    返回:
+    str: 用户消息
+    """
+    budget = TokenBudget(
+        ModelType.MISTRAL_LARGE,
+        reserved=count_tokens(REPORT_WRITER_PROMPT, ModelType.MISTRAL_LARGE) + REPORT_OUTPUT_TOKENS,
+    )
+    analysis = budget.pack_text(str(input_data), CONTRACT_KEYWORDS, limit=budget.limit // 3)
+    share = (budget.limit - budget.count(analysis)) // max(len(research), 1)
+
+    sections = []
+    for index, entry in enumerate(research, 1):
+        evidence = entry["evidence"] or "（未检索到相关材料）"
+        evidence = budget.pack_text(evidence, CONTRACT_KEYWORDS, limit=share)
+        sections.append(f"### 风险项 {index}：{entry['item']}\n{evidence}")
+    return f"合同结构化分析结果：\n{analysis}\n\n各风险项的检索材料：\n\n" + "\n\n".join(sections)
+
+
+def run_planned_report(input_data, sink, session):
+    """
+    按固定计划生成风险知识报告：并发检索各风险项 → 一次模型调用撰写报告 → 构建知识图谱
+
+    参数:
+    input_data (str): 合同结构化分析结果
+    sink (EventSink): 会话事件接收器
+    session (str): 会话标识
+
+    返回:
+    tuple: (报告消息 BaseMessage, 统计字典 turns / tokens / seconds / items)
+    """
+    start_time = time.monotonic()
+    items = extract_risk_items(input_data) or [str(input_data)[:200]]
+    sink.emit("session_start", session=session, mode="planned", task_prompt="\n".join(items))
+
+    with ThreadPoolExecutor(max_workers=max(1, min(REPORT_WORKERS, len(items)))) as executor:
+        research = list(executor.map(_research_item, items))
+    research_seconds = round(time.monotonic() - start_time, 2)
+    sink.emit(
+        "assistant_message",
+        session=session,
+        turn=0,
+        content=f"已检索 {len(items)} 个风险项",
+        tool_calls=[
+            {"func_name": "retrieve_precedents", "args": {"query": entry["item"]},
+             "result": entry["error"] or f"{len(entry['evidence'])} 字符"}
+            for entry in research
+        ],
+    )
+
+    with get_agent_pool("risk_report_writer", create_report_writer).lease() as agent:
+        response = agent.step(build_report_prompt(input_data, research))
+    if not response.msgs:
+        raise ValueError("报告撰写代理没有返回任何内容")
+    report = response.msgs[0].content
+    usage = response.info.get("usage") or {}
+    sink.emit("assistant_message", session=session, turn=1, content=report, tool_calls=[])
+
+    # 知识图谱基于报告结论构建，与角色扮演模式保持一致
+    try:
+        graph_elements = knowledge_graph_builder(report)
+        graph_result = f"{len(graph_elements.nodes)} 个节点, {len(graph_elements.relationships)} 条关系"
+    except Exception as e:
+        print(f"构建知识图谱时出错: {str(e)}")
+        graph_result = f"构建知识图谱时出错: {str(e)}"
+    sink.emit(
+        "assistant_message",
+        session=session,
+        turn=1,
+        content="",
+        tool_calls=[{"func_name": "knowledge_graph_builder", "args": {}, "result": graph_result}],
+    )
+
+    stats = {
+        "turns": 1,
+        "tokens": usage.get("total_tokens", 0),
+        "seconds": round(time.monotonic() - start_time, 2),
+        "research_seconds": research_seconds,
+        "items": len(items),
+    }
+    message = BaseMessage.make_assistant_message(role_name="Risk Report Writer", content=report)
+    return message, stats
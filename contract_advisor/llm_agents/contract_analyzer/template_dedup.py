@@ -0,0 +1,295 @@
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from difflib import SequenceMatcher
+
+from contract_advisor.document_processor.local_extractor import chunkr_to_markdown
+from contract_advisor.document_processor.ocr_cache import file_sha256
+from contract_advisor.document_processor.pdf_processor import process_pdf_document
+from contract_advisor.llm_agents.contract_analyzer.clause_extraction import (
+    SECTION_SYSTEM_PROMPT,
+    extract_sections,
+    merge_partials,
+    pack_clauses,
+    split_clauses,
+)
+from contract_advisor.utils.disk_cache import DiskCache
+from contract_advisor.utils.minhash import LSHIndex, MinHasher, normalize_text
+from contract_advisor.utils.stage_runner import Stage
+
+# 屏蔽数字后估计Jaccard相似度不低于该值的合同视为同一模板
+TEMPLATE_SIMILARITY = float(os.environ.get("TEMPLATE_SIMILARITY", 0.8))
+
+
+def clause_key(clause):
+    """条款块的比较键：忽略空白差异，数字、姓名等任何文字变化都视为不同条款"""
+    return DiskCache.make_key(normalize_text(clause, mask_numbers=False))
+
+
+def group_by_template(documents, threshold=TEMPLATE_SIMILARITY):
+    """
+    按模板对合同分组
+
+    依次处理每份合同，与已有模板的代表合同比较（MinHash + LSH，比较前屏蔽数字），
+    相似度达到阈值时归入最相似的模板，否则作为新模板的代表。
+
+    参数:
+    documents (dict): 文件路径 -> 合同markdown（保持输入顺序）
+    threshold (float): 估计Jaccard相似度下限
+
+    返回:
+    list: 每个模板一个字典，template 为代表合同路径，members 为其余合同路径
+    """
+    hasher = MinHasher()
+    index = LSHIndex(threshold)
+    clusters = {}
+    for path, markdown in documents.items():
+        signature = hasher.text_signature(markdown)
+        matches = index.query(signature)
+        if matches:
+            clusters[matches[0][0]]["members"].append(path)
+        else:
+            index.add(path, signature)
+            clusters[path] = {"template": path, "members": []}
+    return list(clusters.values())
+
+
+def build_template(markdown):
+    """
+    对模板代表合同做分段抽取，并保留每个分段的条款键和抽取结果供成员合同复用
+
+    参数:
+    markdown (str): 代表合同的markdown
+
+    返回:
+    dict: keys（条款键）、groups（每个分段的条款下标）、partials（每个分段的抽取结果）、failed
+    """
+    clauses = split_clauses(markdown)
+    groups = pack_clauses(clauses)
+    sections = ["\n".join(clauses[index] for index in group) for group in groups]
+    partials, failed = extract_sections(sections)
+    return {
+        "keys": [clause_key(clause) for clause in clauses],
+        "groups": groups,
+        "partials": partials,
+        "failed": failed,
+    }
+
+
+def analyze_member(template, markdown):
+    """
+    只重新抽取成员合同中与模板不同的条款
+
+    先按条款键对齐成员合同与模板（difflib），模板中所有条款都原样出现的分段直接复用其抽取结果，
+    其余条款（姓名、日期、金额等有变化或新增的条款）重新打包分段并抽取，最后按原文顺序合并。
+
+    参数:
+    template (dict): build_template 的结果
+    markdown (str): 成员合同的markdown
+
+    返回:
+    dict: result（合并结果）、sections（模板分段数）、reused（复用的分段数）、
+        extracted（重新抽取的分段数）、failed（失败的分段下标）
+    """
+    clauses = split_clauses(markdown)
+    keys = [clause_key(clause) for clause in clauses]
+    template_to_member = {}
+    matcher = SequenceMatcher(None, template["keys"], keys, autojunk=False)
+    for tag, i1, i2, j1, _ in matcher.get_opcodes():
+        if tag == "equal":
+            for offset in range(i2 - i1):
+                template_to_member[i1 + offset] = j1 + offset
+
+    ordered = []
+    covered = set()
+    for group, partial in zip(template["groups"], template["partials"]):
+        if partial is not None and all(index in template_to_member for index in group):
+            positions = [template_to_member[index] for index in group]
+            covered.update(positions)
+            ordered.append((min(positions), partial))
+    reused = len(ordered)
+
+    changed = [index for index in range(len(clauses)) if index not in covered]
+    groups = pack_clauses([clauses[index] for index in changed])
+    sections = ["\n".join(clauses[changed[k]] for k in group) for group in groups]
+    partials, failed = extract_sections(sections)
+    for group, partial in zip(groups, partials):
+        if partial:
+            ordered.append((changed[group[0]], partial))
+
+    ordered.sort(key=lambda item: item[0])
+    return {
+        "result": merge_partials([partial for _, partial in ordered]),
+        "sections": len(template["groups"]),
+        "reused": reused,
+        "extracted": len(sections),
+        "failed": failed,
+    }
+
+
+def template_stage(analyzer):
+    """模板代表合同的分析阶段：分段抽取并保存各分段结果"""
+    def analyze(inputs):
+        template = build_template(chunkr_to_markdown(inputs["ocr"]))
+        if template["failed"]:
+            raise RuntimeError(f"模板分段抽取失败: {len(template['failed'])}/{len(template['groups'])} 个分段")
+        return {
+            "analysis": json.dumps(
+                merge_partials([partial for partial in template["partials"] if partial]),
+                ensure_ascii=False, indent=2,
+            ),
+            "sections": len(template["groups"]),
+            "template_sections": template,
+        }
+
+    return Stage(
+        "analyze", analyze, ("ocr",),
+        fingerprint=dict(analyzer.analysis_fingerprint("template"), section_prompt=SECTION_SYSTEM_PROMPT),
+    )
+
+
+def member_stage(template, template_hash):
+    """成员合同的分析阶段：只抽取与模板不同的条款"""
+    def analyze(inputs):
+        extraction = analyze_member(template, chunkr_to_markdown(inputs["ocr"]))
+        if extraction["failed"]:
+            raise RuntimeError(f"成员合同分段抽取失败: {len(extraction['failed'])}/{extraction['extracted']} 个分段")
+        return {
+            "analysis": json.dumps(extraction["result"], ensure_ascii=False, indent=2),
+            "sections": extraction["sections"],
+            "reused_sections": extraction["reused"],
+            "extracted_sections": extraction["extracted"],
+        }
+
+    return Stage(
+        "analyze", analyze, ("ocr",),
+        fingerprint={"mode": "template_member", "template": template_hash, "section_prompt": SECTION_SYSTEM_PROMPT},
+    )
+
+
+def _load_markdown(analyzer, path):
+    pdf_content = process_pdf_document(path, analyzer.chunkr_api_key)
+    if not pdf_content:
+        raise RuntimeError("PDF处理失败")
+    return chunkr_to_markdown(pdf_content)
+
+
+def analyze_contracts_by_template(analyzer, pdf_paths, max_concurrency=4, with_risk_report=True,
+                                  with_debate=True, speech_dir=None, resume=False, artifact_path=None):
+    """
+    按模板去重的批量分析：每个模板只对代表合同执行完整流程，成员合同只重新分析不同的条款
+
+    成员合同不单独生成风险知识报告和多角色评估：代表合同的报告和评估放在 template_risk_report /
+    template_debate 字段中（template 字段指向代表合同），它们针对的是代表合同的分析结果，
+    不反映成员合同中姓名、金额、日期等不同的条款。全部完成后打印每个模板的估计加速比：
+    假设每份成员合同的完整流程耗时与代表合同相同，估计耗时 / 实际耗时。
+
+    参数:
+    analyzer (ContractAnalyzer): 合同分析器
+    pdf_paths (list): PDF文件路径列表
+    max_concurrency (int): 最大并发合同数
+    with_risk_report (bool): 是否生成风险知识报告
+    with_debate (bool): 是否进行多角色风险评估
+    speech_dir (str, optional): 评估结果语音的保存目录（仅代表合同）
+    resume (bool): 是否复用已保存的阶段结果
+    artifact_path (str, optional): 产物存储文件路径
+
+    返回:
+    generator: 逐个产出每份合同的结果字典
+    """
+    pdf_paths = list(pdf_paths)
+    if not pdf_paths:
+        return
+    analyzer._ensure_openai_key()
+    start_time = time.monotonic()
+
+    # OCR（有缓存和本地文本层时开销很小）后按模板分组
+    documents = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+        futures = {path: executor.submit(_load_markdown, analyzer, path) for path in pdf_paths}
+        for path, future in futures.items():
+            try:
+                documents[path] = future.result()
+            except Exception as e:
+                yield {"path": path, "error": f"分析过程中发生错误: {str(e)}"}
+    clusters = group_by_template(documents)
+    print(f"按模板分组: {len(documents)} 份合同, {len(clusters)} 个模板")
+
+    def run_template(cluster):
+        began = time.monotonic()
+        stage = template_stage(analyzer) if cluster["members"] else None
+        result = analyzer.run_pipeline(
+            cluster["template"], with_risk_report, with_debate, speech_dir, resume, artifact_path,
+            analysis_stage=stage,
+        )
+        result["elapsed"] = round(time.monotonic() - began, 2)
+        return result
+
+    def run_member(path, template_result, template_sections, template_hash):
+        began = time.monotonic()
+        result = analyzer.run_pipeline(
+            path, False, False, None, resume, artifact_path,
+            analysis_stage=member_stage(template_sections, template_hash),
+        )
+        # 报告和评估是代表合同级别的结果，单独命名，避免被当作该成员合同自己的结果
+        result["template"] = template_result["path"]
+        for key in ("risk_report", "debate"):
+            if key in template_result:
+                result[f"template_{key}"] = template_result[key]
+        result["elapsed"] = round(time.monotonic() - began, 2)
+        return result
+
+    report = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+        pending = {executor.submit(run_template, cluster): cluster for cluster in clusters}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                cluster = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {"path": cluster.get("member") or cluster["template"],
+                              "error": f"处理过程中发生错误: {str(e)}"}
+
+                stats = report.setdefault(cluster["template"], {
+                    "members": len(cluster["members"]) + 1, "template_seconds": 0.0,
+                    "member_seconds": 0.0, "reused_sections": 0, "total_sections": 0,
+                })
+                if "member" in cluster:
+                    stats["member_seconds"] += result.get("elapsed", 0)
+                    stats["reused_sections"] += result.get("reused_sections", 0)
+                    stats["total_sections"] += result.get("sections", 0)
+                else:
+                    stats["template_seconds"] = result.get("elapsed", 0)
+                    template_sections = result.pop("template_sections", None)
+                    reusable = template_sections is not None and "error" not in result
+                    template_hash = file_sha256(result["path"]) if reusable else None
+                    for path in cluster["members"]:
+                        if reusable:
+                            member_future = executor.submit(
+                                run_member, path, result, template_sections, template_hash
+                            )
+                        else:
+                            member_future = executor.submit(
+                                analyzer._timed_pipeline, path, with_risk_report, with_debate,
+                                speech_dir, resume, artifact_path,
+                            )
+                        pending[member_future] = dict(cluster, member=path)
+                yield result
+
+    total = round(time.monotonic() - start_time, 2)
+    for template, stats in report.items():
+        actual = stats["template_seconds"] + stats["member_seconds"]
+        # 成员合同没有实际执行完整流程，逐份完整分析的耗时按代表合同的耗时估计
+        estimated = stats["template_seconds"] * stats["members"]
+        stats["estimated_full_seconds"] = round(estimated, 2)
+        stats["estimated_speedup"] = round(estimated / actual, 2) if actual else None
+        print(
+            f"模板 [{template}]: {stats['members']} 份合同, 复用分段 "
+            f"{stats['reused_sections']}/{stats['total_sections']}, 实际 {actual:.2f} 秒, "
+            f"逐份完整分析估计 {estimated:.2f} 秒（按代表合同耗时估计）, "
+            f"估计加速比 {stats['estimated_speedup']}"
+        )
+    print(f"按模板批量分析结束: 共 {len(pdf_paths)} 份合同, 耗时 {total:.2f} 秒")
@@ -1,179 +1,345 @@
+import os
 import textwrap
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from camel.agents import ChatAgent
 from camel.messages import BaseMessage
-from camel.models import ModelFactory
 from camel.tasks import Task
 from camel.toolkits import FunctionTool, SearchToolkit
 from camel.types import ModelPlatformType, ModelType
 from camel.societies.workforce import Workforce
 
-def analyze_contract_risk(contract_report: str) -> str:
-    """
-    分析合同风险报告，从多个角度提供评估。
-    
-    Args:
-        contract_report: 合同风险报告的字符串内容
-        
-    Returns:
-        str: 多角度风险评估结果
-    """
-    
-    # 创建评估者角色函数
-    def make_evaluator(
-        persona: str,
-        example_feedback: str,
-        criteria: str,
-    ) -> ChatAgent:
-        msg_content = textwrap.dedent(
-            f"""\
-            You are a contract risk evaluator.
-            This is your persona that you MUST act with: {persona}
-            Here is an example feedback that you might give with your persona, you MUST try your best to align with this:
-            {example_feedback}
-            When evaluating risks, you must use the following criteria:
-            {criteria}
-            You also need to give risk scores based on these criteria, from 1-4. The score given should be like 3/4, 2/4, etc.
-            """
-        )
+from contract_advisor.llm_agents.model_pool import get_agent_pool, get_model
+from contract_advisor.utils.token_budget import CONTRACT_KEYWORDS, TokenBudget
 
-        sys_msg = BaseMessage.make_assistant_message(
-            role_name="Risk Evaluator",
-            content=msg_content,
-        )
+# 评估者、研究员和汇总者使用的模型，报告的token预算也按该模型的上下文窗口计算
+DEBATE_MODEL = ModelType(os.environ.get("DEBATE_MODEL", ModelType.GPT_4O.value))
 
-        model = ModelFactory.create(
-            model_platform=ModelPlatformType.OPENAI,
-            model_type=ModelType.GPT_4,
-        )
+# 为评估者系统提示词、任务描述和评估输出预留的token数
+EVALUATOR_RESERVED_TOKENS = 2048
 
-        agent = ChatAgent(
-            system_message=sys_msg,
-            model=model,
-        )
+# 执行模式：parallel（研究一次、评估者并发、最后汇总）或 workforce（camel Workforce 编排）
+DEBATE_MODE = os.environ.get("DEBATE_MODE", "parallel")
 
-        return agent
+# 并行模式下研究步骤和每个评估者的超时时间（秒）
+RESEARCH_TIMEOUT = float(os.environ.get("DEBATE_RESEARCH_TIMEOUT", 120))
+PERSONA_TIMEOUT = float(os.environ.get("DEBATE_PERSONA_TIMEOUT", 120))
 
-    # 创建研究员角色
-    researcher_model = ModelFactory.create(
-        model_platform=ModelPlatformType.OPENAI,
-        model_type=ModelType.GPT_4,
-    )
+RESEARCHER_PROMPT = (
+    "You are a legal researcher who specializes in contract law and risk assessment. "
+    "You use web search to find relevant legal precedents and risk analysis frameworks."
+)
 
-    researcher_agent = ChatAgent(
-        system_message=BaseMessage.make_assistant_message(
-            role_name="Researcher",
-            content="You are a legal researcher who specializes in contract law and risk assessment. "
-            "You use web search to find relevant legal precedents and risk analysis frameworks.",
+SYNTHESIZER_PROMPT = (
+    "You are the chair of a contract risk review panel. You combine the evaluations of "
+    "several evaluators into one balanced conclusion, keeping each evaluator's key points "
+    "and risk score, and giving an overall risk score and concrete recommendations."
+)
+
+# 评估标准
+RISK_CRITERIA = textwrap.dedent(
+    """\
+    ### **风险等级评估 (1-4分)**
+    - **4分**: 高风险 - 存在严重的法律、财务或执行风险，需要立即处理
+    - **3分**: 中高风险 - 有显著的潜在风险，需要认真评估和规划
+    - **2分**: 中低风险 - 存在一般性风险，需要适当关注
+    - **1分**: 低风险 - 风险可控，在可接受范围内
+    """
+)
+
+# 各个评估者的名称、描述、人设和示例反馈
+PERSONAS = [
+    {
+        "name": "White Hat Thinker",
+        "description": "White Hat Thinker (Evaluator) - 注重事实的分析者",
+        "persona": (
+            '你是一个注重事实和数据的分析者。你只关注客观事实，不掺杂个人感情。'
+            '评估时要以中立的态度分析合同条款的具体内容，并提供基于数据的建议。'
         ),
-        model=researcher_model,
-    )
+        "example": (
+            '根据合同第三条款的具体描述，我发现以下几个客观风险点：1. 付款条件不明确...'
+            '2. 违约责任条款存在歧义... 建议修改相关条款以明确双方责任。'
+        ),
+    },
+    {
+        "name": "Red Hat Thinker",
+        "description": "Red Hat Thinker (Evaluator) - 基于情感的评估者",
+        "persona": (
+            '你是一个依靠直觉和情感的评估者。你要特别关注合同可能带来的情感影响和压力。'
+            '你的评估要基于直觉感受，而不是逻辑分析。'
+        ),
+        "example": (
+            '我觉得这份合同会给你带来很大的心理压力。责任太重了，而且对方要求很苛刻...'
+            '我的直觉告诉我这个合同签署后会让你寝食难安。'
+        ),
+    },
+    {
+        "name": "Yellow Hat Thinker",
+        "description": "Yellow Hat Thinker (Evaluator) - 积极乐观的评估者",
+        "persona": (
+            '你是一个乐观积极的评估者。你要找出合同中的机会和优势。'
+            '即使面对风险，你也要思考如何转化为机遇。'
+        ),
+        "example": (
+            '这份合同虽然有挑战，但也蕴含着很好的发展机会！比如通过这个项目可以...'
+            '我们可以通过以下方式来规避风险并把握机会...'
+        ),
+    },
+    {
+        "name": "Black Hat Thinker",
+        "description": "Black Hat Thinker (Evaluator) - 谨慎的风险评估者",
+        "persona": (
+            '你是一个谨慎的风险评估者。你要找出所有潜在的问题和风险。'
+            '你的评估要详尽列举可能的负面情况。'
+        ),
+        "example": (
+            '这份合同存在严重的风险隐患：1. 法律风险... 2. 财务风险... 3. 执行风险...'
+            '建议重点关注这些问题，否则后果可能很严重。'
+        ),
+    },
+    {
+        "name": "Family Member",
+        "description": "Family Member (Evaluator) - 关心的家人",
+        "persona": (
+            '你是合同签署者的家人朋友，非常关心他的利益和未来。你要从家庭角度评估合同风险，'
+            '考虑这份合同会如何影响他的家庭生活、经济状况和长期发展。你说话时要带着浓厚的'
+            '关心和爱护。'
+        ),
+        "example": (
+            '亲爱的，这个合同我很担心，因为预付款比例这么高，万一出问题我们家可能承担不起...'
+            '而且工作时间要求这么紧，你的身体能吃得消吗？建议你再好好考虑一下。'
+        ),
+    },
+    {
+        "name": "Colleague",
+        "description": "Colleague (Evaluator) - 专业的同事",
+        "persona": (
+            '你是合同签署者的同事，了解行业情况和职业发展路径。你要从专业角度分析合同对其'
+            '职业发展的影响，包括行业影响力、技能提升、人脉拓展等方面。'
+        ),
+        "example": (
+            '从行业发展来看，这个项目虽然有挑战，但是技术栈很新，而且客户是行业龙头，'
+            '对你的简历和职业发展都很有帮助。不过要注意知识产权条款的限制。'
+        ),
+    },
+]
 
-    # 定义各个角色的人设和示例反馈
-    white_hat_persona = (
-        '你是一个注重事实和数据的分析者。你只关注客观事实，不掺杂个人感情。'
-        '评估时要以中立的态度分析合同条款的具体内容，并提供基于数据的建议。'
-    )
 
-    white_hat_example = (
-        '根据合同第三条款的具体描述，我发现以下几个客观风险点：1. 付款条件不明确...'
-        '2. 违约责任条款存在歧义... 建议修改相关条款以明确双方责任。'
-    )
+def _create_debate_model(call_site):
+    """从模型池获取带响应缓存的评估模型（DEBATE_MODEL）"""
+    return get_model(ModelPlatformType.OPENAI, DEBATE_MODEL, call_site=call_site)
 
-    red_hat_persona = (
-        '你是一个依靠直觉和情感的评估者。你要特别关注合同可能带来的情感影响和压力。'
-        '你的评估要基于直觉感受，而不是逻辑分析。'
-    )
 
-    red_hat_example = (
-        '我觉得这份合同会给你带来很大的心理压力。责任太重了，而且对方要求很苛刻...'
-        '我的直觉告诉我这个合同签署后会让你寝食难安。'
+def persona_pool(persona):
+    """获取评估者的代理池，代理在合同之间复用"""
+    return get_agent_pool(
+        f"evaluator:{persona['name']}",
+        lambda: make_evaluator(persona["persona"], persona["example"], RISK_CRITERIA),
     )
 
-    yellow_hat_persona = (
-        '你是一个乐观积极的评估者。你要找出合同中的机会和优势。'
-        '即使面对风险，你也要思考如何转化为机遇。'
-    )
 
-    yellow_hat_example = (
-        '这份合同虽然有挑战，但也蕴含着很好的发展机会！比如通过这个项目可以...'
-        '我们可以通过以下方式来规避风险并把握机会...'
-    )
+def researcher_pool():
+    return get_agent_pool("researcher", make_researcher)
 
-    black_hat_persona = (
-        '你是一个谨慎的风险评估者。你要找出所有潜在的问题和风险。'
-        '你的评估要详尽列举可能的负面情况。'
-    )
 
-    black_hat_example = (
-        '这份合同存在严重的风险隐患：1. 法律风险... 2. 财务风险... 3. 执行风险...'
-        '建议重点关注这些问题，否则后果可能很严重。'
-    )
+def synthesizer_pool():
+    return get_agent_pool("synthesizer", make_synthesizer)
+
+
+def warm_up_personas(count=1):
+    """预先创建研究员、各评估者和汇总角色的代理"""
+    for pool in [researcher_pool(), synthesizer_pool()] + [persona_pool(p) for p in PERSONAS]:
+        pool.warm(count)
 
-    family_persona = (
-        '你是合同签署者的家人朋友，非常关心他的利益和未来。你要从家庭角度评估合同风险，'
-        '考虑这份合同会如何影响他的家庭生活、经济状况和长期发展。你说话时要带着浓厚的'
-        '关心和爱护。'
+
+# 创建评估者角色函数
+def make_evaluator(
+    persona: str,
+    example_feedback: str,
+    criteria: str,
+) -> ChatAgent:
+    msg_content = textwrap.dedent(
+        f"""\
+        You are a contract risk evaluator.
+        This is your persona that you MUST act with: {persona}
+        Here is an example feedback that you might give with your persona, you MUST try your best to align with this:
+        {example_feedback}
+        When evaluating risks, you must use the following criteria:
+        {criteria}
+        You also need to give risk scores based on these criteria, from 1-4. The score given should be like 3/4, 2/4, etc.
+        """
     )
 
-    family_example = (
-        '亲爱的，这个合同我很担心，因为预付款比例这么高，万一出问题我们家可能承担不起...'
-        '而且工作时间要求这么紧，你的身体能吃得消吗？建议你再好好考虑一下。'
+    sys_msg = BaseMessage.make_assistant_message(
+        role_name="Risk Evaluator",
+        content=msg_content,
     )
 
-    colleague_persona = (
-        '你是合同签署者的同事，了解行业情况和职业发展路径。你要从专业角度分析合同对其'
-        '职业发展的影响，包括行业影响力、技能提升、人脉拓展等方面。'
+    agent = ChatAgent(
+        system_message=sys_msg,
+        model=_create_debate_model("debate_evaluator"),
     )
 
-    colleague_example = (
-        '从行业发展来看，这个项目虽然有挑战，但是技术栈很新，而且客户是行业龙头，'
-        '对你的简历和职业发展都很有帮助。不过要注意知识产权条款的限制。'
+    return agent
+
+
+def make_researcher() -> ChatAgent:
+    """创建法律研究员角色"""
+    return ChatAgent(
+        system_message=BaseMessage.make_assistant_message(
+            role_name="Researcher",
+            content=RESEARCHER_PROMPT,
+        ),
+        model=_create_debate_model("debate_researcher"),
     )
 
-    # 评估标准
-    risk_criteria = textwrap.dedent(
-        """\
-        ### **风险等级评估 (1-4分)**
-        - **4分**: 高风险 - 存在严重的法律、财务或执行风险，需要立即处理
-        - **3分**: 中高风险 - 有显著的潜在风险，需要认真评估和规划
-        - **2分**: 中低风险 - 存在一般性风险，需要适当关注
-        - **1分**: 低风险 - 风险可控，在可接受范围内
-        """
+
+def make_synthesizer() -> ChatAgent:
+    """创建汇总各评估者意见的角色"""
+    return ChatAgent(
+        system_message=BaseMessage.make_assistant_message(
+            role_name="Panel Chair",
+            content=SYNTHESIZER_PROMPT,
+        ),
+        model=_create_debate_model("debate_synthesizer"),
     )
 
-    # 创建各个评估者实例
-    white_hat_agent = make_evaluator(white_hat_persona, white_hat_example, risk_criteria)
-    red_hat_agent = make_evaluator(red_hat_persona, red_hat_example, risk_criteria)
-    yellow_hat_agent = make_evaluator(yellow_hat_persona, yellow_hat_example, risk_criteria)
-    black_hat_agent = make_evaluator(black_hat_persona, black_hat_example, risk_criteria)
-    family_agent = make_evaluator(family_persona, family_example, risk_criteria)
-    colleague_agent = make_evaluator(colleague_persona, colleague_example, risk_criteria)
 
-    # 创建工作组
+def _step_content(pool, message):
+    """从代理池借用代理发送一条消息并返回回复文本"""
+    with pool.lease() as agent:
+        response = agent.step(message)
+    if not response.msgs:
+        raise ValueError("代理没有返回任何内容")
+    return response.msgs[0].content
+
+
+def run_parallel_evaluation(contract_report: str, research_timeout=RESEARCH_TIMEOUT,
+                            persona_timeout=PERSONA_TIMEOUT) -> dict:
+    """
+    并行模式：法律研究只做一次，所有评估者并发评估，最后单独汇总
+
+    单个评估者超时或出错不会影响其他评估者，汇总只基于成功返回的评估。
+
+    参数:
+    contract_report (str): 合同风险报告（已按预算压缩）
+    research_timeout (float): 研究步骤超时时间（秒）
+    persona_timeout (float): 每个评估者的超时时间（秒）
+
+    返回:
+    dict: research、evaluations（名称 -> 评估）、failed（名称 -> 原因）、synthesis、timings（各阶段秒数）
+    """
+    timings = {}
+    budget = TokenBudget(DEBATE_MODEL, reserved=EVALUATOR_RESERVED_TOKENS)
+    executor = ThreadPoolExecutor(max_workers=len(PERSONAS) + 1)
+    try:
+        # 阶段一：法律研究（只执行一次，结果共享给所有评估者）
+        start_time = time.monotonic()
+        research = ""
+        future = executor.submit(
+            _step_content,
+            researcher_pool(),
+            "请针对以下合同风险报告整理相关的法律依据、判例和风险分析框架：\n" + contract_report,
+        )
+        try:
+            research = future.result(timeout=research_timeout)
+        except Exception as e:
+            print(f"法律研究步骤失败，评估将不包含研究结论: {str(e) or type(e).__name__}")
+        timings["research"] = round(time.monotonic() - start_time, 2)
+
+        # 研究结论与报告共用评估者的上下文预算，研究结论最多占四分之一
+        research = budget.pack_text(research, CONTRACT_KEYWORDS, limit=budget.limit // 4)
+        contract_report = budget.pack_text(
+            contract_report, CONTRACT_KEYWORDS, limit=budget.limit - budget.count(research)
+        )
+
+        evaluation_prompt = (
+            "请从你的角度对这份合同风险报告进行评估，给出具体的分析、建议和风险评分。\n\n"
+            f"合同风险报告：\n{contract_report}\n\n"
+            f"法律研究结论：\n{research or '（无）'}"
+        )
+
+        # 阶段二：所有评估者并发评估，统一截止时间
+        start_time = time.monotonic()
+        futures = {
+            executor.submit(
+                _step_content,
+                persona_pool(persona),
+                evaluation_prompt,
+            ): persona["name"]
+            for persona in PERSONAS
+        }
+        done, not_done = wait(futures, timeout=persona_timeout)
+        evaluations = {}
+        failed = {}
+        for future in done:
+            name = futures[future]
+            try:
+                evaluations[name] = future.result()
+            except Exception as e:
+                failed[name] = str(e) or type(e).__name__
+        for future in not_done:
+            future.cancel()
+            failed[futures[future]] = f"超时（{persona_timeout} 秒）"
+        timings["personas"] = round(time.monotonic() - start_time, 2)
+
+        # 保持评估者的固定顺序，结果可复现
+        evaluations = {p["name"]: evaluations[p["name"]] for p in PERSONAS if p["name"] in evaluations}
+
+        # 阶段三：汇总
+        start_time = time.monotonic()
+        synthesis = ""
+        if evaluations:
+            opinions = "\n\n".join(f"### {name}\n{text}" for name, text in evaluations.items())
+            try:
+                synthesis = _step_content(
+                    synthesizer_pool(),
+                    "请总结以下评估者对合同风险报告的意见，给出综合风险评分和建议：\n\n"
+                    + budget.pack_text(opinions, CONTRACT_KEYWORDS, separator="\n\n"),
+                )
+            except Exception as e:
+                print(f"汇总步骤失败: {str(e)}")
+        timings["synthesis"] = round(time.monotonic() - start_time, 2)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    timings["total"] = round(sum(timings.values()), 2)
+    return {
+        "research": research,
+        "evaluations": evaluations,
+        "failed": failed,
+        "synthesis": synthesis,
+        "timings": timings,
+    }
+
+
+def format_parallel_evaluation(result: dict) -> str:
+    """将并行评估结果整理为文本"""
+    sections = []
+    if result["research"]:
+        sections.append(f"## 法律研究\n{result['research']}")
+    for name, text in result["evaluations"].items():
+        sections.append(f"## {name}\n{text}")
+    for name, reason in result["failed"].items():
+        sections.append(f"## {name}\n（未完成: {reason}）")
+    if result["synthesis"]:
+        sections.append(f"## 总结\n{result['synthesis']}")
+    return "\n\n".join(sections)
+
+
+def run_workforce_evaluation(contract_report: str) -> str:
+    """使用 camel Workforce 编排研究员和评估者（原有执行方式）"""
     workforce = Workforce('Contract Risk Evaluators')
 
     # 添加所有评估者到工作组
+    for persona in PERSONAS:
+        workforce.add_single_agent_worker(
+            persona["description"],
+            worker=make_evaluator(persona["persona"], persona["example"], RISK_CRITERIA),
+        )
     workforce.add_single_agent_worker(
-        'White Hat Thinker (Evaluator) - 注重事实的分析者',
-        worker=white_hat_agent,
-    ).add_single_agent_worker(
-        'Red Hat Thinker (Evaluator) - 基于情感的评估者',
-        worker=red_hat_agent,
-    ).add_single_agent_worker(
-        'Yellow Hat Thinker (Evaluator) - 积极乐观的评估者',
-        worker=yellow_hat_agent,
-    ).add_single_agent_worker(
-        'Black Hat Thinker (Evaluator) - 谨慎的风险评估者',
-        worker=black_hat_agent,
-    ).add_single_agent_worker(
-        'Family Member (Evaluator) - 关心的家人',
-        worker=family_agent,
-    ).add_single_agent_worker(
-        'Colleague (Evaluator) - 专业的同事',
-        worker=colleague_agent,
-    ).add_single_agent_worker(
         'Legal Researcher (Helper) - 法律研究员',
-        worker=researcher_agent,
+        worker=make_researcher(),
     )
 
     # 创建任务
@@ -188,3 +354,54 @@ def analyze_contract_risk(contract_report: str) -> str:
     # 执行评估并返回结果
     result = workforce.process_task(task)
     return result.result
+
+
+def debate_fingerprint(mode: str = None) -> dict:
+    """
+    多角色评估的配置指纹（模式、模型、评估标准和各角色提示词），用于阶段产物的失效判断
+
+    Args:
+        mode: 执行模式，默认读取环境变量 DEBATE_MODE
+
+    Returns:
+        dict: 可JSON序列化的配置
+    """
+    return {
+        "mode": mode or DEBATE_MODE,
+        "model": str(DEBATE_MODEL),
+        "criteria": RISK_CRITERIA,
+        "personas": PERSONAS,
+        "researcher": RESEARCHER_PROMPT,
+        "synthesizer": SYNTHESIZER_PROMPT,
+    }
+
+
+def analyze_contract_risk(contract_report: str, mode: str = None) -> str:
+    """
+    分析合同风险报告，从多个角度提供评估。
+
+    Args:
+        contract_report: 合同风险报告的字符串内容
+        mode: 执行模式，"parallel" 或 "workforce"，默认读取环境变量 DEBATE_MODE
+
+    Returns:
+        str: 多角度风险评估结果
+    """
+    # 按评估模型的上下文窗口压缩报告，优先保留命中风险关键词的段落
+    budget = TokenBudget(DEBATE_MODEL, reserved=EVALUATOR_RESERVED_TOKENS)
+    contract_report = budget.pack_text(contract_report, CONTRACT_KEYWORDS)
+
+    mode = mode or DEBATE_MODE
+    if mode == "workforce":
+        return run_workforce_evaluation(contract_report)
+    if mode != "parallel":
+        raise ValueError(f"不支持的评估模式: {mode}")
+
+    result = run_parallel_evaluation(contract_report)
+    timings = result["timings"]
+    print(
+        f"多角色评估耗时: 研究 {timings['research']} 秒, 并发评估 {timings['personas']} 秒, "
+        f"汇总 {timings['synthesis']} 秒, 合计 {timings['total']} 秒 "
+        f"(成功 {len(result['evaluations'])}/{len(PERSONAS)})"
+    )
+    return format_parallel_evaluation(result)
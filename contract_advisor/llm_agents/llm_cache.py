@@ -0,0 +1,286 @@
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+
+from contract_advisor.utils.disk_cache import DiskCache
+
+# 缓存模式：off（关闭，默认）、exact（精确匹配）、normalized（规范化匹配）、semantic（语义匹配）
+# 缓存键只包含模型、配置和对话内容，检索结果、外部数据等不在键中的变化不会使缓存失效，
+# 因此默认关闭，只在重复运行相同输入（如调试、基准测试、批量重跑）时显式开启。
+# semantic 模式下每次未命中都要调用一次嵌入API（Mistral，向量本身有缓存），有额外的费用和延迟。
+CONTRACT_LLM_CACHE = os.environ.get("CONTRACT_LLM_CACHE", "off").lower()
+LLM_CACHE_PATH = os.environ.get("LLM_CACHE_PATH", "local_data/cache/llm_cache.sqlite")
+LLM_CACHE_MAX_BYTES = int(os.environ.get("LLM_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+
+# 条目有效期（秒），默认7天；设置为0表示永不过期
+LLM_CACHE_MAX_AGE = float(os.environ.get("LLM_CACHE_MAX_AGE", 7 * 24 * 3600)) or None
+
+# 提示词、检索方式等缓存键之外的逻辑变化时递增（或通过环境变量覆盖），使旧响应失效
+LLM_CACHE_VERSION = os.environ.get("LLM_CACHE_VERSION", "1")
+
+# 语义匹配的最低余弦相似度，以及每个对话前缀最多保留的候选数
+SEMANTIC_THRESHOLD = float(os.environ.get("LLM_CACHE_SEMANTIC_THRESHOLD", 0.97))
+SEMANTIC_MAX_CANDIDATES = 50
+
+CACHE_MODES = ("off", "exact", "normalized", "semantic")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _normalize_text(text):
+    """NFKC、合并空白、去除首尾空白"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def _normalize_messages(messages):
+    """规范化消息列表中的文本内容"""
+    normalized = []
+    for message in messages:
+        message = dict(message)
+        if isinstance(message.get("content"), str):
+            message["content"] = _normalize_text(message["content"])
+        normalized.append(message)
+    return normalized
+
+
+def _cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class LLMResponseCache:
+    """
+    大模型响应的持久化缓存
+
+    以（模型, 服务端实际模型版本, 缓存版本, 配置, 系统消息与完整对话）为键保存 ChatCompletion，
+    条目超过有效期后失效，超过容量上限时按最近访问时间淘汰，并按调用位置统计命中率。
+    服务端实际模型版本取自最近一次响应的 model 字段（如 gpt-4o-2024-08-06），
+    模型别名指向新版本后，之后的请求不再命中旧版本的响应。
+    """
+
+    def __init__(self, path=LLM_CACHE_PATH, mode=CONTRACT_LLM_CACHE,
+                 max_bytes=LLM_CACHE_MAX_BYTES, max_age=LLM_CACHE_MAX_AGE,
+                 semantic_threshold=SEMANTIC_THRESHOLD, embedding_model=None):
+        """
+        参数:
+        path (str): 缓存文件路径
+        mode (str): 缓存模式（off / exact / normalized / semantic）
+        max_bytes (int): 缓存总大小上限
+        max_age (float, optional): 条目有效期（秒）
+        semantic_threshold (float): 语义匹配的最低相似度
+        embedding_model (BaseEmbedding, optional): 语义匹配使用的嵌入模型
+        """
+        if mode not in CACHE_MODES:
+            raise ValueError(f"不支持的缓存模式: {mode}，可选值: {', '.join(CACHE_MODES)}")
+        self.mode = mode
+        self.cache = DiskCache(path, max_bytes=max_bytes, max_age=max_age)
+        self.semantic_threshold = semantic_threshold
+        self._embedding = embedding_model
+        self._site_stats = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.mode != "off"
+
+    @property
+    def embedding(self):
+        with self._lock:
+            if self._embedding is None:
+                from camel.embeddings import MistralEmbedding
+
+                from contract_advisor.knowledge_base.embedding_cache import CachedEmbedding
+
+                self._embedding = CachedEmbedding(MistralEmbedding())
+            return self._embedding
+
+    @staticmethod
+    def _model_id(model):
+        return str(getattr(model.model_type, "value", model.model_type))
+
+    def _served_key(self, model):
+        return "served:" + self._model_id(model)
+
+    def _model_version(self, model):
+        """模型标识：模型名、最近一次响应报告的实际模型版本和缓存版本"""
+        model_id = self._model_id(model)
+        return model_id, self.cache.get(self._served_key(model)) or model_id, LLM_CACHE_VERSION
+
+    def _key(self, model, messages):
+        """精确键：原始对话；normalized / semantic 模式下对话内容先规范化"""
+        if self.mode in ("normalized", "semantic"):
+            messages = _normalize_messages(messages)
+        return DiskCache.make_key(self._model_version(model), model.model_config_dict, messages)
+
+    def _semantic_group(self, model, messages):
+        """语义分组键：模型、配置和除最后一条消息外的对话前缀"""
+        return "semantic:" + DiskCache.make_key(
+            self._model_version(model), model.model_config_dict, _normalize_messages(messages[:-1])
+        )
+
+    def _record(self, call_site, hit):
+        with self._lock:
+            stats = self._site_stats.setdefault(call_site, {"hits": 0, "misses": 0})
+            stats["hits" if hit else "misses"] += 1
+
+    def lookup(self, model, messages, call_site):
+        """
+        查找缓存的响应
+
+        参数:
+        model (BaseModelBackend): 模型后端
+        messages (list): OpenAI格式的消息列表
+        call_site (str): 调用位置名称，用于统计
+
+        返回:
+        tuple: (缓存的 ChatCompletion JSON 或 None, 精确键)
+        """
+        key = self._key(model, messages)
+        value = self.cache.get(key)
+        if value is None and self.mode == "semantic" and messages:
+            value = self._semantic_lookup(model, messages)
+        self._record(call_site, value is not None)
+        return value, key
+
+    def _semantic_lookup(self, model, messages):
+        """在相同对话前缀下按最后一条消息的语义相似度查找"""
+        candidates = self.cache.get(self._semantic_group(model, messages))
+        content = messages[-1].get("content")
+        if not candidates or not isinstance(content, str):
+            return None
+        vector = self.embedding.embed(_normalize_text(content))
+        best_key, best_score = None, self.semantic_threshold
+        for candidate in json.loads(candidates):
+            score = _cosine(vector, candidate["vector"])
+            if score >= best_score:
+                best_key, best_score = candidate["key"], score
+        return self.cache.get(best_key) if best_key else None
+
+    def store(self, model, messages, key, response_json):
+        """
+        写入响应
+
+        响应报告的实际模型版本与记录不同时先更新记录，再按新版本重新计算键。
+
+        参数:
+        model (BaseModelBackend): 模型后端
+        messages (list): OpenAI格式的消息列表
+        key (str): 查找时计算的精确键
+        response_json (str): 序列化后的 ChatCompletion
+        """
+        served = json.loads(response_json).get("model")
+        if served and served != self._model_version(model)[1]:
+            self.cache.set(self._served_key(model), served)
+            key = self._key(model, messages)
+        self.cache.set(key, response_json)
+        content = messages[-1].get("content") if messages else None
+        if self.mode == "semantic" and isinstance(content, str):
+            group = self._semantic_group(model, messages)
+            vector = self.embedding.embed(_normalize_text(content))
+            with self._lock:
+                candidates = json.loads(self.cache.get(group) or "[]")
+                candidates = [c for c in candidates if c["key"] != key]
+                candidates.append({"key": key, "vector": vector})
+                self.cache.set(group, json.dumps(candidates[-SEMANTIC_MAX_CANDIDATES:]))
+
+    def stats(self):
+        """
+        返回各调用位置的命中统计
+
+        返回:
+        dict: 调用位置 -> 命中数、未命中数、命中率；"total" 为汇总
+        """
+        with self._lock:
+            sites = {site: dict(stats) for site, stats in self._site_stats.items()}
+        hits = sum(stats["hits"] for stats in sites.values())
+        misses = sum(stats["misses"] for stats in sites.values())
+        sites["total"] = {"hits": hits, "misses": misses}
+        for stats in sites.values():
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return sites
+
+
+class CachedModelBackend:
+    """
+    带响应缓存的模型后端代理
+
+    除 run 外的属性读写都透传给被包装的模型，因此 ChatAgent 修改
+    model_config_dict（如注册工具）时仍作用于原模型，缓存键也随之变化。
+    流式响应不缓存。
+    """
+
+    def __init__(self, model, call_site, cache=None):
+        """
+        参数:
+        model (BaseModelBackend): 被包装的模型后端
+        call_site (str): 调用位置名称
+        cache (LLMResponseCache, optional): 响应缓存，默认使用共享缓存
+        """
+        object.__setattr__(self, "_model", model)
+        object.__setattr__(self, "_call_site", call_site)
+        object.__setattr__(self, "_cache", cache or get_llm_cache())
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._model, name, value)
+
+    def run(self, messages):
+        from openai.types.chat import ChatCompletion
+
+        if not self._cache.enabled or self._model.model_config_dict.get("stream"):
+            return self._model.run(messages)
+
+        cached, key = self._cache.lookup(self._model, messages, self._call_site)
+        if cached is not None:
+            return ChatCompletion.model_validate_json(cached)
+
+        response = self._model.run(messages)
+        if isinstance(response, ChatCompletion):
+            self._cache.store(self._model, messages, key, response.model_dump_json())
+        return response
+
+
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """
+    获取进程内共享的大模型响应缓存
+
+    返回:
+    LLMResponseCache: 缓存实例
+    """
+    global _llm_cache
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            _llm_cache = LLMResponseCache()
+        return _llm_cache
+
+
+def cached_model(model, call_site):
+    """
+    为模型后端加上响应缓存（缓存关闭时原样返回）
+
+    参数:
+    model (BaseModelBackend): 模型后端
+    call_site (str): 调用位置名称，如 "contract_analyzer"
+
+    返回:
+    BaseModelBackend: 带缓存的模型后端
+    """
+    if CONTRACT_LLM_CACHE == "off":
+        return model
+    return CachedModelBackend(model, call_site)
+
+
+def llm_cache_stats():
+    """返回共享缓存的各调用位置命中统计"""
+    return get_llm_cache().stats()
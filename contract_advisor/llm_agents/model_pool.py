@@ -0,0 +1,170 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from camel.models import ModelFactory
+
+from contract_advisor.llm_agents.llm_cache import cached_model
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def _model_key(model_platform, model_type, model_config_dict, tools):
+    tool_names = sorted(tool.get_function_name() for tool in tools or [])
+    return json.dumps(
+        [str(model_platform), str(model_type), model_config_dict or {}, tool_names],
+        sort_keys=True, ensure_ascii=False, default=str,
+    )
+
+
+def get_model(model_platform, model_type, model_config_dict=None, call_site=None, tools=None):
+    """
+    从进程内模型池获取模型客户端
+
+    模型按（平台, 类型, 配置）复用；ChatAgent 注册工具时会改写模型配置，
+    因此带工具的模型按工具集合单独建池，不与无工具的模型共享实例。
+
+    参数:
+    model_platform (ModelPlatformType): 模型平台
+    model_type (ModelType): 模型类型
+    model_config_dict (dict, optional): 模型配置
+    call_site (str, optional): 调用位置名称，提供时加上响应缓存
+    tools (list, optional): 将注册到该模型上的 FunctionTool 列表
+
+    返回:
+    BaseModelBackend: 模型客户端
+    """
+    key = _model_key(model_platform, model_type, model_config_dict, tools)
+    with _models_lock:
+        model = _models.get(key)
+        if model is None:
+            kwargs = {"model_platform": model_platform, "model_type": model_type}
+            if model_config_dict is not None:
+                kwargs["model_config_dict"] = dict(model_config_dict)
+            model = ModelFactory.create(**kwargs)
+            _models[key] = model
+    return cached_model(model, call_site) if call_site else model
+
+
+class AgentPool:
+    """
+    预先配置好的代理模板池
+
+    代理用完后放回池中，下次取出时只需 reset() 清空对话记忆，
+    不必重新构建系统消息、模型和上下文管理器。
+    """
+
+    def __init__(self, factory, name):
+        """
+        参数:
+        factory (callable): 创建新代理的无参函数
+        name (str): 池名称
+        """
+        self.factory = factory
+        self.name = name
+        self.created = 0
+        self.reused = 0
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取出一个已重置的代理，池中没有空闲代理时新建"""
+        with self._lock:
+            agent = self._idle.pop() if self._idle else None
+            if agent is not None:
+                self.reused += 1
+            else:
+                self.created += 1
+        if agent is None:
+            return self.factory()
+        agent.reset()
+        return agent
+
+    def release(self, agent):
+        """将代理放回池中"""
+        with self._lock:
+            self._idle.append(agent)
+
+    @contextmanager
+    def lease(self):
+        """以上下文管理器方式借用代理，结束后自动归还"""
+        agent = self.acquire()
+        try:
+            yield agent
+        finally:
+            self.release(agent)
+
+    def warm(self, count=1):
+        """补足空闲代理，使池中至少有 count 个可直接使用的代理"""
+        with self._lock:
+            missing = max(0, count - len(self._idle))
+        agents = [self.factory() for _ in range(missing)]
+        with self._lock:
+            self.created += len(agents)
+            self._idle.extend(agents)
+
+    def stats(self):
+        with self._lock:
+            return {"created": self.created, "reused": self.reused, "idle": len(self._idle)}
+
+
+_agent_pools = {}
+_agent_pools_lock = threading.Lock()
+
+
+def get_agent_pool(name, factory):
+    """
+    获取指定名称的代理池，不存在时用 factory 创建
+
+    参数:
+    name (str): 池名称（如评估者名称）
+    factory (callable): 创建新代理的无参函数
+
+    返回:
+    AgentPool: 代理池
+    """
+    with _agent_pools_lock:
+        pool = _agent_pools.get(name)
+        if pool is None:
+            pool = AgentPool(factory, name)
+            _agent_pools[name] = pool
+        return pool
+
+
+def agent_pool_stats():
+    """返回所有代理池的创建和复用次数"""
+    with _agent_pools_lock:
+        pools = list(_agent_pools.values())
+    return {pool.name: pool.stats() for pool in pools}
+
+
+def warm_up(agents_per_pool=1):
+    """
+    启动时预热模型客户端和常用代理，批量处理时每份合同不再有初始化开销
+
+    参数:
+    agents_per_pool (int): 每个代理池预先创建的代理数（通常等于并发合同数）
+
+    返回:
+    float: 预热耗时（秒）
+    """
+    from contract_advisor.llm_agents.contract_analyzer.contract_analyzer import warm_up_analyzer
+    from contract_advisor.llm_agents.debate_agents.debate import warm_up_personas
+    from contract_advisor.knowledge_base.nebula_graph.neo import warm_up_kg_agents
+
+    start_time = time.monotonic()
+    steps = (
+        lambda: warm_up_analyzer(agents_per_pool),
+        lambda: warm_up_personas(agents_per_pool),
+        lambda: warm_up_kg_agents(agents_per_pool),
+    )
+    for name, step in zip(("analyzer", "personas", "knowledge_graph"), steps):
+        try:
+            step()
+        except Exception as e:
+            print(f"预热 {name} 时出错: {str(e)}")
+    elapsed = time.monotonic() - start_time
+    print(f"模型和代理预热完成，耗时 {elapsed:.2f} 秒")
+    return elapsed
@@ -0,0 +1,161 @@
+import json
+import os
+import sys
+import threading
+import time
+
+# 无界面模式下默认的事件日志文件，可通过环境变量覆盖
+REPORT_EVENT_LOG = os.environ.get("REPORT_EVENT_LOG", "local_data/events/risk_report.jsonl")
+
+# 交互模式下逐字打印的间隔（秒）
+ANIMATION_DELAY = 0.01
+
+
+class EventSink:
+    """
+    结构化事件接收器基类
+
+    事件是一个字典，包含 type（事件类型）、time（时间戳）以及各事件类型自己的字段。
+    风险报告会话产生的事件类型：
+    session_start（系统消息和任务提示词）、user_message、assistant_message（含 tool_calls）、
+    terminated（某一方终止及原因）、session_end（轮数和结束原因）。
+    """
+
+    def emit(self, event_type, **data):
+        """
+        发送一个事件
+
+        参数:
+        event_type (str): 事件类型
+        **data: 事件字段
+        """
+        event = {"type": event_type, "time": time.time()}
+        event.update(data)
+        self.handle(event)
+
+    def handle(self, event):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class JSONLEventSink(EventSink):
+    """将事件逐行写入JSONL文件（或已打开的文本流），多线程共享时按行加锁"""
+
+    def __init__(self, target=REPORT_EVENT_LOG):
+        """
+        参数:
+        target (str | file): 文件路径（追加写入）或可写的文本流
+        """
+        if isinstance(target, str):
+            directory = os.path.dirname(target)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(target, "a", encoding="utf-8")
+            self._owns_file = True
+        else:
+            self._file = target
+            self._owns_file = False
+        self._lock = threading.Lock()
+
+    def handle(self, event):
+        line = json.dumps(event, ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._owns_file and not self._file.closed:
+                self._file.close()
+
+
+class CallbackEventSink(EventSink):
+    """把每个事件交给回调函数处理（如推送到前端或写入数据库）"""
+
+    def __init__(self, callback):
+        """
+        参数:
+        callback (callable): 接收事件字典的函数
+        """
+        self.callback = callback
+
+    def handle(self, event):
+        self.callback(event)
+
+
+class ConsoleEventSink(EventSink):
+    """交互模式：以彩色逐字动画的方式在控制台打印会话内容"""
+
+    def __init__(self, delay=ANIMATION_DELAY, stream=None):
+        """
+        参数:
+        delay (float): 逐字打印的间隔（秒），为0时直接整段打印
+        stream (file, optional): 输出流，默认标准输出
+        """
+        self.delay = delay
+        self.stream = stream or sys.stdout
+
+    def _print(self, text):
+        print(text, file=self.stream)
+
+    def _animate(self, text):
+        if not self.delay:
+            print(text + "\n", file=self.stream, flush=True)
+            return
+        for char in text:
+            print(char, end="", file=self.stream, flush=True)
+            time.sleep(self.delay)
+        print("\n", file=self.stream)
+
+    def handle(self, event):
+        from colorama import Fore
+
+        event_type = event["type"]
+        if event_type == "session_start":
+            for key, color, label in (
+                ("assistant_sys_msg", Fore.GREEN, "AI Assistant sys message:"),
+                ("user_sys_msg", Fore.BLUE, "AI User sys message:"),
+                ("task_prompt", Fore.YELLOW, "Original task prompt:"),
+                ("specified_task_prompt", Fore.CYAN, "Specified task prompt:"),
+                ("final_task_prompt", Fore.RED, "Final task prompt:"),
+            ):
+                if key in event:
+                    self._print(color + f"{label}\n{event[key]}\n")
+        elif event_type == "terminated":
+            self._print(Fore.GREEN + f"AI {event['role']} terminated. Reason: {event['reasons']}.")
+        elif event_type == "user_message":
+            self._animate(Fore.BLUE + f"AI User:\n\n{event['content']}\n")
+        elif event_type == "assistant_message":
+            self._animate(Fore.GREEN + "AI Assistant:")
+            for call in event.get("tool_calls", []):
+                self._animate(
+                    f"Function Execution: {call['func_name']}\n"
+                    f"\tArgs: {call['args']}\n"
+                    f"\tResult: {call['result']}"
+                )
+            self._animate(f"{event['content']}\n")
+
+
+_default_sink = None
+_default_sink_lock = threading.Lock()
+
+
+def get_event_sink(interactive=False):
+    """
+    获取默认的事件接收器
+
+    参数:
+    interactive (bool): 是否为交互模式
+
+    返回:
+    EventSink: 交互模式下为控制台动画输出，否则为共享的JSONL事件日志（REPORT_EVENT_LOG）
+    """
+    global _default_sink
+    if interactive:
+        return ConsoleEventSink()
+    with _default_sink_lock:
+        if _default_sink is None:
+            _default_sink = JSONLEventSink(REPORT_EVENT_LOG)
+        return _default_sink
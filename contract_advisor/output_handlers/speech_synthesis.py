@@ -9,7 +9,7 @@ def generate_speech(prompt, storage_path):
     storage_path (str): 音频文件的保存路径
     
     返回:
-    IPython.display.Audio: 音频对象,可用于播放
+    IPython.display.Audio: 音频对象,可用于播放（未安装IPython时返回音频文件路径）
     """
     # 初始化FishAudio模型
     audio_models = FishAudioModel()
@@ -21,4 +21,8 @@ def generate_speech(prompt, storage_path):
     audio_models.text_to_speech(input=prompt, storage_path=storage_path)
     
     # 返回音频对象
+    try:
+        from IPython.display import Audio
+    except ImportError:
+        return storage_path
     return Audio(storage_path, autoplay=False)
\ No newline at end of file
@@ -0,0 +1,240 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# 多进程共享同一缓存文件时，每隔这么多次写入按实际数据重新统计一次总字节数
+RESYNC_EVERY = 1000
+
+
+class DiskCache:
+    """
+    基于SQLite的持久化键值缓存
+
+    支持按存储时长（max_age）过期和按总大小（max_bytes）的LRU淘汰，
+    使用WAL模式，可在多线程和多进程之间共享同一个缓存文件。
+    """
+
+    def __init__(self, path, max_bytes=None, max_age=None):
+        """
+        初始化缓存
+
+        参数:
+        path (str): SQLite缓存文件路径
+        max_bytes (int, optional): 缓存值的总字节数上限，超过后按最近访问时间淘汰
+        max_age (float, optional): 条目有效期（秒），过期条目视为未命中
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                meta TEXT,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries(accessed_at)"
+        )
+        self._conn.commit()
+        # 缓存值总字节数的运行计数，写入时据此判断是否需要淘汰，避免每次写入全表求和
+        self._total_bytes = self._sum_sizes()
+
+    def _sum_sizes(self):
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    @staticmethod
+    def make_key(*parts):
+        """
+        根据任意可JSON序列化的参数生成缓存键
+
+        返回:
+        str: SHA-256十六进制摘要
+        """
+        payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _is_expired(self, created_at, now):
+        return self.max_age is not None and now - created_at > self.max_age
+
+    def get(self, key, default=None):
+        """
+        读取缓存值，未命中或已过期时返回default
+
+        参数:
+        key (str): 缓存键
+        default: 未命中时的返回值
+
+        返回:
+        str: 缓存值
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None or self._is_expired(row[1], now):
+                self.misses += 1
+                return default
+
+            self._conn.execute(
+                "UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def record_hit(self):
+        """把最近一次未命中改记为命中（如过期条目经条件请求重新验证成功后）"""
+        with self._lock:
+            self.misses -= 1
+            self.hits += 1
+
+    def get_entry(self, key):
+        """
+        读取完整条目（包括已过期条目），用于条件重新验证
+
+        参数:
+        key (str): 缓存键
+
+        返回:
+        dict: 包含 value、meta、created_at、expired 的字典，不存在时返回None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, meta, created_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "value": row[0],
+            "meta": json.loads(row[1]) if row[1] else {},
+            "created_at": row[2],
+            "expired": self._is_expired(row[2], time.time()),
+        }
+
+    def set(self, key, value, meta=None):
+        """
+        写入缓存值，并在超过容量上限时触发淘汰
+
+        参数:
+        key (str): 缓存键
+        value (str): 缓存值
+        meta (dict, optional): 附加元数据
+        """
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        meta_text = json.dumps(meta, ensure_ascii=False) if meta else None
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries "
+                "(key, value, meta, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, value, meta_text, size, now, now),
+            )
+            self._conn.commit()
+            self._total_bytes += size - (old[0] if old else 0)
+            self._writes += 1
+            if self._writes % RESYNC_EVERY == 0:
+                self._total_bytes = self._sum_sizes()
+            over_limit = self.max_bytes is not None and self._total_bytes > self.max_bytes
+        if over_limit:
+            # 写入时只按容量淘汰，过期条目保留以便条件重新验证
+            self.evict(purge_expired=False)
+
+    def touch(self, key):
+        """将条目的存储时间刷新为当前时间（重新验证成功后使用）"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE entries SET created_at = ?, accessed_at = ? WHERE key = ?",
+                (now, now, key),
+            )
+            self._conn.commit()
+
+    def delete(self, key):
+        """删除指定条目"""
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._conn.commit()
+            if row:
+                self._total_bytes -= row[0]
+
+    def evict(self, purge_expired=True):
+        """
+        清理过期条目，并按最近访问时间淘汰条目直到总大小不超过max_bytes
+
+        参数:
+        purge_expired (bool): 是否同时删除所有过期条目
+
+        返回:
+        int: 被删除的条目数
+        """
+        removed = 0
+        with self._lock:
+            if purge_expired and self.max_age is not None:
+                cursor = self._conn.execute(
+                    "DELETE FROM entries WHERE created_at < ?",
+                    (time.time() - self.max_age,),
+                )
+                removed += cursor.rowcount
+
+            total = self._sum_sizes()
+            if self.max_bytes is not None and total > self.max_bytes:
+                rows = self._conn.execute(
+                    "SELECT key, size FROM entries ORDER BY accessed_at"
+                ).fetchall()
+                for key, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    total -= size
+                    removed += 1
+
+            self._conn.commit()
+            self._total_bytes = total
+        return removed
+
+    def stats(self):
+        """
+        返回缓存统计信息
+
+        返回:
+        dict: 命中数、未命中数、命中率、条目数和总字节数
+        """
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": total,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
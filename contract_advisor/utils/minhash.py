@@ -0,0 +1,163 @@
+import hashlib
+import re
+import threading
+import unicodedata
+
+import numpy as np
+
+# 签名长度（哈希函数个数）和LSH分带方式：16带×8行，估计相似度约0.7以上的文档才会成为候选
+NUM_PERM = 128
+LSH_BANDS = 16
+
+# 字符shingle长度（中文合同按字符切分，不依赖分词）
+SHINGLE_SIZE = 5
+
+# 大于 2^32 的素数，哈希值取低32位后线性变换不会溢出 uint64
+_PRIME = np.uint64(4294967311)
+
+_WHITESPACE = re.compile(r"\s+")
+_NUMBER = re.compile(r"\d+(?:[.,，]\d+)*")
+
+
+def normalize_text(text, mask_numbers=True):
+    """
+    相似度计算前的规范化：NFKC、去除空白，可选把数字（日期、金额、编号）统一替换为0
+
+    参数:
+    text (str): 原文
+    mask_numbers (bool): 是否屏蔽数字
+
+    返回:
+    str: 规范化后的文本
+    """
+    text = _WHITESPACE.sub("", unicodedata.normalize("NFKC", text))
+    return _NUMBER.sub("0", text) if mask_numbers else text
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """
+    生成字符shingle集合
+
+    参数:
+    text (str): 已规范化的文本
+    size (int): shingle长度
+
+    返回:
+    set: shingle集合，文本短于size时为整段文本
+    """
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class MinHasher:
+    """用固定种子生成的线性哈希族计算MinHash签名，同一种子的签名之间可以比较"""
+
+    def __init__(self, num_perm=NUM_PERM, seed=1):
+        """
+        参数:
+        num_perm (int): 签名长度
+        seed (int): 随机种子
+        """
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self._a = rng.integers(1, 2 ** 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 2 ** 32, size=num_perm, dtype=np.uint64)
+
+    def signature(self, items):
+        """
+        计算集合的MinHash签名
+
+        参数:
+        items (set): shingle集合
+
+        返回:
+        np.ndarray: uint64签名，空集合时全部为最大值
+        """
+        if not items:
+            return np.full(self.num_perm, np.iinfo(np.uint64).max, dtype=np.uint64)
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(item.encode("utf-8"), digest_size=4).digest(), "little")
+             for item in items),
+            dtype=np.uint64,
+            count=len(items),
+        )
+        values = (hashes[:, None] * self._a[None, :] + self._b[None, :]) % _PRIME
+        return values.min(axis=0)
+
+    def text_signature(self, text, mask_numbers=True, size=SHINGLE_SIZE):
+        """规范化文本并计算其MinHash签名"""
+        return self.signature(shingles(normalize_text(text, mask_numbers), size))
+
+
+def jaccard(sig_a, sig_b):
+    """根据两个签名估计Jaccard相似度"""
+    return float(np.mean(sig_a == sig_b))
+
+
+def band_keys(signature, bands=LSH_BANDS):
+    """
+    把签名切成若干带，返回每一带的（带号, 桶键）
+
+    参数:
+    signature (np.ndarray): MinHash签名
+    bands (int): 分带数
+
+    返回:
+    list: (带号, 该带的字节串)
+    """
+    rows = len(signature) // bands
+    return [(band, signature[band * rows:(band + 1) * rows].tobytes()) for band in range(bands)]
+
+
+class LSHIndex:
+    """
+    MinHash签名的局部敏感哈希索引
+
+    签名被切成若干带，任意一带完全相同的文档成为候选，再用签名估计的相似度过滤。
+    """
+
+    def __init__(self, threshold, num_perm=NUM_PERM, bands=LSH_BANDS):
+        """
+        参数:
+        threshold (float): 估计Jaccard相似度下限
+        num_perm (int): 签名长度
+        bands (int): 分带数，须整除 num_perm
+        """
+        if num_perm % bands:
+            raise ValueError(f"分带数 {bands} 必须整除签名长度 {num_perm}")
+        self.threshold = threshold
+        self.bands = bands
+        self._buckets = [{} for _ in range(bands)]
+        self._signatures = {}
+        self._lock = threading.Lock()
+
+    def add(self, key, signature):
+        """加入一个签名"""
+        with self._lock:
+            self._signatures[key] = signature
+            for band, band_key in band_keys(signature, self.bands):
+                self._buckets[band].setdefault(band_key, []).append(key)
+
+    def query(self, signature):
+        """
+        查找相似的已索引条目
+
+        参数:
+        signature (np.ndarray): 查询签名
+
+        返回:
+        list: (键, 估计相似度)，按相似度从高到低排列
+        """
+        with self._lock:
+            candidates = set()
+            for band, band_key in band_keys(signature, self.bands):
+                candidates.update(self._buckets[band].get(band_key, ()))
+            scored = [(key, jaccard(signature, self._signatures[key])) for key in candidates]
+        return sorted(
+            [(key, score) for key, score in scored if score >= self.threshold],
+            key=lambda item: -item[1],
+        )
+
+    def __len__(self):
+        return len(self._signatures)
@@ -0,0 +1,152 @@
+import json
+import os
+import threading
+import time
+
+from contract_advisor.utils.disk_cache import DiskCache
+
+# 阶段产物存储位置，可通过环境变量或命令行覆盖
+ARTIFACT_STORE_PATH = os.environ.get("ARTIFACT_STORE_PATH", "local_data/artifacts/artifacts.sqlite")
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_artifact_store(path=None):
+    """
+    获取指定路径的阶段产物存储（同一路径在进程内共享）
+
+    产物不设容量上限和有效期，只有阶段指纹或上游产物变化时才会生成新条目。
+
+    参数:
+    path (str, optional): SQLite文件路径，默认使用 ARTIFACT_STORE_PATH
+
+    返回:
+    DiskCache: 产物存储
+    """
+    path = path or ARTIFACT_STORE_PATH
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = DiskCache(path)
+            _stores[path] = store
+        return store
+
+
+class Stage:
+    """
+    流水线中的一个阶段
+
+    阶段产物的键由阶段名、阶段指纹（提示词、模型配置等）和上游产物的键共同决定，
+    因此修改某个阶段的提示词只会使该阶段及其下游阶段失效。
+    """
+
+    def __init__(self, name, func, depends_on=(), fingerprint=None, is_valid=None):
+        """
+        参数:
+        name (str): 阶段名称
+        func (callable): 阶段函数，参数为上游阶段产物组成的字典，返回可JSON序列化的产物；
+            失败时抛出异常
+        depends_on (tuple): 上游阶段名称，为空时依赖流水线输入
+        fingerprint: 可JSON序列化的阶段配置（提示词、模型、参数）
+        is_valid (callable, optional): 检查已保存产物是否仍可用（如输出文件是否还在）
+        """
+        self.name = name
+        self.func = func
+        self.depends_on = tuple(depends_on)
+        self.fingerprint = fingerprint
+        self.is_valid = is_valid
+
+
+class StageRunner:
+    """
+    带检查点的阶段图执行器
+
+    按顺序执行各阶段，每个阶段完成后立即保存产物；断点续跑时已完成的阶段
+    直接读取产物，某个阶段失败时其下游阶段全部跳过。
+    """
+
+    def __init__(self, stages, store=None, resume=True):
+        """
+        参数:
+        stages (list): 按拓扑顺序排列的 Stage 列表
+        store (DiskCache, optional): 产物存储，默认使用共享存储
+        resume (bool): 是否复用已保存的产物
+        """
+        self.stages = stages
+        self.store = store or get_artifact_store()
+        self.resume = resume
+
+    @staticmethod
+    def stage_key(stage, upstream_keys):
+        """根据阶段名、指纹和上游产物键生成产物键"""
+        return DiskCache.make_key("stage", stage.name, stage.fingerprint, upstream_keys)
+
+    def _load(self, stage, key):
+        if not self.resume:
+            return None
+        cached = self.store.get(key)
+        if cached is None:
+            return None
+        output = json.loads(cached)
+        if stage.is_valid is not None and not stage.is_valid(output):
+            return None
+        return output
+
+    def run(self, input_hash):
+        """
+        对一个输入执行全部阶段
+
+        参数:
+        input_hash (str): 流水线输入的内容摘要（如PDF文件的SHA-256）
+
+        返回:
+        dict: outputs（阶段名 -> 产物）、status（阶段名 -> cached / done / failed / skipped）、
+            timings（秒）、failed（失败的阶段名或None）、error（错误信息或None）
+        """
+        outputs = {}
+        keys = {}
+        status = {}
+        timings = {}
+        failed = None
+        error = None
+
+        for stage in self.stages:
+            if failed is not None or any(dep not in outputs for dep in stage.depends_on):
+                status[stage.name] = "skipped"
+                continue
+
+            upstream = [keys[dep] for dep in stage.depends_on] or [input_hash]
+            key = self.stage_key(stage, upstream)
+            keys[stage.name] = key
+
+            output = self._load(stage, key)
+            if output is not None:
+                outputs[stage.name] = output
+                status[stage.name] = "cached"
+                continue
+
+            start_time = time.monotonic()
+            try:
+                output = stage.func({dep: outputs[dep] for dep in stage.depends_on})
+            except Exception as e:
+                failed, error = stage.name, str(e)
+                status[stage.name] = "failed"
+                continue
+            timings[stage.name] = round(time.monotonic() - start_time, 2)
+
+            self.store.set(
+                key,
+                json.dumps(output, ensure_ascii=False),
+                meta={"stage": stage.name, "input": input_hash, "elapsed": timings[stage.name]},
+            )
+            outputs[stage.name] = output
+            status[stage.name] = "done"
+
+        return {
+            "outputs": outputs,
+            "status": status,
+            "timings": timings,
+            "failed": failed,
+            "error": error,
+        }
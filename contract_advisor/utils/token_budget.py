@@ -0,0 +1,222 @@
+import os
+import re
+import threading
+import time
+
+# 所有调用方共用的安全比例：只使用模型上下文窗口的这一部分
+SAFE_RATIO = 0.7
+
+# 各模型的上下文窗口（token）
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4o-mini": 128000,
+    "gpt-4o": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4": 8192,
+    "qwen-turbo": 131072,
+    "qwen-plus": 131072,
+    "qwen-max": 32768,
+    "mistral-large-latest": 131072,
+    "mistral-embed": 8192,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# 合同及案例文本中价值较高的关键词，打包时优先保留命中这些词的段落
+CONTRACT_KEYWORDS = (
+    "补偿", "赔偿", "工资", "解除", "终止", "违约", "保密", "竞业",
+    "支付", "期限", "责任", "义务", "风险", "争议", "劳动合同法",
+)
+
+# Qwen使用的HuggingFace分词器，可通过环境变量替换为本地目录（离线环境下只从该目录加载，不访问Hub）
+QWEN_TOKENIZER = os.environ.get("QWEN_TOKENIZER", "Qwen/Qwen2.5-7B-Instruct")
+
+# 分词器加载失败后，间隔这么多秒再重试（期间使用保守估算）
+TOKENIZER_RETRY_SECONDS = float(os.environ.get("TOKENIZER_RETRY_SECONDS", 300))
+
+_CJK_PATTERN = re.compile(r"[　-〿㐀-䶿一-鿿＀-￯]")
+_tokenizer_lock = threading.Lock()
+_tokenizers = {}
+_tokenizer_failures = {}
+
+
+def model_name(model):
+    """将 ModelType 枚举或字符串统一为小写模型名"""
+    return str(getattr(model, "value", model)).lower()
+
+
+def estimate_tokens(text):
+    """
+    无分词器时的保守估算：中日韩字符按1.5个token计，其他字符按4个字符1个token计
+
+    参数:
+    text (str): 文本
+
+    返回:
+    int: 估算的token数
+    """
+    cjk = len(_CJK_PATTERN.findall(text))
+    return int(cjk * 1.5 + (len(text) - cjk) / 4) + 1
+
+
+def _get_tokenizer(name):
+    """
+    获取模型的分词计数函数（调用方持有 _tokenizer_lock）
+
+    加载成功的分词器在进程内复用；加载失败（如离线时无法从Hub下载）不会永久生效，
+    TOKENIZER_RETRY_SECONDS 之后重新尝试加载，期间返回None使用保守估算。
+    """
+    counter = _tokenizers.get(name)
+    if counter is not None:
+        return counter
+    failed_at = _tokenizer_failures.get(name)
+    if failed_at is not None and time.monotonic() - failed_at < TOKENIZER_RETRY_SECONDS:
+        return None
+    counter = _load_tokenizer(name)
+    if counter is None:
+        _tokenizer_failures[name] = time.monotonic()
+    else:
+        _tokenizers[name] = counter
+        _tokenizer_failures.pop(name, None)
+    return counter
+
+
+def _load_tokenizer(name):
+    """按模型系列加载真实分词器，不可用时返回None"""
+    try:
+        if "mistral" in name:
+            from mistral_common.tokens.tokenizers.mistral import MistralTokenizer
+
+            tokenizer = MistralTokenizer.from_model(name).instruct_tokenizer.tokenizer
+            return lambda text: len(tokenizer.encode(text, bos=False, eos=False))
+
+        if "qwen" in name:
+            from transformers import AutoTokenizer
+
+            tokenizer = AutoTokenizer.from_pretrained(
+                QWEN_TOKENIZER, local_files_only=os.path.isdir(QWEN_TOKENIZER)
+            )
+            return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+
+        import tiktoken
+
+        try:
+            encoding = tiktoken.encoding_for_model(name)
+        except KeyError:
+            encoding = tiktoken.get_encoding("o200k_base")
+        return lambda text: len(encoding.encode(text, disallowed_special=()))
+    except Exception as e:
+        print(f"无法加载 {name} 的分词器，改用保守估算: {str(e)}")
+        return None
+
+
+def count_tokens(text, model):
+    """
+    使用目标模型的分词器统计token数
+
+    参数:
+    text (str): 文本
+    model (str|ModelType): 目标模型
+
+    返回:
+    int: token数
+    """
+    if not text:
+        return 0
+    with _tokenizer_lock:
+        counter = _get_tokenizer(model_name(model))
+    return counter(text) if counter is not None else estimate_tokens(text)
+
+
+class TokenBudget:
+    """
+    按目标模型真实分词结果计算的上下文预算
+
+    爬虫、合同分析和多角色评估共用同一套预算规则，避免按字符数估算
+    导致中文内容超出窗口或被过度截断。
+    """
+
+    def __init__(self, model, max_tokens=None, ratio=SAFE_RATIO, reserved=0):
+        """
+        参数:
+        model (str|ModelType): 目标模型
+        max_tokens (int, optional): 上下文窗口，默认按模型查表
+        ratio (float): 可用于输入内容的比例
+        reserved (int): 需要额外预留的token数（系统提示词、输出等）
+        """
+        self.model = model_name(model)
+        self.max_tokens = max_tokens or MODEL_CONTEXT_WINDOWS.get(self.model, DEFAULT_CONTEXT_WINDOW)
+        self.limit = max(0, int(self.max_tokens * ratio) - reserved)
+
+    def count(self, text):
+        return count_tokens(text, self.model)
+
+    def truncate(self, text, limit=None):
+        """
+        截断文本使其不超过预算（按字符二分查找边界）
+
+        参数:
+        text (str): 文本
+        limit (int, optional): token上限，默认为整个预算
+
+        返回:
+        str: 截断后的文本
+        """
+        limit = self.limit if limit is None else limit
+        if self.count(text) <= limit:
+            return text
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.count(text[:middle]) <= limit:
+                low = middle
+            else:
+                high = middle - 1
+        return text[:low]
+
+    def pack(self, chunks, scores=None, limit=None):
+        """
+        在预算内优先选入价值最高的文本块，结果保持原始顺序
+
+        参数:
+        chunks (list): 文本块列表
+        scores (list, optional): 每个文本块的价值分数，默认越靠前价值越高
+        limit (int, optional): token上限，默认为整个预算
+
+        返回:
+        list: 选中的文本块
+        """
+        limit = self.limit if limit is None else limit
+        if scores is None:
+            scores = [-index for index in range(len(chunks))]
+        order = sorted(range(len(chunks)), key=lambda index: (-scores[index], index))
+
+        used = 0
+        selected = set()
+        for index in order:
+            tokens = self.count(chunks[index])
+            if used + tokens <= limit:
+                selected.add(index)
+                used += tokens
+        return [chunk for index, chunk in enumerate(chunks) if index in selected]
+
+    def pack_text(self, text, keywords=(), separator="\n", limit=None):
+        """
+        将长文本按段落切分，命中关键词越多的段落越优先，在预算内重新拼接
+
+        参数:
+        text (str): 文本
+        keywords (tuple): 提升段落价值的关键词
+        separator (str): 段落分隔符
+        limit (int, optional): token上限
+
+        返回:
+        str: 打包后的文本
+        """
+        limit = self.limit if limit is None else limit
+        if self.count(text) <= limit:
+            return text
+        paragraphs = [p for p in text.split(separator) if p.strip()]
+        scores = [
+            sum(p.count(keyword) for keyword in keywords) - index / max(len(paragraphs), 1)
+            for index, p in enumerate(paragraphs)
+        ]
+        return separator.join(self.pack(paragraphs, scores, limit))
@@ -1,42 +1,160 @@
 # main.py
-from contract_advisor.llm_agents.contract_analyzer.contract_analyzer import ContractAnalyzer,create_risk_knowledge_report
+from contract_advisor.llm_agents.contract_analyzer.contract_analyzer import ContractAnalyzer
+from contract_advisor.llm_agents.model_pool import warm_up
+from contract_advisor.output_handlers.event_sink import JSONLEventSink
+import argparse
+import glob
+import json
 import os
 from getpass import getpass
-from contract_advisor.llm_agents.debate_agents.debate import analyze_contract_risk
-from contract_advisor.output_handlers.speech_synthesis import generate_speech
+
+# 运行所需的API密钥，已在环境变量中设置的不再重复输入
+API_KEY_PROMPTS = [
+    ("CHUNKR_API_KEY", 'Enter your Chunkr API key: '),
+    ("OPENAI_API_KEY", 'Enter your OpenAI API key: '),
+    ("FIRECRAWL_API_KEY", 'Enter your Firecrawl API key: '),
+    ("MISTRAL_API_KEY", 'Enter your Mistral API key: '),
+    ("GOOGLE_API_KEY", 'Enter your Google API key: '),
+    ("SEARCH_ENGINE_ID", 'Enter your Search Engine ID: '),
+    ("QWEN_API_KEY", 'Enter your Qwen API key: '),
+    ("FISHAUDIO_API_KEY", 'Enter your Fish Audio API key: '),
+]
+
+
+def collect_pdf_paths(inputs):
+    """
+    将命令行输入的文件、目录和通配符展开为PDF文件列表
+
+    参数:
+    inputs (list): 文件路径、目录或通配符
+
+    返回:
+    list: 去重并保持顺序的PDF文件路径列表
+    """
+    pdf_paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = sorted(glob.glob(os.path.join(item, "*.pdf")))
+        else:
+            matches = sorted(glob.glob(item)) or [item]
+        for path in matches:
+            if path not in pdf_paths:
+                pdf_paths.append(path)
+    return pdf_paths
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="批量合同风险分析")
+    parser.add_argument(
+        "inputs", nargs="*",
+        default=["./contract_advisor/examples/exa2.pdf"],
+        help="PDF文件、目录或通配符",
+    )
+    parser.add_argument(
+        "--max-concurrency", type=int, default=4,
+        help="同时处理的合同数量上限",
+    )
+    parser.add_argument(
+        "--output", default=None,
+        help="逐行写入每份合同结果的JSONL文件",
+    )
+    parser.add_argument(
+        "--no-report", action="store_true",
+        help="跳过风险知识报告生成",
+    )
+    parser.add_argument(
+        "--no-debate", action="store_true",
+        help="跳过多角色风险评估",
+    )
+    parser.add_argument(
+        "--speech-dir", default=None,
+        help="为每份合同的评估结果生成语音并保存到该目录",
+    )
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="复用上次运行保存的阶段结果，只计算未完成或配置已变化的阶段",
+    )
+    parser.add_argument(
+        "--artifacts", default=None,
+        help="阶段结果存储文件路径（默认 local_data/artifacts/artifacts.sqlite）",
+    )
+    parser.add_argument(
+        "--interactive", action="store_true",
+        help="在控制台以动画方式打印风险报告会话（建议配合 --max-concurrency 1）",
+    )
+    parser.add_argument(
+        "--events", default=None,
+        help="风险报告会话事件的JSONL文件（默认 local_data/events/risk_report.jsonl）",
+    )
+    parser.add_argument(
+        "--dedup-templates", action="store_true",
+        help="按模板分组，每个模板只完整分析一份，其余合同只重新分析不同的条款",
+    )
+    parser.add_argument(
+        "--no-warm-up", action="store_true",
+        help="启动时不预热模型客户端和代理",
+    )
+    return parser.parse_args()
 
 
 # 使用示例
 if __name__ == "__main__":
-    # 初始化分析器（使用必要的API密钥）    
-    chunkr_api_key = getpass('Enter your Chunkr API key: ')
-    openai_api_key = getpass('Enter your OpenAI API key: ')
-    firecrawl_api_key = getpass('Enter your Firecrawl API key: ')
-    mistral_api_key = getpass('Enter your Mistral API key: ')
-    google_api_key = getpass('Enter your Google API key: ')
-    search_engine_id = getpass('Enter your Search Engine ID: ')
+    args = parse_args()
 
+    # 初始化分析器（使用必要的API密钥）
+    for env_name, prompt in API_KEY_PROMPTS:
+        if not os.environ.get(env_name):
+            os.environ[env_name] = getpass(prompt)
+
+    event_sink = JSONLEventSink(args.events) if args.events and not args.interactive else None
     analyzer = ContractAnalyzer(
-        chunkr_api_key=chunkr_api_key,
-        openai_api_key=openai_api_key
-    )
-
-    os.environ["FIRECRAWL_API_KEY"] = firecrawl_api_key
-    os.environ["MISTRAL_API_KEY"] = mistral_api_key  
-    os.environ["GOOGLE_API_KEY"] = google_api_key
-    os.environ["SEARCH_ENGINE_ID"] = search_engine_id
-    qwen_api_key = getpass('Enter your API key: ')
-    os.environ["QWEN_API_KEY"] = qwen_api_key
-    fishaudio_api_key = getpass('Enter your API key: ')
-    os.environ["FISHAUDIO_API_KEY"] = fishaudio_api_key
-    # 分析合同
-    result = analyzer.analyze_contract("./contract_advisor/examples/exa2.pdf")
-    print("____________________________________________________________")
-    # 打印结果
-    output = create_risk_knowledge_report(result)
-    print("____________________________________________________________")
-
-    end = analyze_contract_risk(str(contract_data))
-    print(end)
-    generate_speech(end,"./greetings.mp3")
-    
\ No newline at end of file
+        chunkr_api_key=os.environ["CHUNKR_API_KEY"],
+        openai_api_key=os.environ["OPENAI_API_KEY"],
+        interactive=args.interactive,
+        event_sink=event_sink,
+    )
+
+    pdf_paths = collect_pdf_paths(args.inputs)
+    if not args.no_warm_up:
+        warm_up(agents_per_pool=min(args.max_concurrency, len(pdf_paths)) or 1)
+    output_file = open(args.output, "a", encoding="utf-8") if args.output else None
+    if args.speech_dir:
+        os.makedirs(args.speech_dir, exist_ok=True)
+
+    try:
+        # 并发分析合同，结果按完成顺序输出
+        if args.dedup_templates:
+            batch = analyzer.analyze_contracts_by_template
+        else:
+            batch = analyzer.analyze_contracts
+        results = batch(
+            pdf_paths,
+            max_concurrency=args.max_concurrency,
+            with_risk_report=not args.no_report,
+            with_debate=not args.no_debate,
+            speech_dir=args.speech_dir,
+            resume=args.resume,
+            artifact_path=args.artifacts,
+        )
+        for result in results:
+            print("____________________________________________________________")
+            print(f"{result['path']} ({result.get('elapsed', 0)} 秒)")
+            if "error" in result:
+                print(result["error"])
+            if result.get("debate"):
+                print(result["debate"])
+            elif result.get("template_debate"):
+                print(f"（以下为模板代表合同 {result['template']} 的多角色评估）")
+                print(result["template_debate"])
+
+            if output_file:
+                output_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+                output_file.flush()
+
+            if result.get("stages"):
+                print("阶段状态: " + ", ".join(f"{name}={status}" for name, status in result["stages"].items()))
+    finally:
+        if output_file:
+            output_file.close()
+        if event_sink:
+            event_sink.close()
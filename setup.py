@@ -9,4 +9,12 @@ setup(
         'camel',
         # 其他依赖包
     ],
+    extras_require={
+        # 按目标模型真实分词计算上下文预算；未安装时按字符数保守估算
+        'tokenizers': [
+            'transformers',
+            'tiktoken',
+            'mistral-common',
+        ],
+    },
 )
\ No newline at end of file
@@ -0,0 +1,131 @@
+import asyncio
+import io
+import urllib.error
+
+import pytest
+
+from contract_advisor.document_processor.chunkr_tracker import (
+    ChunkrTaskTracker,
+    is_transient_error,
+    track_files,
+)
+from contract_advisor.document_processor.fake_chunkr_server import start_fake_chunkr_server
+
+
+@pytest.fixture
+def server():
+    server = start_fake_chunkr_server(latency=(0.05, 0.2), seed=0)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def files(tmp_path):
+    paths = []
+    for i in range(6):
+        path = tmp_path / f"doc_{i}.pdf"
+        path.write_bytes(b"x" * (100 + i))
+        paths.append(str(path))
+    return paths
+
+
+def fast_tracker_kwargs(server, **kwargs):
+    return dict(url=server.url, max_requests_per_second=100, initial_delay=0.05, max_delay=0.2, **kwargs)
+
+
+def http_error(code):
+    return urllib.error.HTTPError("http://fake", code, "error", {}, io.BytesIO(b""))
+
+
+def test_is_transient_error():
+    assert is_transient_error(http_error(503))
+    assert is_transient_error(http_error(408))
+    assert not is_transient_error(http_error(404))
+    assert is_transient_error(urllib.error.URLError("reset"))
+    assert is_transient_error(TimeoutError())
+    assert not is_transient_error(ValueError())
+
+
+def test_track_files_returns_every_output(server, files):
+    seen = []
+    outputs = track_files(files, api_key="fake", on_result=lambda path, output, error: seen.append(path),
+                          **fast_tracker_kwargs(server))
+
+    assert set(outputs) == set(files)
+    assert all(output and "Succeeded" in output for output in outputs.values())
+    assert sorted(seen) == sorted(files)
+
+
+def test_transient_poll_errors_are_retried(server, files):
+    tracker = ChunkrTaskTracker(api_key="fake", **fast_tracker_kwargs(server))
+    status = tracker._status_sync
+    failures = {"left": 3}
+
+    def flaky_status(task_id):
+        if failures["left"] > 0:
+            failures["left"] -= 1
+            raise http_error(503)
+        return status(task_id)
+
+    tracker._status_sync = flaky_status
+
+    async def run():
+        return [item async for item in tracker.process_files(files[:2])]
+
+    results = asyncio.run(run())
+    assert all(output and error is None for _, output, error in results)
+    assert tracker.poll_error_count == 3
+
+
+def test_persistent_poll_errors_fail_the_task(server, files):
+    tracker = ChunkrTaskTracker(api_key="fake", max_poll_errors=2, **fast_tracker_kwargs(server))
+
+    def broken_status(task_id):
+        raise http_error(503)
+
+    tracker._status_sync = broken_status
+
+    async def run():
+        return [item async for item in tracker.process_files(files[:1])]
+
+    [(path, output, error)] = asyncio.run(run())
+    assert output is None and "Failed to retrieve task status" in error
+    assert tracker.poll_error_count == 3
+
+
+def test_unknown_task_fails_without_retry(server):
+    tracker = ChunkrTaskTracker(api_key="fake", **fast_tracker_kwargs(server))
+
+    async def run():
+        return [item async for item in tracker.iter_results(["missing"])]
+
+    [(task_id, output, error)] = asyncio.run(run())
+    assert task_id == "missing" and output is None and "404" in error
+    assert tracker.poll_error_count == 1
+
+
+def test_throttled_requests_are_retried(files):
+    server = start_fake_chunkr_server(latency=(0.05, 0.1), max_rps=4, seed=0)
+    try:
+        tracker = ChunkrTaskTracker(api_key="fake", url=server.url, max_requests_per_second=8,
+                                    initial_delay=0.05, max_delay=0.2)
+
+        async def run():
+            return [item async for item in tracker.process_files(files[:3])]
+
+        results = asyncio.run(run())
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert len(results) == 3
+    assert all(error is None for _, _, error in results)
+    assert tracker.throttled_count > 0
+
+
+def test_track_files_refuses_running_event_loop(files):
+    async def run():
+        track_files(files, api_key="fake")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(run())
@@ -0,0 +1,156 @@
+import pytest
+
+pytest.importorskip("camel")
+
+from contract_advisor.knowledge_base.clause_store import ClauseStore  # noqa: E402
+from contract_advisor.llm_agents.contract_analyzer import clause_extraction  # noqa: E402
+from contract_advisor.llm_agents.contract_analyzer.clause_extraction import (  # noqa: E402
+    merge_partials,
+    near_duplicate_reusable,
+    realign_excerpts,
+    split_clauses,
+)
+
+CLAUSES = [f"第{i}条 甲方应当按照约定履行第{i}项义务，相关费用由甲方承担。" for i in range(1, 121)]
+
+
+def clause_result(clause):
+    """模拟模型对单个条款的抽取结果；含违约金的条款带有只适用于原文的义务约定"""
+    result = {
+        "合同类型": "服务合同",
+        "当事方": [{"名称": "", "角色": "", "注册地": ""}],
+        "合同条款": {"竞业禁止条款": {"存在": "是", "摘录": [clause.split(" ", 1)[1]]}},
+        "风险提示": {"其他事项": ["费用承担约定不明确"]},
+    }
+    if "违约金" in clause:
+        result["义务约定"] = {"违约责任": [clause]}
+    return result
+
+
+@pytest.fixture
+def extracted(monkeypatch):
+    """替换按批条款抽取，记录交给大模型的条款文本和调用次数"""
+    calls = []
+
+    def fake_extract_clause_batches(batches, max_workers=None):
+        calls.extend(clause for batch in batches for clause in batch)
+        return [[clause_result(clause) for clause in batch] for batch in batches]
+
+    monkeypatch.setattr(clause_extraction, "extract_clause_batches", fake_extract_clause_batches)
+    return calls
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ClauseStore(str(tmp_path / "clauses.sqlite"), namespace="test")
+    yield store
+    store.close()
+
+
+def test_split_clauses_at_headings():
+    markdown = "# 劳动合同\n第一条 工作内容\n乙方担任工程师。\n第二条 工资\n1. 基本工资\n2、绩效工资"
+    assert split_clauses(markdown) == [
+        "# 劳动合同", "第一条 工作内容\n乙方担任工程师。", "第二条 工资", "1. 基本工资", "2、绩效工资",
+    ]
+
+
+def test_store_reuses_identical_clauses_and_extracts_only_unseen(store, extracted):
+    edited = list(CLAUSES)
+    edited[40] = "第41条 乙方张某应于2024年1月1日前支付违约金5000元。"
+
+    first = clause_extraction.extract_clauses_with_store("\n".join(CLAUSES), store)
+    assert first["reused"] == first["near_reused"] == 0
+    assert first["extracted"] == len(extracted) == 120
+    # 未见过的条款打包成批次抽取，调用次数远少于条款数
+    assert 1 <= first["sections"] < 120
+
+    extracted.clear()
+    second = clause_extraction.extract_clauses_with_store("\n".join(edited), store)
+    assert extracted == [edited[40]]
+    assert second["reused"] == 119 and second["extracted"] == 1 and second["failed"] == []
+    assert second["result"]["合同类型"] == "服务合同"
+
+    # 含有只适用于原文内容（违约责任）的结果不做近似复用，金额变化后重新抽取
+    extracted.clear()
+    edited[40] = edited[40].replace("5000元", "8000元")
+    third = clause_extraction.extract_clauses_with_store("\n".join(edited), store)
+    assert extracted == [edited[40]] and third["near_reused"] == 0
+
+
+def test_near_duplicates_reuse_flags_and_risks_with_excerpts_from_current_text(store, extracted):
+    clause_extraction.extract_clauses_with_store("\n".join(CLAUSES), store)
+    renumbered = [clause.replace("项义务", "0项义务") for clause in CLAUSES]
+
+    extracted.clear()
+    result = clause_extraction.extract_clauses_with_store("\n".join(renumbered), store)
+    assert extracted == []
+    assert result["near_reused"] == 120 and result["extracted"] == 0
+
+    merged = result["result"]
+    assert merged["合同条款"]["竞业禁止条款"]["存在"] == "是"
+    assert merged["风险提示"]["其他事项"] == ["费用承担约定不明确"]
+    excerpts = merged["合同条款"]["竞业禁止条款"]["摘录"]
+    assert len(excerpts) == 120 and all(excerpt in "\n".join(renumbered) for excerpt in excerpts)
+    assert "第1条 甲方应当按照约定履行第10项义务，相关费用由甲方承担。" in excerpts
+
+
+def test_failed_clauses_are_reported_and_not_stored(store, monkeypatch):
+    def fake_extract_clause_batches(batches, max_workers=None):
+        return [[None if "第2条" in clause else clause_result(clause) for clause in batch] for batch in batches]
+
+    monkeypatch.setattr(clause_extraction, "extract_clause_batches", fake_extract_clause_batches)
+    result = clause_extraction.extract_clauses_with_store("\n".join(CLAUSES[:3]), store)
+    assert result["failed"] == [1]
+    assert store.stats()["clauses"] == 2
+    assert store.lookup(CLAUSES[1])["match"] == "near"
+
+
+def test_batch_results_are_assigned_by_clause_number(monkeypatch):
+    from contextlib import contextmanager
+    from types import SimpleNamespace
+
+    reply = '```json\n{"条款": [{"编号": 2, "合同类型": "劳动合同"}, {"编号": "1", "合同类型": "服务合同"}]}\n```'
+    agent = SimpleNamespace(step=lambda message: SimpleNamespace(msgs=[SimpleNamespace(content=reply)]))
+
+    @contextmanager
+    def lease():
+        yield agent
+
+    monkeypatch.setattr(clause_extraction, "get_agent_pool", lambda name, factory: SimpleNamespace(lease=lease))
+    # 模型遗漏的条款（编号3）视为抽取失败
+    assert clause_extraction._extract_clause_batch(CLAUSES[:3]) == [
+        {"合同类型": "服务合同"}, {"合同类型": "劳动合同"}, None,
+    ]
+
+
+def test_near_duplicate_reuse_is_limited_to_classification_and_risks():
+    assert near_duplicate_reusable(clause_result(CLAUSES[0]))
+    assert not near_duplicate_reusable(clause_result("第9条 乙方应支付违约金5000元。"))
+    assert realign_excerpts(["乙方离职后2年内不得任职"], "第三条 乙方离职后3年内不得任职。甲方支付补偿。") == [
+        "第三条 乙方离职后3年内不得任职。"
+    ]
+
+
+def test_merge_partials_fills_every_clause_type():
+    merged = merge_partials([
+        {"合同类型": "劳动合同", "合同条款": {"竞业禁止条款": {"存在": "否", "摘录": []}}},
+        {"合同类型": "服务合同", "合同条款": {"竞业禁止条款": {"存在": "是", "摘录": ["两年内不得任职"]}}},
+    ])
+    assert merged["合同类型"] == "劳动合同"
+    assert merged["合同条款"]["竞业禁止条款"] == {"存在": "是", "摘录": ["两年内不得任职"]}
+    assert merged["合同条款"]["责任上限条款"] == {"存在": "否", "摘录": []}
+
+
+def test_analyze_content_fails_when_any_section_fails(monkeypatch):
+    from contract_advisor.llm_agents.contract_analyzer import contract_analyzer
+
+    extraction = {"result": merge_partials([]), "sections": 3, "failed": [0, 1, 2], "elapsed": 0.0}
+    monkeypatch.setattr(contract_analyzer, "chunkr_to_markdown", lambda content: content)
+    monkeypatch.setattr(contract_analyzer, "extract_clauses_sectioned", lambda markdown: extraction)
+    analyzer = contract_analyzer.ContractAnalyzer.__new__(contract_analyzer.ContractAnalyzer)
+    analyzer.openai_api_key = "test"
+
+    # 全部分段失败时合并结果中所有条款都是“否”，不能当作成功的分析结果保存
+    result = analyzer.analyze_content("第1条 ...", mode="sectioned")
+    assert "analysis" not in result
+    assert "3/3" in result["error"]
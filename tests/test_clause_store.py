@@ -0,0 +1,49 @@
+import pytest
+
+from contract_advisor.knowledge_base.clause_store import ClauseStore
+
+CLAUSE = "第三条 乙方离职后2年内不得在与甲方有竞争关系的单位任职，甲方按月支付竞业限制补偿金。"
+RESULT = {"合同条款": {"竞业禁止条款": {"存在": "是", "摘录": ["乙方离职后2年内不得……"]}}}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ClauseStore(str(tmp_path / "clauses.sqlite"), namespace="test")
+    yield store
+    store.close()
+
+
+def test_exact_lookup_ignores_whitespace_and_width(store):
+    assert store.lookup(CLAUSE) is None
+    store.add(CLAUSE, RESULT)
+    assert store.lookup(CLAUSE) == {"match": "exact", "similarity": 1.0, "result": RESULT}
+    assert store.lookup(CLAUSE.replace("，", "， ").replace("2", "２"))["match"] == "exact"
+    assert store.stats() == {"hits": 2, "near_hits": 0, "misses": 1, "clauses": 1}
+
+
+def test_near_duplicate_lookup_matches_clauses_differing_only_in_numbers(store):
+    store.add(CLAUSE, RESULT)
+    match = store.lookup(CLAUSE.replace("2年", "3年"))
+    assert match["match"] == "near" and match["result"] == RESULT
+    assert store.lookup("第九条 甲方应当为乙方缴纳社会保险和住房公积金。") is None
+    assert store.stats()["near_hits"] == 1
+
+
+def test_results_outside_the_near_index_only_match_exactly(store):
+    store.add(CLAUSE, RESULT, near_duplicate=False)
+    assert store.lookup(CLAUSE.replace("2年", "3年")) is None
+    assert store.lookup(CLAUSE)["match"] == "exact"
+    # 重新写入时按新的设置更新近似索引
+    store.add(CLAUSE, RESULT)
+    assert store.lookup(CLAUSE.replace("2年", "3年"))["match"] == "near"
+
+
+def test_namespaces_are_isolated(store):
+    store.add(CLAUSE, RESULT)
+    other = ClauseStore(store.path, namespace="other-prompt")
+    try:
+        assert other.lookup(CLAUSE) is None
+        assert other.lookup(CLAUSE.replace("2年", "3年")) is None
+        assert other.stats()["clauses"] == 0
+    finally:
+        other.close()
@@ -0,0 +1,90 @@
+import pytest
+
+from contract_advisor.utils import disk_cache
+from contract_advisor.utils.disk_cache import DiskCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """可控时钟：每次写入/读取前手动推进，避免依赖真实时间"""
+    now = [1000.0]
+    monkeypatch.setattr(disk_cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_make_key_is_stable_and_order_sensitive():
+    assert DiskCache.make_key("a", {"x": 1, "y": 2}) == DiskCache.make_key("a", {"y": 2, "x": 1})
+    assert DiskCache.make_key("a", "b") != DiskCache.make_key("b", "a")
+
+
+def test_get_counts_hits_and_misses(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.sqlite"))
+    cache.set("k", "value")
+    assert cache.get("k") == "value"
+    assert cache.get("missing", "default") == "default"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+
+def test_evicts_least_recently_accessed_over_max_bytes(tmp_path, clock):
+    cache = DiskCache(str(tmp_path / "cache.sqlite"), max_bytes=30)
+    for key in ("a", "b", "c"):
+        clock[0] += 1
+        cache.set(key, "x" * 10)
+    # 访问 a 之后，最久未访问的是 b
+    clock[0] += 1
+    assert cache.get("a") is not None
+    clock[0] += 1
+    cache.set("d", "x" * 10)
+
+    assert cache.get("b") is None
+    assert all(cache.get(key) is not None for key in ("a", "c", "d"))
+    assert cache.stats()["bytes"] <= 30
+
+
+def test_expired_entries_miss_but_stay_for_revalidation(tmp_path, clock):
+    cache = DiskCache(str(tmp_path / "cache.sqlite"), max_age=60)
+    cache.set("k", "value", meta={"etag": "v1"})
+    clock[0] += 61
+
+    assert cache.get("k") is None
+    entry = cache.get_entry("k")
+    assert entry["expired"] and entry["meta"] == {"etag": "v1"}
+
+    cache.touch("k")
+    assert cache.get("k") == "value"
+
+
+def test_evict_purges_expired_entries(tmp_path, clock):
+    cache = DiskCache(str(tmp_path / "cache.sqlite"), max_age=60)
+    cache.set("old", "value")
+    clock[0] += 30
+    cache.set("new", "value")
+    clock[0] += 40
+
+    assert cache.evict() == 1
+    assert cache.get_entry("old") is None
+    assert cache.get("new") == "value"
+
+
+def test_running_total_tracks_replacements_and_deletes(tmp_path, monkeypatch):
+    cache = DiskCache(str(tmp_path / "cache.sqlite"), max_bytes=100)
+    evictions = []
+    monkeypatch.setattr(cache, "evict", lambda purge_expired=True: evictions.append(purge_expired) or 0)
+
+    cache.set("a", "x" * 40)
+    cache.set("a", "x" * 60)
+    cache.set("b", "x" * 30)
+    cache.delete("b")
+    # 总大小从未超过上限，写入时不触发淘汰
+    assert evictions == []
+    assert cache._total_bytes == cache.stats()["bytes"] == 60
+
+    cache.set("c", "x" * 50)
+    assert evictions == [False]
+
+
+def test_running_total_survives_reopen(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    DiskCache(path).set("a", "x" * 25)
+    assert DiskCache(path, max_bytes=30)._total_bytes == 25
@@ -0,0 +1,64 @@
+import io
+import json
+import threading
+
+import pytest
+
+from contract_advisor.output_handlers.event_sink import (
+    CallbackEventSink,
+    ConsoleEventSink,
+    JSONLEventSink,
+)
+
+
+def test_emit_adds_type_and_time():
+    events = []
+    CallbackEventSink(events.append).emit("user_message", content="你好")
+    assert events[0]["type"] == "user_message"
+    assert events[0]["content"] == "你好"
+    assert isinstance(events[0]["time"], float)
+
+
+def test_jsonl_sink_appends_to_file(tmp_path):
+    path = tmp_path / "events" / "report.jsonl"
+    for turn in range(2):
+        sink = JSONLEventSink(str(path))
+        sink.emit("session_end", turns=turn, reason="done")
+        sink.close()
+    lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [line["turns"] for line in lines] == [0, 1]
+
+
+def test_jsonl_sink_writes_whole_lines_from_many_threads():
+    stream = io.StringIO()
+    sink = JSONLEventSink(stream)
+
+    def emit_many(worker):
+        for index in range(50):
+            sink.emit("assistant_message", worker=worker, index=index, content="条款" * 20)
+
+    threads = [threading.Thread(target=emit_many, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    sink.close()
+
+    events = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert len(events) == 200
+    assert not stream.closed
+
+
+def test_console_sink_prints_messages_and_tool_calls():
+    pytest.importorskip("colorama")
+    stream = io.StringIO()
+    sink = ConsoleEventSink(delay=0, stream=stream)
+    sink.emit("session_start", task_prompt="分析风险")
+    sink.emit("assistant_message", content="结论",
+              tool_calls=[{"func_name": "search", "args": {"q": "x"}, "result": "y"}])
+    sink.emit("terminated", role="user", reasons=["TASK_DONE"])
+
+    output = stream.getvalue()
+    assert "分析风险" in output
+    assert "Function Execution: search" in output and "结论" in output
+    assert "AI user terminated" in output
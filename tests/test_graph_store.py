@@ -0,0 +1,103 @@
+from types import SimpleNamespace
+
+import pytest
+
+from contract_advisor.knowledge_base.graph_store import SQLiteGraphStore, normalize_entity
+
+
+def node(node_id, node_type):
+    return SimpleNamespace(id=node_id, type=node_type, properties={})
+
+
+def rel(subj, rel_type, obj):
+    return SimpleNamespace(subj=subj, obj=obj, type=rel_type, properties={})
+
+
+@pytest.fixture
+def store(tmp_path):
+    clause = node("竞业限制 条款", "风险因素")
+    unpaid = node("未支付补偿", "风险因素")
+    void = node("约定失效", "后果")
+    claim = node("劳动者索赔", "后果")
+    penalty = node("违约金", "后果")
+    element = SimpleNamespace(
+        nodes=[clause, unpaid, void, claim, penalty],
+        relationships=[
+            rel(clause, "leads to", unpaid),
+            rel(unpaid, "LEADS_TO", void),
+            rel(void, "leads to", claim),
+            rel(clause, "causes", penalty),
+            # 环路不应导致重复访问
+            rel(claim, "leads to", clause),
+        ],
+    )
+    store = SQLiteGraphStore(str(tmp_path / "graph.sqlite"))
+    assert store.add_graph_elements([element]) == {"nodes": 5, "relationships": 5}
+    yield store
+    store.close()
+
+
+def test_normalize_entity():
+    assert normalize_entity("《竞业限制 条款》") == normalize_entity("竞业限制条款")
+    assert normalize_entity("ＡＢＣ Co") == "abcco"
+
+
+def test_add_is_idempotent(store):
+    element = SimpleNamespace(nodes=[node("竞业限制条款", "风险因素")], relationships=[])
+    store.add_graph_elements([element])
+    assert store._conn.execute("SELECT COUNT(*) FROM nodes").fetchone()[0] == 5
+
+
+def test_neighbors_accept_raw_names_and_relationship_filter(store):
+    found = {item["id"]: item for item in store.neighbors("竞业限制 条款")}
+    assert set(found) == {normalize_entity("未支付补偿"), normalize_entity("违约金")}
+    assert found[normalize_entity("违约金")]["relationship"] == "CAUSES"
+
+    assert [item["id"] for item in store.neighbors("竞业限制条款", rel_type="causes")] == ["违约金"]
+
+
+def test_query_consequences_follows_paths_by_depth(store):
+    paths = store.query_consequences("竞业限制 条款")
+    assert [path["depth"] for path in paths] == sorted(path["depth"] for path in paths)
+    by_target = {path["target"]: path for path in paths}
+    assert by_target["约定失效"]["path"] == ["竞业限制条款", "未支付补偿", "约定失效"]
+    assert by_target["约定失效"]["relationships"] == ["LEADS_TO", "LEADS_TO"]
+    # 路径中不会再次回到起点
+    assert "竞业限制条款" not in by_target
+
+
+def test_query_consequences_filters(store):
+    assert store.query_consequences("竞业限制条款", max_depth=1, target_type="后果")[0]["target"] == "违约金"
+    targets = {path["target"] for path in store.query_consequences("竞业限制条款", relationship_types=["leads to"])}
+    assert targets == {"未支付补偿", "约定失效", "劳动者索赔"}
+    assert len(store.query_consequences("竞业限制条款", limit=2)) == 2
+    assert store.query_consequences("不存在的因素") == []
+
+
+class RecordingClient:
+    """记录 write_batches 调用的Neo4j客户端替身"""
+
+    def __init__(self):
+        self.queries = 0
+        self.writes = []
+
+    def write_batches(self, cypher, rows, batch_size):
+        self.queries += 1
+        self.writes.append((cypher, rows))
+
+
+def test_neo4j_writes_use_the_same_ids_and_relationship_types_as_queries():
+    pytest.importorskip("camel")
+    from contract_advisor.knowledge_base.nebula_graph.neo import write_graph_elements
+
+    clause = node("《竞业限制 条款》", "风险因素")
+    penalty = node("违约金", "后果")
+    element = SimpleNamespace(nodes=[clause, penalty], relationships=[rel(clause, "leads-to `x`", penalty)])
+    client = RecordingClient()
+    assert write_graph_elements([element], client)["relationships"] == 1
+
+    node_ids = {row["id"] for cypher, rows in client.writes if "MERGE (n:" in cypher for row in rows}
+    assert node_ids == {normalize_entity("竞业限制条款"), "违约金"}
+    (cypher, rows), = [write for write in client.writes if "MERGE (s)" in write[0]]
+    assert rows[0]["subj"] == normalize_entity("竞业限制 条款")
+    assert "[r:`LEADS-TO_``X```]" in cypher
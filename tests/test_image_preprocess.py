@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from contract_advisor.document_processor.image_preprocess import (
+    adaptive_binarize,
+    estimate_skew,
+    margin_bbox,
+    preprocess_page,
+    to_grayscale,
+)
+
+NO_RESIZE = {"target_dpi": None}
+
+
+def text_page(width=800, height=600, margin=100):
+    """白底页面，文字行用断续的黑色短横模拟"""
+    image = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(image)
+    for top in range(margin, height - margin, 24):
+        for left in range(margin, width - margin, 30):
+            draw.rectangle((left, top, left + 20, top + 8), fill=0)
+    return image
+
+
+def foreground_of(image):
+    return adaptive_binarize(to_grayscale(np.asarray(image.convert("RGB"))))
+
+
+def test_binarize_handles_uneven_lighting():
+    page = np.asarray(text_page(), dtype=np.float32)
+    # 从左到右由暗到亮的光照，全局阈值无法同时处理两侧
+    lighting = np.linspace(0.45, 1.0, page.shape[1], dtype=np.float32)[None, :]
+    lit = page * lighting + (1 - lighting) * 60
+
+    binary = adaptive_binarize(lit)
+    ink = page < 128
+    assert (binary == ink).mean() > 0.97
+    # 暗侧的空白不能被判为前景
+    assert binary[:, :100].mean() < 0.02
+
+
+def test_margin_bbox_pads_foreground():
+    foreground = np.zeros((100, 200), dtype=bool)
+    foreground[20:30, 50:60] = True
+    assert margin_bbox(foreground, padding=5) == (45, 15, 65, 35)
+    assert margin_bbox(np.zeros((10, 10), dtype=bool)) is None
+
+
+@pytest.mark.parametrize("angle", [-3.0, 2.0])
+def test_estimate_skew_finds_rotation(angle):
+    rotated = text_page().rotate(angle, resample=Image.BILINEAR, expand=True, fillcolor=255)
+    # 估计角度与 PIL 的旋转角度同号，preprocess_page 按 -angle 旋转纠偏
+    assert abs(estimate_skew(foreground_of(rotated)) - angle) <= 0.5
+
+
+def test_preprocess_page_deskews_crops_and_binarizes():
+    rotated = text_page().rotate(3.0, resample=Image.BILINEAR, expand=True, fillcolor=255)
+    result = preprocess_page(rotated.convert("RGB"), NO_RESIZE)
+
+    assert result.mode == "1"
+    assert result.size[0] < rotated.size[0] and result.size[1] < rotated.size[1]
+    assert abs(estimate_skew(foreground_of(result))) <= 0.5
+
+
+def test_preprocess_page_only_downscales():
+    page = text_page().convert("RGB")
+    page.info["dpi"] = (400, 400)
+    options = {"target_dpi": 200, "deskew": False, "crop_margins": False, "binarize": False}
+    assert preprocess_page(page, options).size == (400, 300)
+
+    page.info["dpi"] = (100, 100)
+    assert preprocess_page(page, options).size == (800, 600)
+
+
+def test_benchmark_measures_round_trip_against_fake_server(tmp_path):
+    from contract_advisor.document_processor.fake_chunkr_server import start_fake_chunkr_server
+    from contract_advisor.document_processor.image_preprocess import benchmark_preprocessing
+
+    path = tmp_path / "page.png"
+    text_page().rotate(2.0, expand=True, fillcolor=255).convert("RGB").save(path)
+    server = start_fake_chunkr_server(latency=(0.05, 0.1), seed=0)
+    try:
+        report = benchmark_preprocessing([str(path)], NO_RESIZE, chunkr_url=server.url, api_key="fake")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    for name in ("original", "preprocessed"):
+        assert report[name]["failed_pages"] == 0
+        assert report[name]["measured_end_to_end_ms_per_page"] > report[name]["local_ms_per_page"]
+    assert report["bytes_ratio"] < 1
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from contract_advisor.document_processor.image_processor import merge_images_streaming
+
+
+@pytest.fixture
+def pages(tmp_path):
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"page_{i}.jpg"
+        Image.new("RGB", (200, 300), "black").save(path)
+        paths.append(str(path))
+    return paths
+
+
+def widen(page):
+    """模拟纠偏旋转（expand=True）后页面变宽"""
+    canvas = Image.new(page.mode, (page.size[0] + 40, page.size[1]), "black")
+    canvas.paste(page, (20, 0))
+    return canvas
+
+
+def test_tiles_concatenate_pages(pages, tmp_path):
+    result = merge_images_streaming(pages, str(tmp_path), container="tiles", tile_height=500)
+    tiles = [Image.open(path) for path in result["output_paths"]]
+    assert [tile.size for tile in tiles] == [(200, 500), (200, 400)]
+
+
+def test_tiles_fit_pages_widened_by_transform(pages, tmp_path):
+    result = merge_images_streaming(pages, str(tmp_path), container="tiles", tile_height=10000,
+                                    transform=widen)
+    [tile] = [np.asarray(Image.open(path).convert("L")) for path in result["output_paths"]]
+    assert tile.shape[1] == 200
+    # 变宽的页面整体缩小到分块宽度，右边缘没有被截断成空白
+    assert (tile[:, -1] == 0).all()
+    assert tile.shape[0] == 3 * round(300 * 200 / 240)
+
+
+def test_pdf_container_writes_every_page(pages, tmp_path):
+    result = merge_images_streaming(pages, str(tmp_path), container="pdf")
+    assert result["pages"] == 3
+    assert result["output_paths"][0].endswith(".pdf")
+    assert result["peak_rss_mb"] >= result["rss_growth_mb"] >= 0
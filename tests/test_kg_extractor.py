@@ -0,0 +1,53 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("camel")
+
+from contract_advisor.knowledge_base import kg_extractor  # noqa: E402
+from contract_advisor.knowledge_base.kg_extractor import KnowledgeGraphExtractor  # noqa: E402
+from contract_advisor.knowledge_base.nebula_graph import neo  # noqa: E402
+from contract_advisor.llm_agents import model_pool  # noqa: E402
+from contract_advisor.utils.disk_cache import DiskCache  # noqa: E402
+
+
+class FakeKGAgent:
+    """记录抽取次数的知识图谱代理替身"""
+
+    def __init__(self):
+        self.runs = 0
+        self.resets = 0
+
+    def reset(self):
+        self.resets += 1
+
+    def run(self, element, parse_graph_elements=True):
+        self.runs += 1
+        return SimpleNamespace(nodes=[], relationships=[])
+
+
+class FakeUnstructuredIO:
+    def create_element_from_text(self, text, element_id):
+        return SimpleNamespace(text=text, element_id=element_id)
+
+
+def test_extract_reuses_the_warmed_agent(tmp_path, monkeypatch):
+    agents = []
+
+    def create_kg_agent():
+        agents.append(FakeKGAgent())
+        return agents[-1]
+
+    monkeypatch.setattr(model_pool, "_agent_pools", {})
+    monkeypatch.setattr(neo, "create_kg_agent", create_kg_agent)
+    monkeypatch.setattr(kg_extractor, "UnstructuredIO", FakeUnstructuredIO)
+    monkeypatch.setattr(kg_extractor, "GraphElement", SimpleNamespace)
+    neo.warm_up_kg_agents(1)
+
+    extractor = KnowledgeGraphExtractor(cache=DiskCache(str(tmp_path / "kg.sqlite")), chunk_size=20, max_workers=1)
+    stats = extractor.extract("竞业限制期限不得超过二年。\n试用期工资不得低于百分之八十。\n违约金不得过高。")[1]
+
+    assert stats["llm_calls"] == 3
+    # 每次抽取都新建线程池，但代理来自代理池，预热的代理被复用而不是每个线程新建
+    assert len(agents) == 1 and agents[0].runs == 3
+    assert neo.kg_agent_pool().stats() == {"created": 1, "reused": 3, "idle": 1}
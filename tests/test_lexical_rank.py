@@ -0,0 +1,88 @@
+from collections import Counter
+
+from contract_advisor.knowledge_base.lexical_rank import (
+    BM25,
+    evaluate_recall,
+    pre_rank,
+    reciprocal_rank_fusion,
+    tokenize,
+)
+from contract_advisor.knowledge_base.recall_eval import RECALL_CORPUS, candidate_recall, compare_recall
+
+CHUNKS = [
+    "首页 | 登录 | 注册 | 关于我们",
+    "竞业限制期限不得超过二年，用人单位应当按月给予经济补偿。",
+    "试用期工资不得低于约定工资的百分之八十。",
+    "竞业限制补偿金未支付的，劳动者可以请求解除竞业限制约定。",
+    "版权所有 未经许可不得转载",
+]
+
+
+def test_tokenize_drops_stopwords_and_keeps_words():
+    tokens = tokenize("The contract 的 Section")
+    assert "the" not in tokens and "的" not in tokens
+    assert "contract" in tokens and "section" in tokens
+
+
+def test_bm25_scores_matching_chunks_only():
+    scores = BM25(CHUNKS).scores("竞业限制 补偿")
+    assert scores[1] > 0 and scores[3] > 0
+    assert scores[0] == scores[4] == 0
+
+
+def test_pre_rank_drops_zero_score_chunks():
+    kept = pre_rank("竞业限制 补偿", CHUNKS, top_n=10, min_keep=2)
+    assert [index for index, _ in kept][:2] in ([1, 3], [3, 1])
+    assert all(score > 0 for _, score in kept)
+    assert len(pre_rank("竞业限制 补偿", CHUNKS, top_n=1, min_keep=2)) == 1
+
+
+def test_pre_rank_keeps_top_n_when_few_chunks_match():
+    # 只有一个文本块有词项重合时词法分数不可靠，保留前 top_n 个交给向量检索
+    kept = pre_rank("试用期", CHUNKS, top_n=4, min_keep=2)
+    assert len(kept) == 4
+    assert kept[0][0] == 2
+    assert pre_rank("试用期", [], top_n=4) == []
+
+
+def test_reciprocal_rank_fusion_prefers_items_ranked_high_in_both():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "c", "a"]])
+    assert [item for item, _ in fused] == ["b", "a", "c"]
+    weighted = reciprocal_rank_fusion([["a", "b"], ["b", "a"]], weights=[2.0, 1.0])
+    assert weighted[0][0] == "a"
+
+
+def test_evaluate_recall_counts_relevant_snippets_in_top_k():
+    queries = [{"query": "q", "relevant": ["x", "y"]}]
+    assert evaluate_recall(lambda query: ["x1", "z", "y1"], queries, k=2)["recall"] == 0.5
+    assert evaluate_recall(lambda query: ["x1", "z", "y1"], queries, k=3)["recall"] == 1.0
+
+
+def test_pre_rank_keeps_every_labelled_relevant_chunk():
+    report = candidate_recall()
+    assert report["recall"] == 1.0
+    assert report["avg_kept"] < report["chunks"]
+
+
+def bigram_embed(texts):
+    """离线代理嵌入：中文二元组词频向量"""
+    vocab = sorted({token for text in RECALL_CORPUS for token in tokenize(text)})
+    position = {token: i for i, token in enumerate(vocab)}
+    vectors = []
+    for text in texts:
+        vector = [0.0] * len(vocab)
+        for token, count in Counter(tokenize(text)).items():
+            if token in position:
+                vector[position[token]] = float(count)
+        vectors.append(vector)
+    return vectors
+
+
+def test_compare_recall_reports_each_retrieval_mode():
+    report = compare_recall(bigram_embed, k=3)
+    for name in ("dense_only", "pre_ranked", "pre_ranked_rrf"):
+        assert 0.0 <= report[name]["recall"] <= 1.0
+    # 生产路径（预排序后只按向量排序）的召回率不低于只用向量检索
+    assert report["pre_ranked"]["recall"] >= report["dense_only"]["recall"] - 1e-9
+    assert report["pre_ranked"]["embedded_chunks"] < report["dense_only"]["embedded_chunks"]
+    assert len(report["per_query"]) == 10
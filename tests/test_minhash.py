@@ -0,0 +1,60 @@
+import random
+
+import pytest
+
+from contract_advisor.utils.minhash import LSHIndex, MinHasher, jaccard, normalize_text, shingles
+
+CLAUSES = [
+    "甲方应于每月15日前向乙方支付上月工资。",
+    "乙方离职后2年内不得在与甲方有竞争关系的单位任职。",
+    "双方协商一致解除劳动合同，甲方向乙方支付经济补偿金。",
+    "乙方应对在职期间知悉的商业秘密承担保密义务。",
+    "因本协议发生的争议，双方应协商解决，协商不成的提交劳动争议仲裁委员会仲裁。",
+    "本协议一式两份，双方各执一份，自双方签字之日起生效。",
+]
+
+
+def agreement(name, amount, date, extra=""):
+    return "\n".join([f"协商解除劳动合同协议 员工：{name}", *CLAUSES, f"补偿金额：{amount}元，支付日期：{date}。", extra])
+
+
+def test_normalize_text_masks_numbers_and_whitespace():
+    assert normalize_text("支付 １２,000 元\n于2024年") == "支付0元于0年"
+    assert normalize_text("支付 12 元", mask_numbers=False) == "支付12元"
+
+
+def test_shingles():
+    assert shingles("abcdef", 5) == {"abcde", "bcdef"}
+    assert shingles("abc", 5) == {"abc"}
+    assert shingles("", 5) == set()
+
+
+def test_signature_estimates_jaccard():
+    rng = random.Random(0)
+    universe = [f"s{i}" for i in range(400)]
+    a = set(rng.sample(universe, 200))
+    b = set(list(a)[:150]) | set(rng.sample(universe, 50))
+    exact = len(a & b) / len(a | b)
+
+    hasher = MinHasher(num_perm=256)
+    assert jaccard(hasher.signature(a), hasher.signature(b)) == pytest.approx(exact, abs=0.1)
+    assert jaccard(hasher.signature(a), hasher.signature(set(a))) == 1.0
+
+
+def test_lsh_finds_same_template_and_ignores_numbers():
+    hasher = MinHasher()
+    index = LSHIndex(threshold=0.8)
+    index.add("template", hasher.text_signature(agreement("张三", 50000, "2024年3月1日")))
+    index.add("other", hasher.text_signature("房屋租赁合同\n出租人应当履行房屋维修义务。\n承租人擅自转租的，出租人可以解除合同。"))
+
+    # 只有金额和日期不同，屏蔽数字后签名完全相同
+    matches = index.query(hasher.text_signature(agreement("张三", 80000, "2024年5月20日")))
+    assert [key for key, _ in matches] == ["template"]
+    assert matches[0][1] == 1.0
+    assert index.query(hasher.text_signature("完全无关的采购合同，约定货物交付与验收标准。")) == []
+    assert len(index) == 2
+
+
+def test_lsh_requires_bands_to_divide_signature():
+    with pytest.raises(ValueError):
+        LSHIndex(threshold=0.8, num_perm=128, bands=12)
@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+fitz = pytest.importorskip("fitz")
+
+from contract_advisor.document_processor import pdf_processor  # noqa: E402
+from contract_advisor.utils.disk_cache import DiskCache  # noqa: E402
+
+OCR_OUTPUT = json.dumps({"output": [{"segments": [{"content": "扫描页文字", "markdown": "扫描页文字"}]}]})
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    """第1页有文本层，第2页为空白（按扫描页处理）"""
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 72), "Employment agreement. " * 20)
+    doc.new_page()
+    path = tmp_path / "contract.pdf"
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = DiskCache(str(tmp_path / "ocr.sqlite"))
+    monkeypatch.setattr(pdf_processor, "get_ocr_cache", lambda: cache)
+    return cache
+
+
+def test_failed_ocr_page_is_not_cached(pdf_path, cache, monkeypatch):
+    monkeypatch.setattr(pdf_processor, "ocr_pdf_pages",
+                        lambda page_files, settings, api_key=None: {number: None for number in page_files})
+    assert pdf_processor.process_pdf_document(pdf_path, "fake") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_successful_ocr_is_cached(pdf_path, cache, monkeypatch):
+    monkeypatch.setattr(pdf_processor, "ocr_pdf_pages",
+                        lambda page_files, settings, api_key=None: {number: OCR_OUTPUT for number in page_files})
+    output = json.loads(pdf_processor.process_pdf_document(pdf_path, "fake"))
+    assert output["extraction"] == {"local_pages": [1], "ocr_pages": [2], "failed_pages": []}
+    assert cache.stats()["entries"] == 1
+    assert pdf_processor.failed_ocr_pages(json.dumps(output)) == []
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("camel")
+
+from contract_advisor.knowledge_base.precedent_index import (  # noqa: E402
+    PrecedentIndex,
+    build_precedent_index,
+    normalize_rows,
+    quantize_int8,
+    train_kmeans,
+)
+
+TOPICS = ["竞业限制", "试用期", "经济补偿", "加班费", "社会保险", "保密义务"]
+
+
+class KeywordEmbedding:
+    """离线嵌入：按主题关键词出现次数生成向量，再加上少量确定性噪声"""
+
+    def embed_list(self, texts):
+        return [self.embed(text) for text in texts]
+
+    def embed(self, text):
+        rng = np.random.default_rng(sum(text.encode("utf-8")))
+        vector = np.array([text.count(topic) for topic in TOPICS], dtype=np.float32)
+        return (vector + rng.normal(0, 0.05, len(TOPICS))).tolist()
+
+
+@pytest.fixture
+def index(tmp_path):
+    source = tmp_path / "source"
+    source.mkdir()
+    for i, topic in enumerate(TOPICS):
+        paragraphs = [f"案例{i}-{j}：关于{topic}的争议，法院认为{topic}约定有效。" for j in range(8)]
+        (source / f"{i}.txt").write_text("\n\n".join(paragraphs), encoding="utf-8")
+    manifest = build_precedent_index(str(source), str(tmp_path / "index"), KeywordEmbedding(),
+                                     n_clusters=4)
+    index = PrecedentIndex(str(tmp_path / "index"), embedding_model=KeywordEmbedding())
+    yield index, manifest
+    index.close()
+
+
+def test_quantize_int8_round_trips():
+    vectors = normalize_rows(np.random.default_rng(0).normal(size=(50, 16)).astype(np.float32))
+    quantized, scales = quantize_int8(vectors)
+    assert quantized.dtype == np.int8
+    assert np.abs(quantized * scales[:, None] - vectors).max() < 0.01
+
+
+def test_train_kmeans_separates_clusters():
+    rng = np.random.default_rng(0)
+    centers = np.eye(3, dtype=np.float32)
+    vectors = normalize_rows(np.repeat(centers, 20, axis=0) + rng.normal(0, 0.05, (60, 3)).astype(np.float32))
+    _, assignments = train_kmeans(vectors, 3)
+    for group in range(3):
+        assert len(set(assignments[group * 20:(group + 1) * 20])) == 1
+    assert len(set(assignments)) == 3
+
+
+def test_build_writes_manifest_and_clustered_offsets(index):
+    index, manifest = index
+    assert manifest["count"] == len(index) == len(TOPICS)
+    assert index.offsets[0] == 0 and index.offsets[-1] == len(index)
+    assert np.all(np.diff(index.offsets) >= 0)
+
+
+def test_query_returns_matching_source(index):
+    index, _ = index
+    results = index.query("试用期", top_k=1)
+    assert results[0]["source"] == "1.txt"
+    assert "试用期" in results[0]["text"]
+
+
+def test_full_probe_matches_brute_force(index):
+    index, _ = index
+    query = normalize_rows(np.asarray([KeywordEmbedding().embed("经济补偿 加班费")], dtype=np.float32))[0]
+    exact = (index.vectors.astype(np.float32) @ query) * index.scales
+    expected = [index._metadata(int(position))["text"] for position in np.argsort(-exact)[:3]]
+
+    results = index.search_vector(query, top_k=3, nprobe=len(index.centroids))
+    assert [result["text"] for result in results] == expected
+    assert results[0]["similarity"] == pytest.approx(float(exact.max()), abs=1e-5)
+
+
+def test_zero_query_returns_nothing(index):
+    index, _ = index
+    assert index.search_vector([0.0] * len(TOPICS)) == []
@@ -0,0 +1,82 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from contract_advisor.document_processor.scrape_cache import ScrapeCache
+
+
+class EtagHandler(BaseHTTPRequestHandler):
+    """始终返回同一个ETag，带 If-None-Match 时返回304"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.server.heads.append(self.headers.get("If-None-Match"))
+        self.send_response(304 if self.headers.get("If-None-Match") == '"v1"' else 200)
+        self.send_header("ETag", '"v1"')
+        self.end_headers()
+
+
+@pytest.fixture
+def origin():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), EtagHandler)
+    server.heads = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ScrapeCache(str(tmp_path / "scrape.sqlite"), ttl=60)
+
+
+def url_of(server, path="/page"):
+    return f"http://127.0.0.1:{server.server_address[1]}{path}"
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_normalize_url_strips_only_tracking_params():
+    normalize = ScrapeCache.normalize_url
+    assert normalize("HTTPS://Example.com:443/a/?b=2&utm_source=x&a=1&from=feed&spm=1.2#top") == \
+        "https://example.com/a?a=1&b=2"
+    assert normalize("https://example.com/list?fromDate=2020&page=2") != \
+        normalize("https://example.com/list?fromDate=2021&page=2")
+    assert "fromDate=2020" in normalize("https://example.com/list?fromDate=2020&fbclid=1")
+
+
+def test_validators_from_scrape_response_skip_head_request(cache, origin):
+    url = url_of(origin)
+    response = {"markdown": "内容", "metadata": {"ETag": '"v1"', "statusCode": 200}}
+    assert cache.get_or_scrape(url, lambda target: response) == "内容"
+    assert cache.cache.get_entry(cache.normalize_url(url))["meta"] == {"etag": '"v1"'}
+    assert origin.heads == []
+
+
+def test_missing_validators_are_fetched_in_background(cache, origin):
+    url = url_of(origin)
+    assert cache.get_or_scrape(url, lambda target: "内容") == "内容"
+    key = cache.normalize_url(url)
+    assert wait_for(lambda: cache.cache.get_entry(key)["meta"] == {"etag": '"v1"'})
+    assert origin.heads == [None]
+
+
+def test_expired_entry_is_revalidated_and_counted_as_hit(cache, origin):
+    url = url_of(origin)
+    cache.set(url, "内容", validators={"etag": '"v1"'})
+    cache.cache.max_age = -1
+
+    assert cache.get(url) == "内容"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["revalidated"]) == (1, 0, 1)
+    assert origin.heads == ['"v1"']
@@ -0,0 +1,87 @@
+import pytest
+
+from contract_advisor.utils.disk_cache import DiskCache
+from contract_advisor.utils.stage_runner import Stage, StageRunner
+
+
+class Pipeline:
+    """三阶段流水线：analysis -> report -> speech，记录每个阶段的实际执行次数"""
+
+    def __init__(self, fail=None, prompt="v1"):
+        self.calls = []
+        self.fail = fail
+        self.prompt = prompt
+
+    def stage(self, name, depends_on=(), fingerprint=None, is_valid=None):
+        def func(inputs):
+            self.calls.append(name)
+            if name == self.fail:
+                raise RuntimeError(f"{name} failed")
+            return {"stage": name, "inputs": sorted(inputs)}
+        return Stage(name, func, depends_on, fingerprint, is_valid)
+
+    def stages(self, speech_valid=None):
+        return [
+            self.stage("analysis", fingerprint={"prompt": self.prompt}),
+            self.stage("report", depends_on=("analysis",)),
+            self.stage("speech", depends_on=("report",), is_valid=speech_valid),
+        ]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = DiskCache(str(tmp_path / "artifacts.sqlite"))
+    yield store
+    store.close()
+
+
+def test_first_run_executes_every_stage(store):
+    pipeline = Pipeline()
+    result = StageRunner(pipeline.stages(), store).run("doc")
+    assert result["status"] == {"analysis": "done", "report": "done", "speech": "done"}
+    assert result["outputs"]["report"]["inputs"] == ["analysis"]
+    assert pipeline.calls == ["analysis", "report", "speech"]
+
+
+def test_resume_reuses_saved_stages(store):
+    StageRunner(Pipeline().stages(), store).run("doc")
+    pipeline = Pipeline()
+    result = StageRunner(pipeline.stages(), store).run("doc")
+    assert set(result["status"].values()) == {"cached"}
+    assert pipeline.calls == []
+
+    # 不同输入不会复用
+    assert StageRunner(pipeline.stages(), store).run("other")["status"]["analysis"] == "done"
+
+
+def test_resume_after_failure_only_reruns_remaining_stages(store):
+    result = StageRunner(Pipeline(fail="report").stages(), store).run("doc")
+    assert result["status"] == {"analysis": "done", "report": "failed", "speech": "skipped"}
+    assert result["failed"] == "report" and result["error"] == "report failed"
+
+    pipeline = Pipeline()
+    result = StageRunner(pipeline.stages(), store).run("doc")
+    assert result["status"] == {"analysis": "cached", "report": "done", "speech": "done"}
+    assert pipeline.calls == ["report", "speech"]
+
+
+def test_fingerprint_change_invalidates_stage_and_downstream(store):
+    StageRunner(Pipeline().stages(), store).run("doc")
+    pipeline = Pipeline(prompt="v2")
+    StageRunner(pipeline.stages(), store).run("doc")
+    assert pipeline.calls == ["analysis", "report", "speech"]
+
+
+def test_invalid_artifact_is_recomputed(store):
+    StageRunner(Pipeline().stages(), store).run("doc")
+    pipeline = Pipeline()
+    result = StageRunner(pipeline.stages(speech_valid=lambda output: False), store).run("doc")
+    assert result["status"]["speech"] == "done"
+    assert pipeline.calls == ["speech"]
+
+
+def test_resume_disabled_reruns_everything(store):
+    StageRunner(Pipeline().stages(), store).run("doc")
+    pipeline = Pipeline()
+    StageRunner(pipeline.stages(), store, resume=False).run("doc")
+    assert pipeline.calls == ["analysis", "report", "speech"]
@@ -0,0 +1,98 @@
+import pytest
+
+pytest.importorskip("camel")
+
+from contract_advisor.llm_agents.contract_analyzer import template_dedup  # noqa: E402
+from tests.test_minhash import agreement  # noqa: E402
+
+
+@pytest.fixture
+def extracted(monkeypatch):
+    """替换分段抽取，记录交给大模型的分段文本"""
+    calls = []
+
+    def fake_extract_sections(sections, max_workers=None):
+        calls.extend(sections)
+        return [{"风险提示": {"其他事项": [section.split("\n")[0]]}} for section in sections], []
+
+    monkeypatch.setattr(template_dedup, "extract_sections", fake_extract_sections)
+    return calls
+
+
+def test_group_by_template():
+    documents = {
+        "a.pdf": agreement("张三", 50000, "2024年3月1日"),
+        "b.pdf": "房屋租赁合同\n出租人应当履行房屋维修义务。\n承租人擅自转租的，出租人可以解除合同。",
+        "c.pdf": agreement("张三", 80000, "2024年5月20日"),
+        "d.pdf": agreement("张三", 60000, "2024年6月1日", extra="第八条 乙方放弃追索加班费。"),
+    }
+    groups = template_dedup.group_by_template(documents)
+    assert groups[0] == {"template": "a.pdf", "members": ["c.pdf", "d.pdf"]}
+    assert groups[1] == {"template": "b.pdf", "members": []}
+
+
+def test_member_only_reextracts_changed_clauses(extracted, monkeypatch):
+    # 每个条款块单独成段，便于检查复用的粒度
+    monkeypatch.setattr(template_dedup, "pack_clauses", lambda clauses: [[index] for index in range(len(clauses))])
+    lines = agreement("张三", 50000, "2024年3月1日").split("\n")[1:-1]
+    template_markdown = "\n".join(f"第{i}条 {line}" for i, line in enumerate(lines, 1))
+    member_markdown = template_markdown.replace("50000元", "80000元")
+
+    template = template_dedup.build_template(template_markdown)
+    sections = len(extracted)
+    extracted.clear()
+    result = template_dedup.analyze_member(template, member_markdown)
+
+    assert result["sections"] == sections
+    assert result["reused"] == sections - 1
+    assert result["extracted"] == 1 and "80000元" in extracted[0]
+    assert result["failed"] == []
+
+
+def test_member_stage_fails_when_a_section_fails(monkeypatch):
+    monkeypatch.setattr(template_dedup, "extract_sections", lambda sections: ([None] * len(sections), [0]))
+    template = {"keys": [], "groups": [], "partials": [], "failed": []}
+    stage = template_dedup.member_stage(template, "hash")
+    with pytest.raises(RuntimeError):
+        stage.func({"ocr": "第1条 甲方应当支付补偿金。"})
+
+
+class FakeAnalyzer:
+    """只记录流程调用的合同分析器替身"""
+
+    chunkr_api_key = "test"
+
+    def _ensure_openai_key(self):
+        pass
+
+    def analysis_fingerprint(self, mode=None):
+        return {"mode": mode}
+
+    def run_pipeline(self, path, with_risk_report, with_debate, speech_dir, resume, artifact_path,
+                     analysis_stage=None):
+        result = {"path": path, "sections": 2, "reused_sections": 1}
+        if with_risk_report:
+            result["risk_report"] = f"{path} 的报告"
+        if with_debate:
+            result["debate"] = f"{path} 的评估"
+        if path == "a.pdf":
+            result["template_sections"] = {"keys": [], "groups": [], "partials": [], "failed": []}
+        return result
+
+
+def test_members_keep_template_report_and_debate_separate(monkeypatch, capsys):
+    documents = {"a.pdf": agreement("张三", 50000, "2024年3月1日"), "c.pdf": agreement("张三", 80000, "2024年5月20日")}
+    monkeypatch.setattr(template_dedup, "_load_markdown", lambda analyzer, path: documents[path])
+    monkeypatch.setattr(template_dedup, "file_sha256", lambda path: "hash")
+
+    results = {
+        result["path"]: result
+        for result in template_dedup.analyze_contracts_by_template(FakeAnalyzer(), list(documents))
+    }
+
+    member = results["c.pdf"]
+    assert "risk_report" not in member and "debate" not in member
+    assert member["template"] == "a.pdf"
+    assert member["template_risk_report"] == "a.pdf 的报告"
+    assert member["template_debate"] == "a.pdf 的评估"
+    assert "估计加速比" in capsys.readouterr().out
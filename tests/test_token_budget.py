@@ -0,0 +1,43 @@
+from contract_advisor.utils import token_budget
+from contract_advisor.utils.token_budget import TokenBudget, count_tokens, estimate_tokens
+
+
+def test_estimate_counts_cjk_conservatively():
+    assert estimate_tokens("合同" * 10) > estimate_tokens("ab" * 10)
+
+
+def test_failed_tokenizer_load_is_retried(monkeypatch):
+    attempts = []
+    outcomes = [None, lambda text: len(text)]
+
+    def fake_load(name):
+        attempts.append(name)
+        return outcomes[len(attempts) - 1]
+
+    clock = [0.0]
+    monkeypatch.setattr(token_budget, "_load_tokenizer", fake_load)
+    monkeypatch.setattr(token_budget.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(token_budget, "_tokenizers", {})
+    monkeypatch.setattr(token_budget, "_tokenizer_failures", {})
+
+    assert count_tokens("合同条款", "test-model") == estimate_tokens("合同条款")
+    # 重试间隔内不再加载
+    count_tokens("合同条款", "test-model")
+    assert len(attempts) == 1
+
+    clock[0] += token_budget.TOKENIZER_RETRY_SECONDS + 1
+    assert count_tokens("合同条款", "test-model") == 4
+    count_tokens("合同条款", "test-model")
+    assert len(attempts) == 2
+
+
+def test_budget_uses_model_table_and_packs_keywords(monkeypatch):
+    monkeypatch.setattr(token_budget, "_get_tokenizer", lambda name: lambda text: len(text))
+    budget = TokenBudget("qwen-max", ratio=0.5, reserved=384)
+    assert budget.limit == 32768 // 2 - 384
+
+    small = TokenBudget("unknown", max_tokens=15, ratio=1.0)
+    assert small.truncate("x" * 50) == "x" * 15
+    # 命中关键词的段落优先选入，结果保持原文顺序
+    packed = small.pack_text("无关内容无关内容\n工资补偿\n其他文字其他文字", keywords=("补偿",))
+    assert packed == "无关内容无关内容\n工资补偿"